@@ -0,0 +1,1879 @@
+# Headless benchmarks for the parts of SvanTerm that don't need win32/wx,
+# run with: python benchmark.py [name ...]
+#
+# --save-baseline FILE stores the timings (the *_ms, *_us and *_ns values),
+# --compare FILE reports the ones that got slower than the stored ones by
+# more than --tolerance (default 1.0, i.e. twice as slow, every benchmark
+# runs once and is noisy) and exits with 1 if there are any. Any of the
+# correctness values in CHECKS being wrong also exits with 1.
+#
+# The baseline also stores calibration_ms, the time of a fixed pure Python
+# workload. On a machine that runs it slower, or is busier during the run,
+# the stored timings are scaled up by as much before comparing. They are
+# never scaled down, some benchmarks wait for simulated latencies that a
+# faster machine doesn't shorten.
+
+import argparse
+import contextlib
+import functools
+import heapq
+import itertools
+import json
+import math
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import geometry
+import hittest
+import dockzones
+import ipc
+import keymap
+import layout
+import navigation
+import panes
+import registry
+import rendercache
+import search
+import session
+import startup
+import titles
+import tracing
+import transactions
+import winevents
+from desktop import FakeDesktop
+from focusguard import FocusGuard
+from spawn import (
+    AsyncSpawner,
+    ProcessLauncher,
+    SpawnTimeout,
+    TerminalPool,
+    WindowDiscovery,
+)
+from standby import StandbyWindows
+
+BENCHMARKS = []
+
+
+def benchmark(function):
+    BENCHMARKS.append(function)
+    return function
+
+
+def timed(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+@benchmark
+def window_discovery(windows=500, spawns=50, startup_polls=20):
+    # Polling as spawn_terminal used to do it: enumerate the whole desktop
+    # until the window of the process shows up after startup_polls rounds
+    desktop = FakeDesktop(windows)
+
+    def poll():
+        for pid in range(spawns):
+            for round in itertools.count():
+                if round == startup_polls:
+                    desktop.create_window(pid)
+                found = desktop.process_windows(pid)
+                if [h for h in found if desktop.is_ready(h)]:
+                    break
+
+    poll_time, _ = timed(poll)
+    poll_calls = desktop.calls["window_pid"] + desktop.calls["is_ready"]
+
+    desktop = FakeDesktop(windows)
+    discovery = WindowDiscovery(
+        desktop.window_pid, desktop.is_ready, desktop.process_windows
+    )
+
+    def discover():
+        for pid in range(spawns):
+            timer = threading.Timer(
+                0,
+                lambda pid=pid: discovery.on_window_event(desktop.create_window(pid)),
+            )
+            timer.start()
+            discovery.wait(pid, 5)
+            timer.join()
+
+    event_time, _ = timed(discover)
+    return {
+        "poll_ms": poll_time * 1000,
+        "poll_inspections": poll_calls,
+        "event_ms": event_time * 1000,
+        "event_inspections": desktop.calls["window_pid"] + desktop.calls["is_ready"],
+    }
+
+
+def build_layout(panes, tabs=1, seed=1):
+    # Random splits of random panes, returns the layout and all leaves
+    generator = random.Random(seed)
+    model = layout.Layout()
+    window = model.add_window()
+    all_leaves = []
+    for index in range(tabs):
+        leaf = layout.Leaf(len(all_leaves))
+        all_leaves.append(leaf)
+        model.add_tab(window, leaf)
+
+    while len(all_leaves) < panes:
+        leaf = layout.Leaf(len(all_leaves))
+        model.split(
+            generator.choice(all_leaves),
+            leaf,
+            generator.choice((layout.HORIZONTAL, layout.VERTICAL)),
+        )
+        all_leaves.append(leaf)
+
+    return model, window, all_leaves
+
+
+@benchmark
+def layout_operations(panes=5000, operations=2000):
+    generator = random.Random(2)
+    model, window, all_leaves = build_layout(panes)
+
+    def split():
+        leaf = layout.Leaf()
+        model.split(generator.choice(all_leaves), leaf, layout.VERTICAL)
+        all_leaves.append(leaf)
+
+    def close():
+        leaf = all_leaves.pop(generator.randrange(len(all_leaves)))
+        model.neighbour(leaf)
+        model.remove(leaf)
+
+    def move():
+        leaf, target = generator.sample(all_leaves, 2)
+        model.move(leaf, target, layout.HORIZONTAL)
+
+    def lookup():
+        leaf = generator.choice(all_leaves)
+        leaf.tab()
+        leaf.window()
+
+    def walk():
+        return sum(1 for _ in model.leaves(window))
+
+    result = {"panes": panes}
+    for name, function in (
+        ("split", split),
+        ("close", close),
+        ("move", move),
+        ("lookup", lookup),
+    ):
+        result[name + "_us"] = timed(function, operations)[0] * 1e6
+
+    result["full_walk_us"] = timed(walk, 10)[0] * 1e6
+    result["max_depth"] = max(leaf.depth() for leaf in all_leaves)
+    return result
+
+
+@benchmark
+def directional_navigation(panes=2000, queries=2000):
+    generator = random.Random(3)
+    model, window, all_leaves = build_layout(panes)
+    tab = window.tabs[0]
+    for leaf in all_leaves:
+        if leaf.parent is not tab:
+            leaf.parent.ratio = generator.uniform(0.2, 0.8)
+
+    rects = navigation.pane_rects(tab.child, 100000, 100000)
+    directions = (navigation.LEFT, navigation.DOWN, navigation.UP, navigation.RIGHT)
+    samples = [
+        (generator.choice(all_leaves), generator.choice(directions))
+        for _ in range(queries)
+    ]
+    build_time, index = timed(lambda: navigation.NavigationIndex(rects))
+
+    def indexed():
+        for leaf, direction in samples:
+            index.neighbour(leaf, direction)
+
+    def top_left_scan():
+        # What the Alt+HJKL handler used to do, comparing top left corners
+        for leaf, direction in samples:
+            x, y = rects[leaf][:2]
+            nearest = None
+            for other, rect in rects.items():
+                dx = rect[0] - x
+                dy = rect[1] - y
+                if (
+                    other is leaf
+                    or (direction == navigation.LEFT and dx >= 0)
+                    or (direction == navigation.RIGHT and dx <= 0)
+                    or (direction == navigation.UP and dy >= 0)
+                    or (direction == navigation.DOWN and dy <= 0)
+                ):
+                    continue
+                distance = abs(dx) + abs(dy)
+                if nearest is None or distance < nearest[0]:
+                    nearest = (distance, other)
+
+    def adjacent(leaf, direction, other):
+        x1, y1, x2, y2 = rects[leaf]
+        ox1, oy1, ox2, oy2 = rects[other]
+        if direction in (navigation.LEFT, navigation.RIGHT):
+            edge = ox2 == x1 if direction == navigation.LEFT else ox1 == x2
+            return edge and min(y2, oy2) > max(y1, oy1)
+        edge = oy2 == y1 if direction == navigation.UP else oy1 == y2
+        return edge and min(x2, ox2) > max(x1, ox1)
+
+    # Every answer has to share an edge with the pane we come from
+    wrong = 0
+    for leaf, direction in samples:
+        found = index.neighbour(leaf, direction)
+        if found is not None and not adjacent(leaf, direction, found):
+            wrong += 1
+
+    return {
+        "panes": panes,
+        "build_ms": build_time * 1000,
+        "indexed_query_us": timed(indexed)[0] / queries * 1e6,
+        "scan_query_us": timed(top_left_scan)[0] / queries * 1e6,
+        "non_adjacent": wrong,
+    }
+
+
+def terminal_titles(count, seed=4):
+    generator = random.Random(seed)
+    hosts = ["web", "db", "cache", "build", "proxy", "mail", "git", "log"]
+    commands = ["bash", "vim", "top", "tail -f", "ssh", "htop", "less", "watch"]
+    return [
+        "user@%s%02d: %s ~/src/project%d"
+        % (
+            generator.choice(hosts),
+            generator.randrange(100),
+            generator.choice(commands),
+            generator.randrange(50),
+        )
+        for _ in range(count)
+    ]
+
+
+@benchmark
+def find_filter(terminals=1000, query="db4vim"):
+    titles = terminal_titles(terminals)
+    tab_names = ["prod", "staging", "dev", "builds"]
+    index = search.SearchIndex()
+    tabs = [object() for _ in tab_names]
+    for tab, name in zip(tabs, tab_names):
+        index.rename_tab(tab, name)
+    for key, title in enumerate(titles):
+        index.add(key, title, tabs[key % len(tabs)])
+        if key % 7 == 0:
+            index.touch(key)
+
+    def scan():
+        # What FindDialog.Filter did for every typed character
+        for length in range(len(query) + 1):
+            text = query[:length].upper()
+            [
+                title
+                for key, title in enumerate(titles)
+                if title.upper().find(text) != -1
+                or tab_names[key % len(tabs)].upper().find(text) != -1
+            ]
+
+    def indexed():
+        index.last_query = None
+        for length in range(len(query) + 1):
+            index.search(query[:length])
+
+    def busy():
+        # Programs in the terminals keep changing their titles while typing
+        index.last_query = None
+        for length in range(len(query) + 1):
+            for key in range(length * 3, length * 3 + 3):
+                index.update(key, "%s %d" % (titles[key], generator.randrange(100)))
+            index.search(query[:length])
+        return index.search(query)
+
+    generator = random.Random(5)
+    scan_time, _ = timed(scan, 5)
+    index_time, _ = timed(indexed, 5)
+    busy_time, found = timed(busy, 5)
+    expected = set(
+        key
+        for key, entry in index.entries.items()
+        if search.match_score(query.upper(), entry.text) is not None
+    )
+    return {
+        "terminals": terminals,
+        "scan_per_key_us": scan_time / (len(query) + 1) * 1e6,
+        "index_per_key_us": index_time / (len(query) + 1) * 1e6,
+        "busy_per_key_us": busy_time / (len(query) + 1) * 1e6,
+        "matches": len(found),
+        "results_ok": set(found) == expected,
+    }
+
+
+class RecordingWindowBackend(geometry.WindowBackend):
+    def __init__(self):
+        self.moves = []
+
+    def move_windows(self, batch):
+        self.moves.extend(batch)
+
+
+@benchmark
+def resize_storm(windows=50, frames=30, frame_interval=0.008):
+    # A window resize drag: every frame every terminal gets a new size
+    backend = RecordingWindowBackend()
+    scheduler = geometry.ResizeScheduler(backend)
+    scheduler.known.update(range(windows))
+    scheduler.start()
+
+    for frame in range(frames):
+        for hwnd in range(windows):
+            scheduler.request(hwnd, (0, 20, 800 + frame, 600 + frame))
+        time.sleep(frame_interval)
+
+    time.sleep(scheduler.max_delay * 2)
+    scheduler.stop()
+
+    final = dict(backend.moves)
+    stats = scheduler.stats.summary()
+    stats["stale_final_geometry"] = sum(
+        1
+        for hwnd in range(windows)
+        if final[hwnd] != (0, 20, 800 + frames - 1, 600 + frames - 1)
+    )
+    return stats
+
+
+@benchmark
+def live_resize(windows=4, frames=60, frame_interval=1.0 / 120, live_rate=30):
+    # A sash drag at 120 events per second, capped to live_rate pushes
+    backend = RecordingWindowBackend()
+    scheduler = geometry.ResizeScheduler(backend, live_rate=live_rate)
+    scheduler.known.update(range(windows))
+    scheduler.start()
+
+    start = time.time()
+    scheduler.set_live("sash", True)
+    for frame in range(frames):
+        for hwnd in range(windows):
+            scheduler.request(hwnd, (0, 20, 400 + frame, 600))
+        time.sleep(frame_interval)
+    scheduler.set_live("sash", False)
+    duration = time.time() - start
+
+    time.sleep(scheduler.max_delay)
+    scheduler.stop()
+
+    final = dict(backend.moves)
+    stats = scheduler.stats.summary()
+    stats["pushes_per_second"] = stats["live_pushed"] / windows / duration
+    stats["final_delivered"] = all(
+        final[hwnd] == (0, 20, 400 + frames - 1, 600) for hwnd in range(windows)
+    )
+    return stats
+
+
+@benchmark
+def tracing_overhead(calls=100000):
+    # Traced methods like the ones of the app
+    tracer = tracing.Tracer()
+
+    class Actions(object):
+        def action(self):
+            pass
+
+        @tracer.traced("action")
+        def traced_action(self):
+            pass
+
+    actions = Actions()
+
+    def plain():
+        for _ in range(calls):
+            actions.action()
+
+    def traced():
+        for _ in range(calls):
+            actions.traced_action()
+
+    def span():
+        for _ in range(calls):
+            with tracer.span("action", detail="detail"):
+                actions.action()
+
+    def call():
+        # Like the hotkey handler does it
+        for _ in range(calls):
+            tracer.call("action", actions.action, detail="detail")
+
+    result = {"plain_ns": timed(plain)[0] / calls * 1e9}
+    result["disabled_ns"] = timed(traced)[0] / calls * 1e9
+    result["disabled_span_ns"] = timed(span)[0] / calls * 1e9
+    result["disabled_call_ns"] = timed(call)[0] / calls * 1e9
+    tracer.enable()
+    result["enabled_ns"] = timed(traced)[0] / calls * 1e9
+    result["enabled_span_ns"] = timed(span)[0] / calls * 1e9
+    result["enabled_call_ns"] = timed(call)[0] / calls * 1e9
+    result["trace_events"] = len(tracer.chrome_trace()["traceEvents"])
+    return result
+
+
+def keystroke_stream(count, seed=5):
+    # Mostly plain typing with an occasional Alt+<key> or Ctrl+Shift+<key>
+    generator = random.Random(seed)
+    events = []
+    while len(events) < count:
+        key = generator.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ")
+        modifiers = []
+        if generator.random() < 0.02:
+            modifiers = generator.choice(([0xA4], [0xA2, 0xA0]))
+        for modifier in modifiers:
+            events.append((modifier, True))
+        events.append((ord(key), True))
+        events.append((ord(key), False))
+        for modifier in reversed(modifiers):
+            events.append((modifier, False))
+    return events
+
+
+@benchmark
+def keyboard_hook(keystrokes=100000):
+    events = keystroke_stream(keystrokes)
+    dispatcher = keymap.KeyDispatcher(keymap.compile_keymap(keymap.DEFAULT_KEYMAP))
+    syscalls = [0]
+
+    def syscall(*args):
+        syscalls[0] += 1
+        return 0
+
+    def old_hook():
+        # Foreground window lookup and three GetAsyncKeyState per key down
+        # before walking the hotkey if/elif chain
+        for vkey, down in events:
+            if down:
+                syscall()
+                ctrl, shift = syscall(), syscall()
+                syscall()
+                for _ in range(15):
+                    if ctrl and shift and vkey == 0x54:
+                        break
+
+    pressed = set()
+
+    def key_pressed(vkey):
+        syscalls[0] += 1
+        return vkey in pressed
+
+    def new_hook():
+        # Like Keyboard_Event: on a hit the foreground window is looked up
+        # and the modifiers are read back with get_modifiers()
+        hits = 0
+        for vkey, down in events:
+            if down:
+                pressed.add(vkey)
+            else:
+                pressed.discard(vkey)
+            if dispatcher.key_event(vkey, down):
+                syscall()
+                modifiers = 0
+                for modifier_key, modifier in keymap.MODIFIER_KEYS.items():
+                    if key_pressed(modifier_key):
+                        modifiers |= modifier
+                if dispatcher.resync(modifiers, vkey):
+                    hits += 1
+        return hits
+
+    old_time, _ = timed(old_hook)
+    old_syscalls = syscalls[0]
+    syscalls[0] = 0
+    new_time, hits = timed(new_hook)
+    return {
+        "events": len(events),
+        "old_ns": old_time / len(events) * 1e9,
+        "old_syscalls": old_syscalls,
+        "new_ns": new_time / len(events) * 1e9,
+        "new_syscalls": syscalls[0],
+        "hotkeys": hits,
+    }
+
+
+@benchmark
+def mouse_hit_test(panes=200, events=20000):
+    # One maximized 1920x1080 window on a 3840x1080 desktop
+    generator = random.Random(6)
+    model, window, all_leaves = build_layout(panes)
+    rects = navigation.pane_rects(window.tabs[0].child, 1920, 1050)
+
+    def build():
+        regions = [((0, 0, 1920, 30), hittest.TAB_STRIP, None)]
+        for leaf, (x1, y1, x2, y2) in rects.items():
+            regions.append(((x1, y1 + 30, x2, y1 + 50), hittest.HEADER, leaf))
+            regions.append(((x1, y1 + 30, x2, y2 + 30), hittest.TERMINAL, leaf))
+        return [((0, 0, 1920, 1080), window, regions)]
+
+    cache = hittest.HitTestCache(build, lambda: model.version)
+    clicks = [
+        (generator.randrange(3840), generator.randrange(1080)) for _ in range(events)
+    ]
+
+    def click():
+        for x, y in clicks:
+            cache.hit(x, y)
+
+    # A drag from the top left to the bottom right, one event per pixel
+    path = [(x, int(x * 1080 / 1920)) for x in range(1920)]
+
+    def drag():
+        changes = 0
+        zone = None
+        for x, y in path:
+            hit = cache.hit(x, y)
+            if hit and hit[0] == hittest.TERMINAL:
+                x1, y1, x2, y2 = rects[hit[1]]
+                dx = x - (x1 + x2) / 2
+                dy = y - 30 - (y1 + y2) / 2
+                quadrant = (abs(dx) > abs(dy), dx > 0, dy > 0)
+            else:
+                quadrant = None
+            if (hit, quadrant) != zone:
+                zone = (hit, quadrant)
+                changes += 1
+        return changes
+
+    click_time, _ = timed(click)
+    drag_time, changes = timed(drag)
+    return {
+        "panes": panes,
+        "click_us": click_time / events * 1e6,
+        "outside": cache.outside,
+        "drag_move_us": drag_time / len(path) * 1e6,
+        "drag_moves": len(path),
+        "hint_updates": changes,
+        "builds": cache.builds,
+    }
+
+
+@benchmark
+def dock_zones(panes=200, events=20000):
+    # Mouse moves while a terminal is dragged over a maximized window with
+    # many panes. The old handler asked every move for the size and
+    # position of the terminal under the mouse to work out the zone, now
+    # the zones are computed when the drag starts and a move is a lookup.
+    generator = random.Random(23)
+    model, window, all_leaves = build_layout(panes)
+    rects = navigation.pane_rects(window.tabs[0].child, 1920, 1050)
+    syscalls = [0]
+
+    def build():
+        regions = [((0, 0, 1920, 30), hittest.TAB_STRIP, window)]
+        for leaf, (x1, y1, x2, y2) in rects.items():
+            regions.append(((x1, y1 + 30, x2, y1 + 50), hittest.HEADER, leaf))
+            regions.append(((x1, y1 + 50, x2, y2 + 30), hittest.TERMINAL, leaf))
+        return [((0, 0, 1920, 1080), window, regions)]
+
+    cache = hittest.HitTestCache(build, lambda: model.version)
+
+    # Mostly short moves, like a mouse, now and then outside of the window
+    moves = []
+    x, y = 960, 540
+    for _ in range(events):
+        x = min(max(x + generator.randint(-12, 12), 0), 2400)
+        y = min(max(y + generator.randint(-12, 12), 0), 1079)
+        moves.append((x, y))
+
+    def terminal_geometry(leaf):
+        # GetClientSize and GetScreenPosition
+        syscalls[0] += 2
+        x1, y1, x2, y2 = rects[leaf]
+        return (x2 - x1, y2 - y1), (x1, y1 + 30)
+
+    def old_drag():
+        zones = []
+        current = None
+        for x, y in moves:
+            hit = cache.hit(x, y)
+            kind, target = hit or (None, None)
+            if kind == hittest.TAB_STRIP:
+                zone = (target, None)
+            elif hit is None:
+                zone = (dockzones.DOCK_NEW_WINDOW, None)
+            elif kind in (hittest.TERMINAL, hittest.HEADER):
+                size, position = terminal_geometry(target)
+                from_center_x = x - position[0] - size[0] / 2
+                from_center_y = y - position[1] - size[1] / 2
+                if abs(from_center_x) > abs(from_center_y):
+                    dock_pos = (
+                        dockzones.DOCK_LEFT
+                        if from_center_x <= 0
+                        else dockzones.DOCK_RIGHT
+                    )
+                else:
+                    dock_pos = (
+                        dockzones.DOCK_TOP
+                        if from_center_y <= 0
+                        else dockzones.DOCK_BOTTOM
+                    )
+                zone = (target, dock_pos)
+            else:
+                zone = current
+            if zone != current or zone[0] == dockzones.DOCK_NEW_WINDOW:
+                # SetRect of the dock hint
+                syscalls[0] += 1
+            current = zone
+            zones.append(zone)
+        return zones
+
+    def new_drag():
+        start = time.perf_counter()
+        zones = dockzones.DockZones(cache.regions())
+        setup = time.perf_counter() - start
+        found = []
+        current = None
+        for x, y in moves:
+            zone = zones.find(x, y)
+            if zone is None:
+                zone = current
+            if zone is dockzones.NEW_WINDOW or zone is not current:
+                syscalls[0] += 1
+            current = zone
+            found.append(zone and zone[1:3])
+        return setup, found
+
+    old_time, old_zones = timed(old_drag)
+    old_syscalls = syscalls[0]
+    syscalls[0] = 0
+    new_time, (setup, new_zones) = timed(new_drag)
+    return {
+        "panes": panes,
+        "moves": events,
+        "old_move_us": old_time / events * 1e6,
+        "old_syscalls": old_syscalls,
+        "new_move_us": (new_time - setup) / events * 1e6,
+        "new_syscalls": syscalls[0],
+        "setup_ms": setup * 1000,
+        "mismatches": sum(
+            1 for old, new in zip(old_zones, new_zones) if old != tuple(new or ())
+        ),
+    }
+
+
+class SimulatedClock(object):
+    # Virtual time with callbacks scheduled on it, for driving code that
+    # waits for timers without actually sleeping
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+        self.sequence = itertools.count()
+
+    def __call__(self):
+        return self.now
+
+    def schedule(self, delay, callback):
+        heapq.heappush(self.timers, (self.now + delay, next(self.sequence), callback))
+
+    def advance(self, until):
+        while self.timers and self.timers[0][0] <= until:
+            when, _, callback = heapq.heappop(self.timers)
+            self.now = when
+            callback()
+        self.now = until
+
+
+@benchmark
+def title_storm(windows=20, rate=100, seconds=2.0):
+    # Every window gets a new title rate times per second, plus repeats of
+    # the same title as a shell prompt would send
+    clock = SimulatedClock()
+    repaints = []
+    pipeline = titles.TitlePipeline(repaints.append, clock.schedule, clock=clock)
+
+    interval = 1.0 / rate
+    step = 0
+    while step * interval < seconds:
+        clock.advance(step * interval)
+        for hwnd in range(windows):
+            pipeline.title_changed(hwnd, "progress %d%%" % (step // 2))
+        step += 1
+    clock.advance(seconds + 1)
+
+    stats = pipeline.stats.summary()
+    stats["ui_passes"] = len(repaints)
+    stats["final_titles_ok"] = all(
+        pipeline.titles[hwnd] == "progress %d%%" % ((step - 1) // 2)
+        for hwnd in range(windows)
+    )
+    return stats
+
+
+class RecordingHookBackend(winevents.HookBackend):
+    def __init__(self):
+        self.hooks = {}
+        self.handles = itertools.count(1)
+
+    def set_hook(self, event, pid):
+        handle = next(self.handles)
+        self.hooks[handle] = (event, pid)
+        return handle
+
+    def unhook(self, handle):
+        del self.hooks[handle]
+
+    def subscribed(self):
+        return set(self.hooks.values())
+
+
+def desktop_events(count, terminals, processes=40, seed=6):
+    # A busy desktop as (event, pid, hwnd, id_object): mostly caret and
+    # window movement, with title changes, focus and windows coming and
+    # going, some of it in the alacritty processes
+    generator = random.Random(seed)
+    kinds = [
+        (winevents.EVENT_OBJECT_LOCATIONCHANGE, 50),
+        (winevents.EVENT_OBJECT_NAMECHANGE, 20),
+        (winevents.EVENT_OBJECT_SHOW, 8),
+        (winevents.EVENT_OBJECT_HIDE, 8),
+        (winevents.EVENT_OBJECT_FOCUS, 6),
+        (winevents.EVENT_OBJECT_CREATE, 3),
+        (winevents.EVENT_OBJECT_DESTROY, 3),
+        (winevents.EVENT_SYSTEM_FOREGROUND, 2),
+    ]
+    events = [kind for kind, weight in kinds]
+    weights = [weight for kind, weight in kinds]
+    pids = list(range(processes)) + list(terminals)
+    records = []
+    for event in generator.choices(events, weights, k=count):
+        pid = generator.choice(pids)
+        id_object = winevents.OBJID_WINDOW
+        if generator.random() < 0.6:
+            # Caret, cursor or child objects
+            id_object = generator.choice((-8, -9, 1, 2))
+        hwnd = pid * 10 + generator.randrange(3)
+        records.append((event, pid, hwnd, id_object))
+    return records
+
+
+@benchmark
+def win_event_replay(events=200000, terminals=10):
+    terminal_pids = range(1000, 1000 + terminals)
+    records = desktop_events(events, terminal_pids)
+    owned = set(pid * 10 for pid in terminal_pids)
+    handled = [0]
+
+    def handler(hwnd):
+        handled[0] += 1
+
+    def old_callback(hook, event, hwnd, id_object, child, thread, ms):
+        # The former single hook callback
+        if hwnd in owned:
+            if event == winevents.EVENT_OBJECT_DESTROY and id_object == 0:
+                handler(hwnd)
+            if event == winevents.EVENT_OBJECT_NAMECHANGE:
+                handler(hwnd)
+        if event == winevents.EVENT_SYSTEM_FOREGROUND:
+            handler(hwnd)
+
+    # The system only calls back for events in the hooked range
+    old_delivered = [
+        (event, hwnd, id_object)
+        for event, pid, hwnd, id_object in records
+        if winevents.EVENT_SYSTEM_FOREGROUND
+        <= event
+        <= winevents.EVENT_OBJECT_NAMECHANGE
+    ]
+
+    def old_replay():
+        for event, hwnd, id_object in old_delivered:
+            old_callback(0, event, hwnd, id_object, 0, 0, 0)
+
+    backend = RecordingHookBackend()
+    router = winevents.EventRouter(
+        {
+            winevents.EVENT_SYSTEM_FOREGROUND: handler,
+            winevents.EVENT_OBJECT_DESTROY: handler,
+            winevents.EVENT_OBJECT_NAMECHANGE: handler,
+        },
+        {winevents.EVENT_OBJECT_DESTROY, winevents.EVENT_OBJECT_NAMECHANGE},
+        owned.__contains__,
+    )
+    subscriptions = winevents.WinEventSubscriptions(
+        backend,
+        [winevents.EVENT_SYSTEM_FOREGROUND],
+        [winevents.EVENT_OBJECT_DESTROY, winevents.EVENT_OBJECT_NAMECHANGE],
+    )
+    subscriptions.start()
+    for pid in terminal_pids:
+        subscriptions.add_process(pid)
+    subscribed = backend.subscribed()
+    # and now only for hooked (event, pid) pairs
+    new_delivered = [
+        (event, hwnd, id_object)
+        for event, pid, hwnd, id_object in records
+        if (event, 0) in subscribed or (event, pid) in subscribed
+    ]
+
+    def new_replay():
+        for event, hwnd, id_object in new_delivered:
+            router(0, event, hwnd, id_object, 0, 0, 0)
+
+    old_time, _ = timed(old_replay)
+    old_handled = handled[0]
+    handled[0] = 0
+    new_time, _ = timed(new_replay)
+    return {
+        "events": len(records),
+        "hooks": len(subscribed),
+        "old_callbacks": len(old_delivered),
+        "old_handled": old_handled,
+        "old_ms": old_time * 1e3,
+        "new_callbacks": len(new_delivered),
+        "new_dropped": router.dropped,
+        "new_handled": handled[0],
+        "new_ms": new_time * 1e3,
+    }
+
+
+@benchmark
+def session_restore(panes=30, tabs=5, launch_ms=(20, 60), workers=8):
+    # Save a session, restore it with terminals taking launch_ms to come up
+    # and check the restored layout saves the same
+    model, window, all_leaves = build_layout(panes, tabs, seed=7)
+    generator = random.Random(7)
+    for index, tab in enumerate(window.tabs):
+        tab.name = "tab %d" % index if index % 2 else ""
+        for node in layout.leaves(tab):
+            if isinstance(node.parent, layout.Split):
+                node.parent.ratio = round(generator.uniform(0.2, 0.8), 3)
+    encoded = json.dumps(session.dump_session(model), separators=(",", ":"))
+    steps = session.session_steps(json.loads(encoded))
+
+    latencies = [generator.uniform(*launch_ms) / 1000 for _ in range(panes)]
+    pending_latencies = list(latencies)
+    handles = itertools.count()
+
+    def launch():
+        time.sleep(pending_latencies.pop())
+        return next(handles)
+
+    restored = layout.Layout()
+    windows = []
+    restored_leaves = []
+
+    def build(step, handle):
+        if step[0] == "window":
+            windows.append(restored.add_window())
+        elif step[0] == "tab":
+            leaf = layout.Leaf(handle)
+            restored.add_tab(windows[-1], leaf, name=step[1])
+            restored_leaves.append(leaf)
+        else:
+            _, pane, orientation, ratio = step
+            leaf = layout.Leaf(handle)
+            split = restored.split(restored_leaves[pane], leaf, orientation)
+            split.ratio = ratio
+            restored_leaves.append(leaf)
+
+    deliveries = queue.Queue()
+    completed = []
+    restore = session.SessionRestore(
+        steps,
+        build,
+        launch,
+        lambda callback, *args: deliveries.put((callback, args)),
+        lambda handle: None,
+        completed.append,
+        workers,
+    )
+    start = time.perf_counter()
+    restore.start()
+    while not restore.finished:
+        callback, args = deliveries.get()
+        callback(*args)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "panes": panes,
+        "session_bytes": len(encoded),
+        "steps": len(steps),
+        "sequential_ms": sum(latencies) * 1e3,
+        "concurrent_ms": elapsed * 1e3,
+        "completed": completed == [True],
+        "roundtrip_ok": session.dump_session(restored) == json.loads(encoded),
+    }
+
+
+@benchmark
+def standby_window(requests=200, build=0.12, show=0.03, paint=0.016):
+    # New windows asked for every few seconds and now and then in quick
+    # succession. Building a window takes build seconds of UI time, showing
+    # it show and it is painted paint seconds later. Without the standby
+    # window every new window is built on demand.
+    generator = random.Random(25)
+    gaps = [
+        generator.choice((0.2, generator.expovariate(1 / 5.0))) for _ in range(requests)
+    ]
+
+    def simulate(standby):
+        clock = SimulatedClock()
+
+        def build_window():
+            clock.now += build
+            return type("Window", (object,), {})()
+
+        def reveal(window):
+            clock.now += show
+            clock.schedule(paint, lambda: windows.painted(window))
+
+        windows = StandbyWindows(
+            build_window,
+            reveal,
+            clock.schedule if standby else lambda delay, callback: None,
+            clock=clock,
+        )
+        windows.replace()
+        start = time.perf_counter()
+        for gap in gaps:
+            clock.advance(clock.now + gap)
+            windows.take()
+        clock.advance(clock.now + 10)
+        elapsed = time.perf_counter() - start
+        return windows.stats.summary(), elapsed
+
+    cold, _ = simulate(False)
+    warm, elapsed = simulate(True)
+    return {
+        "requests": requests,
+        "on_demand_visible_ms": cold["cold_visible_avg_ms"],
+        "standby_hits": warm["warm"],
+        "standby_misses": warm["cold"],
+        "standby_visible_ms": warm["warm_visible_avg_ms"],
+        "standby_miss_visible_ms": warm["cold_visible_avg_ms"],
+        "bookkeeping_us": elapsed / requests * 1e6,
+    }
+
+
+@benchmark
+def focus_guard(spawns=20, spawn_delay=0.05, poll_interval=0.01):
+    # Panes opened all at once, every alacritty window takes the foreground
+    # when it shows up. A thread per terminal polling the foreground ten
+    # times (every 100 ms in SvanTerm, poll_interval here) vs. FocusGuard.
+    result = {}
+    for mode in ("polling", "guard"):
+        desktop = FakeDesktop(spawn_delay=spawn_delay, steal_focus=True)
+        ours = desktop.create_window(1, "SvanTerm")
+        desktop.foreground = ours
+        discovery = WindowDiscovery(
+            desktop.window_pid, desktop.is_ready, desktop.process_windows
+        )
+        desktop.on_window_shown = discovery.on_window_event
+        guard = FocusGuard(desktop) if mode == "guard" else None
+        changes = []
+
+        def on_foreground(hwnd):
+            changes.append((time.perf_counter(), hwnd))
+            if guard:
+                guard.on_foreground(hwnd)
+
+        desktop.on_foreground = on_foreground
+        launcher = ProcessLauncher(desktop, discovery, ["alacritty.exe"], 5, guard)
+        threads = []
+
+        def ensure_foreground_window(foreground):
+            for _ in range(10):
+                if desktop.foreground_window() != foreground:
+                    desktop.set_foreground_window(foreground)
+                time.sleep(poll_interval)
+
+        def spawn():
+            if mode == "polling":
+                poller = threading.Thread(
+                    target=ensure_foreground_window, args=(desktop.foreground,)
+                )
+                poller.start()
+                threads.append(poller)
+            launcher.launch()
+
+        start = time.perf_counter()
+        spawners = [threading.Thread(target=spawn) for _ in range(spawns)]
+        for thread in spawners:
+            thread.start()
+        for thread in spawners:
+            thread.join()
+        for thread in threads:
+            thread.join()
+        end = time.perf_counter()
+
+        # Time the foreground wasn't ours
+        stolen = 0.0
+        for (changed, hwnd), (next_changed, _) in zip(
+            changes, changes[1:] + [(end, None)]
+        ):
+            if hwnd != ours:
+                stolen += next_changed - changed
+
+        result[mode + "_threads"] = len(threads)
+        result[mode + "_set_foreground"] = desktop.calls["set_foreground_window"]
+        result[mode + "_busy_ms"] = (end - start) * 1e3
+        result[mode + "_stolen_ms"] = stolen * 1e3
+        result[mode + "_kept_foreground"] = desktop.foreground == ours
+    return result
+
+
+@benchmark
+def async_spawn(spawns=10, launch_ms=(20, 60), failures=2):
+    # Time the UI thread is blocked for a burst of new terminals, spawning
+    # on the UI thread vs. placeholders filled in by AsyncSpawner
+    generator = random.Random(8)
+    latencies = [generator.uniform(*launch_ms) / 1000 for _ in range(spawns)]
+
+    def acquire_from(pending):
+        def acquire():
+            latency = pending.pop()
+            fail = len(pending) < failures
+            time.sleep(latency)
+            if fail:
+                raise SpawnTimeout("simulated")
+            return latency
+
+        return acquire
+
+    acquire = acquire_from(list(latencies))
+    start = time.perf_counter()
+    for _ in range(spawns):
+        try:
+            acquire()
+        except SpawnTimeout:
+            pass
+    blocking_time = time.perf_counter() - start
+
+    deliveries = queue.Queue()
+    spawner = AsyncSpawner(
+        acquire_from(list(latencies)),
+        lambda callback, *args: deliveries.put((callback, args)),
+    )
+    results = []
+    ui_time = 0.0
+    start = time.perf_counter()
+    for _ in range(spawns):
+        spawner.spawn(results.append, results.append)
+    ui_time += time.perf_counter() - start
+    while len(results) < spawns:
+        callback, args = deliveries.get()
+        handled = time.perf_counter()
+        callback(*args)
+        ui_time += time.perf_counter() - handled
+    elapsed = time.perf_counter() - start
+
+    stats = spawner.stats.summary()
+    return {
+        "spawns": spawns,
+        "blocking_ui_ms": blocking_time * 1e3,
+        "async_ui_ms": ui_time * 1e3,
+        "async_all_up_ms": elapsed * 1e3,
+        "failed": stats["failed"],
+        "max_in_flight": stats["max_in_flight"],
+    }
+
+
+@benchmark
+def startup_overlap(launch=0.2, ui=0.15, runs=3):
+    # Time to the first terminal when the UI takes ui seconds to build and
+    # alacritty launch seconds to start. It used to be launched once the
+    # first window asked for it, now it is prefetched before the UI is built.
+    def start(prefetch):
+        profile = startup.StartupProfile(True)
+        deliveries = queue.Queue()
+
+        def acquire():
+            with profile.phase("launch terminal"):
+                time.sleep(launch)
+                return 1
+
+        spawner = AsyncSpawner(
+            acquire, lambda callback, *args: deliveries.put((callback, args))
+        )
+        if prefetch:
+            spawner.prefetch()
+        time.sleep(ui)
+        profile.mark("build ui")
+        spawner.spawn(lambda handle: None, lambda error: None)
+        callback, args = deliveries.get()
+        callback(*args)
+        profile.finish("until attached")
+        return profile.finished - profile.start
+
+    old_time = min(start(False) for _ in range(runs))
+    new_time = min(start(True) for _ in range(runs))
+    return {
+        "launch_ms": launch * 1e3,
+        "ui_ms": ui * 1e3,
+        "old_first_pane_ms": old_time * 1e3,
+        "new_first_pane_ms": new_time * 1e3,
+    }
+
+
+@benchmark
+def header_paint(panes=100, events=20000, width=400, height=20):
+    # Header repaints from focus changes, title changes and a few resizes,
+    # with a stand-in for the gradient fill, font and text drawing
+    generator = random.Random(9)
+    labels = ["user@host:~/project %d" % pane for pane in range(panes)]
+    widths = [width] * panes
+    enabled = [False] * panes
+    renders = [0]
+
+    def render(width, height, state, label):
+        renders[0] += 1
+        pixels = bytearray(width * height * 4)
+        for row in range(height):
+            shade = 255 - row * 8
+            pixels[row * width * 4 : (row + 1) * width * 4] = (
+                bytes((shade, 0, 0, 255)) * width
+            )
+        return pixels
+
+    def paint(pane):
+        keys.append((widths[pane], height, 2 if enabled[pane] else 3, labels[pane]))
+
+    keys = []
+    active = 0
+    for _ in range(events):
+        roll = generator.random()
+        if roll < 0.85:
+            # Focus moves, both headers repaint
+            pane = generator.randrange(panes)
+            enabled[active] = False
+            paint(active)
+            enabled[pane] = True
+            paint(pane)
+            active = pane
+        elif roll < 0.97:
+            pane = generator.randrange(panes)
+            labels[pane] = "user@host:~/project %d $ %d" % (pane, roll * 10)
+            paint(pane)
+        else:
+            pane = generator.randrange(panes)
+            widths[pane] = generator.choice((300, 400, 500))
+            paint(pane)
+
+    def uncached():
+        for key in keys:
+            render(*key)
+
+    cache = rendercache.RenderCache(render, capacity=256)
+
+    def cached():
+        for key in keys:
+            cache.get(key)
+
+    uncached_time, _ = timed(uncached)
+    cached_time, _ = timed(cached)
+    stats = cache.stats.summary()
+    return {
+        "paints": len(keys),
+        "uncached_us": uncached_time / len(keys) * 1e6,
+        "cached_us": cached_time / len(keys) * 1e6,
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "evictions": stats["evictions"],
+    }
+
+
+class Pane(object):
+    # Stands in for a terminal widget, weakly referenceable like one
+    def __init__(self, hwnd):
+        self.hwnd = hwnd
+
+
+@benchmark
+def object_registry(cycles=100000, live=100, leaked=3):
+    # Days of opening and closing panes: every pane is registered, indexed
+    # by its hwnd and retired again, only the last few stay alive
+    objects = registry.ObjectRegistry(debug=True)
+    by_hwnd = objects.index("terminal")
+    panes = []
+    kept = []
+
+    def churn():
+        for hwnd in range(cycles):
+            pane = Pane(hwnd)
+            objects.add("terminal", pane)
+            objects.set_key("terminal", hwnd, pane)
+            panes.append(pane)
+            if len(panes) > live:
+                closed = panes.pop(0)
+                objects.retire("terminal", closed, closed.hwnd)
+                if len(kept) < leaked:
+                    kept.append(closed)
+
+    churn_time, _ = timed(churn)
+    leak_time, leaks = timed(objects.leaks)
+    return {
+        "cycles": cycles,
+        "churn_us": churn_time / cycles * 1e6,
+        "leak_check_ms": leak_time * 1e3,
+        "live": objects.counts()["terminal"],
+        "indexed": len(by_hwnd),
+        "leaked": len(leaks.get("terminal", [])),
+    }
+
+
+def workspace_operation(name):
+    # Like layout_operation in svanterm.py
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            with self.transaction(name):
+                return function(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Workspace(object):
+    # SvanTerm's structural operations without the wx widgets, what they do
+    # to the terminals goes through panes.Panes like in svanterm.py, with a
+    # FakeDesktop in place of Windows and alacritty. One window with
+    # panes_per_tab panes per tab, the tab content starts below a 30 pixel
+    # tab strip. With dormant_tabs the terminals of the tabs not shown are
+    # hidden and their geometry deferred.
+    def __init__(
+        self,
+        pane_count,
+        panes_per_tab=10,
+        size=(1920, 1050),
+        seed=10,
+        dormant_tabs=True,
+    ):
+        self.generator = random.Random(seed)
+        self.next_title = itertools.cycle(terminal_titles(pane_count, seed)).__next__
+        self.desktop = FakeDesktop()
+        discovery = WindowDiscovery(
+            self.desktop.window_pid, self.desktop.is_ready, self.desktop.process_windows
+        )
+        self.desktop.on_window_shown = discovery.on_window_event
+        self.pool = TerminalPool(
+            ProcessLauncher(self.desktop, discovery, ["alacritty.exe"], 5), size=0
+        )
+        self.clock = SimulatedClock()
+        self.scheduler = geometry.ResizeScheduler(self.desktop, clock=self.clock)
+        self.titles = titles.TitlePipeline(
+            self.apply_titles, self.clock.schedule, clock=self.clock
+        )
+        self.search_index = search.SearchIndex()
+        self.panes = panes.Panes(
+            self.desktop, self.scheduler, self.titles, self.search_index
+        )
+        self.layout = layout.Layout()
+        self.hit_test = hittest.HitTestCache(
+            self.hit_regions, lambda: self.layout.version
+        )
+        self.size = size
+        self.dormant_tabs = dormant_tabs
+        self.window = self.layout.add_window()
+        self.current = None
+        self.selected = {}
+        self.hwnd_to_leaf = {}
+        self.transactions = transactions.LayoutTransactions(self.scheduler)
+
+        for _ in range(int(math.ceil(pane_count / float(panes_per_tab)))):
+            self.new_tab()
+        while len(self.hwnd_to_leaf) < pane_count:
+            self.split(self.random_leaf(), self.random_orientation())
+
+    def random_leaf(self):
+        return self.generator.choice(list(self.hwnd_to_leaf.values()))
+
+    def random_orientation(self):
+        return self.generator.choice((layout.HORIZONTAL, layout.VERTICAL))
+
+    def spawn(self, dormant=False):
+        # Terminal.Attach, the terminal comes up in a pane the size of the tab
+        hwnd = self.pool.acquire()
+        self.desktop.set_title(hwnd, self.next_title())
+        leaf = layout.Leaf(hwnd)
+        self.hwnd_to_leaf[hwnd] = leaf
+        title = self.desktop.window_text(hwnd)
+        self.search_index.add(leaf, title)
+        self.titles.set_title(hwnd, title)
+        self.desktop.embed(hwnd, 0)
+        width, height = self.size
+        self.panes.attach(hwnd, (width, height - 30), dormant)
+        return leaf
+
+    def pane_rects(self, tab):
+        width, height = self.size
+        return navigation.pane_rects(tab.child, width, height - 30)
+
+    def relayout(self, tab):
+        for leaf, (x1, y1, x2, y2) in self.pane_rects(tab).items():
+            self.panes.resize(leaf.payload, x2 - x1, y2 - y1)
+
+    def check(self):
+        # Number of terminals the FakeDesktop doesn't show the way the
+        # layout says: terminals of the selected tabs visible at the
+        # geometry of their pane, the others hidden, closed ones gone
+        wrong = len(set(self.desktop.windows) - set(self.hwnd_to_leaf))
+        for window in self.layout.windows:
+            for tab in window.tabs:
+                dormant = self.is_dormant(tab)
+                for leaf, (x1, y1, x2, y2) in self.pane_rects(tab).items():
+                    state = self.desktop.windows.get(leaf.payload)
+                    if (
+                        state is None
+                        or state.visible == dormant
+                        or (
+                            not dormant
+                            and state.geometry
+                            != panes.terminal_geometry(x2 - x1, y2 - y1)
+                        )
+                    ):
+                        wrong += 1
+        return wrong
+
+    def hit_regions(self):
+        width, height = self.size
+        regions = [((0, 0, width, 30), hittest.TAB_STRIP, self.window)]
+        if self.current:
+            for leaf, (x1, y1, x2, y2) in navigation.pane_rects(
+                self.current.child, width, height - 30
+            ).items():
+                regions.append(((x1, y1 + 30, x2, y1 + 50), hittest.HEADER, leaf))
+                regions.append(((x1, y1 + 50, x2, y2 + 30), hittest.TERMINAL, leaf))
+        return [((0, 0, width, height), self.window, regions)]
+
+    @workspace_operation("new_tab")
+    def new_tab(self, window=None, name=""):
+        leaf = self.spawn()
+        tab = self.layout.add_tab(window or self.window, leaf, name=name)
+        self.search_index.update(leaf, tab=tab)
+        if name:
+            self.search_index.rename_tab(tab, name)
+        self.switch_tab(tab)
+        return leaf
+
+    def flush(self):
+        # Pending geometry is applied once, when a transaction commits
+        if not self.transactions.depth:
+            self.scheduler.flush()
+
+    @contextlib.contextmanager
+    def transaction(self, name="command_batch"):
+        with self.transactions.transaction(name):
+            yield
+        self.flush()
+
+    def is_dormant(self, tab):
+        return self.dormant_tabs and tab is not self.selected.get(tab.parent)
+
+    @workspace_operation("switch_tab")
+    def switch_tab(self, tab):
+        previous = self.selected.get(tab.parent)
+        self.selected[tab.parent] = tab
+        if self.dormant_tabs and tab is not previous:
+            if previous is not None:
+                self.panes.set_dormant(previous, True)
+            self.panes.set_dormant(tab, False)
+        self.current = tab
+        self.hit_test.invalidate()
+        self.relayout(tab)
+        self.flush()
+
+    @workspace_operation("split")
+    def split(self, leaf, orientation, ratio=0.5):
+        new_leaf = self.spawn(self.is_dormant(leaf.tab()))
+        self.layout.split(leaf, new_leaf, orientation).ratio = ratio
+        self.search_index.update(new_leaf, tab=leaf.tab())
+        self.relayout(leaf.tab())
+        self.flush()
+        return new_leaf
+
+    @workspace_operation("close")
+    def close(self, leaf):
+        tab = leaf.tab()
+        self.layout.remove(leaf)
+        hwnd = leaf.payload
+        del self.hwnd_to_leaf[hwnd]
+        self.panes.close(leaf, hwnd)
+        self.relayout(tab)
+        self.flush()
+
+    @workspace_operation("drag_drop")
+    def drag_dock(self, leaf, target, orientation, moves=20):
+        # Like the drag in svanterm.py: the header of a terminal in the
+        # selected tab is dragged, passing over the strip selects the tab of
+        # the target, which hides the dragged terminal with the rest of its
+        # tab, and FinishDragDrop docks it
+        old_tab = leaf.tab()
+        if self.selected.get(old_tab.parent) is not old_tab:
+            self.switch_tab(old_tab)
+
+        # The mouse hook sees every move on the way to the target
+        width, height = self.size
+        for move in range(moves):
+            self.hit_test.hit(width * move // moves, height * move // moves)
+        if target.tab() is not old_tab:
+            self.switch_tab(target.tab())
+
+        self.layout.move(leaf, target, orientation)
+        self.search_index.update(leaf, tab=target.tab())
+        self.relayout(old_tab)
+        if target.tab() is not old_tab:
+            self.relayout(target.tab())
+        self.panes.dock(leaf, self.is_dormant(leaf.tab()))
+        self.flush()
+
+    def find(self, query):
+        for length in range(1, len(query) + 1):
+            self.search_index.search(query[:length])
+
+    def apply_titles(self, changes):
+        for hwnd, title in changes.items():
+            self.search_index.update(self.hwnd_to_leaf[hwnd], title=title)
+
+    def title_storm(self, rate=100, seconds=1.0):
+        start = self.clock.now
+        interval = 1.0 / rate
+        for step in range(int(rate * seconds)):
+            self.clock.advance(start + step * interval)
+            for hwnd in self.hwnd_to_leaf:
+                self.titles.title_changed(hwnd, "progress %d%%" % step)
+        self.clock.advance(start + seconds + 1)
+
+    @workspace_operation("resize_window")
+    def resize_window(self, width, height):
+        self.size = (width, height)
+        self.hit_test.invalidate()
+        for tab in self.window.tabs:
+            self.relayout(tab)
+        self.flush()
+
+    # ipc.CommandTarget, for scripts building a workspace
+    def new_window(self, name):
+        return self.new_tab(self.layout.add_window(), name)
+
+    def rename_tab(self, tab, name):
+        tab.name = name
+        self.search_index.rename_tab(tab, name)
+
+    def focus(self, leaf):
+        if self.selected.get(leaf.window()) is not leaf.tab():
+            self.switch_tab(leaf.tab())
+        self.focused = leaf
+        self.search_index.touch(leaf)
+
+    def title(self, leaf):
+        return self.search_index.title(leaf)
+
+    def selected_tab(self, window):
+        return self.selected.get(window)
+
+
+@benchmark
+def dormant_tabs(tabs=40, panes_per_tab=4, frames=30):
+    # Resizing the window with many tabs open and then going through all
+    # tabs, with every tab kept live vs. only the selected one
+    result = {}
+    for mode, dormant in (("live", False), ("dormant", True)):
+        workspace = Workspace(
+            tabs * panes_per_tab, panes_per_tab=panes_per_tab, dormant_tabs=dormant
+        )
+        stats = workspace.scheduler.stats
+        applied = stats.applied
+
+        def resize():
+            for frame in range(frames):
+                workspace.resize_window(1920 - frame * 4, 1050 - frame * 2)
+
+        def switch():
+            for tab in workspace.window.tabs:
+                workspace.switch_tab(tab)
+
+        resize_time, _ = timed(resize)
+        switch_time, _ = timed(switch)
+        result[mode + "_resize_frame_us"] = resize_time / frames * 1e6
+        result[mode + "_switch_us"] = switch_time / tabs * 1e6
+        result[mode + "_applied"] = stats.applied - applied
+        if dormant:
+            result["deferred"] = stats.deferred
+            result["replayed"] = stats.replayed
+    return result
+
+
+@benchmark
+def layout_transactions(panes=10, operations=50):
+    # Drag and drop the way SvanTerm does it: the terminal leaves its
+    # splitter, goes into a new one next to the target, which is sized in
+    # two steps, every step relayouts. Step by step vs. as one transaction.
+    result = {}
+    for mode in ("steps", "transaction"):
+        workspace = Workspace(panes)
+        stats = workspace.scheduler.stats
+        applied, batches = stats.applied, stats.batches
+
+        def drag(leaf, target):
+            old_tab = leaf.tab()
+            workspace.layout.remove(leaf)
+            workspace.relayout(old_tab)
+            workspace.flush()
+            split = workspace.layout.split(target, leaf, layout.VERTICAL)
+            for ratio in (0.3, 0.5):
+                split.ratio = ratio
+                workspace.relayout(target.tab())
+                workspace.flush()
+
+        def run():
+            for _ in range(operations):
+                # Within the tab shown, like the mouse would
+                leaf, target = workspace.generator.sample(
+                    list(layout.leaves(workspace.current)), 2
+                )
+                if not isinstance(leaf.parent, layout.Split):
+                    continue
+                if mode == "transaction":
+                    with workspace.transaction("drag_drop"):
+                        drag(leaf, target)
+                else:
+                    drag(leaf, target)
+
+        elapsed, _ = timed(run)
+        result[mode + "_us"] = elapsed / operations * 1e6
+        result[mode + "_moves"] = stats.applied - applied
+        result[mode + "_move_batches"] = stats.batches - batches
+    return result
+
+
+@benchmark
+def redundant_moves(tabs=10, panes_per_tab=10, switches=200):
+    # Switching between tabs resizes all terminals of the tab shown, like
+    # OnPageChanged does, while hardly any size changed since last shown
+    workspace = Workspace(tabs * panes_per_tab, panes_per_tab=panes_per_tab)
+    stats = workspace.scheduler.stats
+    requests, applied, skipped = stats.requests, stats.applied, stats.skipped
+    window_tabs = workspace.window.tabs
+
+    def switch():
+        for index in range(switches):
+            if index % 50 == 49:
+                width, height = workspace.size
+                workspace.resize_window(width - 10, height)
+            workspace.switch_tab(window_tabs[index % tabs])
+
+    elapsed, _ = timed(switch)
+    return {
+        "switch_us": elapsed / switches * 1e6,
+        "requests": stats.requests - requests,
+        "sent": stats.applied - applied,
+        "skipped": stats.skipped - skipped,
+    }
+
+
+def run_calls(calls):
+    # Stands in for the UI thread the command server hands batches to
+    while True:
+        callback, args = calls.get()
+        if callback is None:
+            return
+        callback(*args)
+
+
+@benchmark
+def command_channel(servers=20):
+    # A script opening a window with a tab per server, each split into a
+    # shell and a log pane, over the local socket: as one batch vs. one
+    # request per step like replayed keystrokes would
+    result = {}
+    for mode in ("batched", "unbatched"):
+        workspace = Workspace(1)
+        calls = queue.Queue()
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "channel.json")
+        server = ipc.CommandServer(
+            lambda commands: ipc.run_batch(workspace, commands),
+            lambda callback, *args: calls.put((callback, args)),
+            path,
+        )
+        server.start()
+        ui_thread = threading.Thread(target=run_calls, args=(calls,))
+        ui_thread.start()
+
+        def send(commands):
+            response = ipc.send_commands(commands, path)
+            if not response["ok"]:
+                raise ipc.CommandError(response["error"])
+            return response["results"]
+
+        def batched():
+            commands = [{"op": "window", "name": "server0"}]
+            for server_index in range(servers):
+                if server_index:
+                    commands.append({"op": "tab", "name": "server%d" % server_index})
+                commands.append({"op": "split", "orientation": "h", "ratio": 0.7})
+            commands.append({"op": "focus", "pane": "$0"})
+            send(commands)
+
+        def unbatched():
+            for server_index in range(servers):
+                if server_index:
+                    command = {"op": "tab", "window": [-1]}
+                else:
+                    command = {"op": "window"}
+                (pane,) = send([command])
+                send(
+                    [{"op": "name", "tab": pane[:2], "name": "server%d" % server_index}]
+                )
+                send([{"op": "split", "pane": pane, "orientation": "h", "ratio": 0.7}])
+            send([{"op": "focus", "pane": [-1, 0, 0]}])
+
+        moves = workspace.scheduler.stats.batches
+        elapsed, _ = timed(batched if mode == "batched" else unbatched)
+        result[mode + "_ms"] = elapsed * 1e3
+        result[mode + "_move_batches"] = workspace.scheduler.stats.batches - moves
+        if mode == "batched":
+            layout_time, (window_layout,) = timed(lambda: send([{"op": "layout"}]))
+            result["layout_query_ms"] = layout_time * 1e3
+            result["tabs"] = len(window_layout["windows"][-1]["tabs"])
+            # Nothing of a batch with a bad command is applied
+            panes = len(workspace.hwnd_to_leaf)
+            response = ipc.send_commands(
+                [{"op": "tab"}, {"op": "split", "pane": [9, 9, 9]}], path
+            )
+            result["rejected"] = (
+                not response["ok"] and len(workspace.hwnd_to_leaf) == panes
+            )
+
+        server.close()
+        calls.put((None, ()))
+        ui_thread.join()
+        os.rmdir(directory)
+    return result
+
+
+SUITE_SIZES = (10, 100, 1000)
+
+
+def run_suite(operation, operations=50, extra_panes=0):
+    # Time per operation at every size in SUITE_SIZES, extra_panes are
+    # added for operations that remove panes
+    result = {"wrong_terminals": 0}
+    for pane_count in SUITE_SIZES:
+        workspace = Workspace(pane_count + extra_panes)
+        elapsed, _ = timed(lambda: operation(workspace, operations))
+        result["%d_panes_us" % pane_count] = elapsed / operations * 1e6
+        result["wrong_terminals"] += workspace.check()
+    return result
+
+
+@benchmark
+def suite_split():
+    def split(workspace, count):
+        for _ in range(count):
+            workspace.split(workspace.random_leaf(), workspace.random_orientation())
+
+    return run_suite(split)
+
+
+@benchmark
+def suite_close():
+    def close(workspace, count):
+        for _ in range(count):
+            leaf = workspace.random_leaf()
+            while not isinstance(leaf.parent, layout.Split):
+                leaf = workspace.random_leaf()
+            workspace.close(leaf)
+
+    return run_suite(close, extra_panes=50)
+
+
+@benchmark
+def suite_tab_switch():
+    def switch(workspace, count):
+        tabs = workspace.window.tabs
+        for index in range(count):
+            workspace.switch_tab(tabs[index % len(tabs)])
+
+    return run_suite(switch)
+
+
+@benchmark
+def suite_drag_dock():
+    def drag(workspace, count):
+        for _ in range(count):
+            leaf = workspace.random_leaf()
+            target = workspace.random_leaf()
+            if target is leaf or not isinstance(leaf.parent, layout.Split):
+                continue
+            workspace.drag_dock(leaf, target, workspace.random_orientation())
+
+    return run_suite(drag)
+
+
+@benchmark
+def suite_find():
+    def find(workspace, count):
+        for index in range(count):
+            workspace.find(("db4vim", "build", "tail", "web1")[index % 4])
+
+    return run_suite(find)
+
+
+@benchmark
+def suite_title_storm():
+    # One operation is one second of every pane changing title at 100 Hz
+    def storm(workspace, count):
+        workspace.title_storm(seconds=count)
+
+    return run_suite(storm, operations=1)
+
+
+@benchmark
+def suite_resize_storm():
+    def resize(workspace, count):
+        for frame in range(count):
+            workspace.resize_window(1920 - frame * 4, 1050 - frame * 2)
+
+    return run_suite(resize, operations=30)
+
+
+# Correctness values reported next to the timings and what they must be,
+# any other value fails the run
+CHECKS = {
+    "non_adjacent": 0,
+    "results_ok": True,
+    "stale_final_geometry": 0,
+    "final_delivered": True,
+    "mismatches": 0,
+    "final_titles_ok": True,
+    "completed": True,
+    "roundtrip_ok": True,
+    "rejected": True,
+    "wrong_terminals": 0,
+}
+
+
+def failed_checks(results):
+    return [
+        ("%s.%s" % (name, key), value)
+        for name, result in sorted(results.items())
+        for key, value in sorted(result.items())
+        if key in CHECKS and value != CHECKS[key]
+    ]
+
+
+def timings(results):
+    return dict(
+        ("%s.%s" % (name, key), value)
+        for name, result in results.items()
+        for key, value in result.items()
+        if key.endswith(("_ms", "_us", "_ns"))
+    )
+
+
+def calibrate(runs=5):
+    # Fastest of a few runs of a fixed workload, in ms
+    def work():
+        counts = {}
+        for index in range(100000):
+            key = index % 997
+            counts[key] = counts.get(key, 0) + index
+        return sorted(counts.items(), key=lambda item: (item[1], item[0]))
+
+    return min(timed(work)[0] for _ in range(runs)) * 1000
+
+
+def regressions(baseline, results, tolerance, scale=1.0):
+    found = []
+    for key, value in sorted(timings(results).items()):
+        if key in baseline and value > baseline[key] * scale * (1 + tolerance):
+            found.append((key, baseline[key], value))
+    return found
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=1.0)
+    parser.add_argument("--reruns", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    def run(function):
+        result = function()
+        print(
+            "%-24s %s"
+            % (
+                function.__name__,
+                " ".join("%s=%.6g" % (key, value) for key, value in result.items()),
+            )
+        )
+        return result
+
+    # Before and after the benchmarks, the slower one counts
+    calibration = []
+    if args.save_baseline or args.compare:
+        calibration.append(calibrate())
+
+    results = {}
+    for function in BENCHMARKS:
+        if args.names and function.__name__ not in args.names:
+            continue
+
+        results[function.__name__] = run(function)
+
+    if calibration:
+        calibration.append(calibrate())
+        print("%-24s calibration_ms=%.6g" % ("calibration", max(calibration)))
+
+    failed = failed_checks(results)
+    for key, value in failed:
+        print("FAILED %s=%r" % (key, value))
+
+    if args.save_baseline:
+        baseline = timings(results)
+        baseline["calibration_ms"] = max(calibration)
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        scale = max(max(calibration) / baseline.get("calibration_ms", 1e9), 1.0)
+        print("Baseline timings scaled by %.2f for this machine" % scale)
+        found = regressions(baseline, results, args.tolerance, scale)
+
+        # A regression has to show up again, the benchmarks it was in run
+        # up to --reruns more times and the fastest timings count
+        for _ in range(args.reruns):
+            if not found:
+                break
+            names = set(key.split(".")[0] for key, _, _ in found)
+            for function in BENCHMARKS:
+                if function.__name__ not in names:
+                    continue
+                result = results[function.__name__]
+                for key, value in run(function).items():
+                    if key.endswith(("_ms", "_us", "_ns")):
+                        result[key] = min(result[key], value)
+            found = regressions(baseline, results, args.tolerance, scale)
+
+        for key, before, after in found:
+            print(
+                "REGRESSION %s %.6g -> %.6g (%+.0f%%)"
+                % (key, before, after, (after / before - 1) * 100)
+            )
+        if found:
+            return 1
+        print("No regressions against %s" % args.compare)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,223 @@
+# Everything SvanTerm asks of the window manager and the OS, behind one
+# interface. Win32Desktop in svanterm.py talks to Windows, FakeDesktop
+# simulates terminal windows, titles, focus and slow starting processes in
+# memory, so the code around them runs (and can be benchmarked) anywhere.
+
+import collections
+import itertools
+import threading
+
+import geometry
+
+
+class Desktop(geometry.WindowBackend):
+    def foreground_window(self):
+        raise NotImplementedError
+
+    def set_foreground_window(self, hwnd):
+        raise NotImplementedError
+
+    def set_focus(self, hwnd):
+        raise NotImplementedError
+
+    def window_text(self, hwnd):
+        raise NotImplementedError
+
+    def window_pid(self, hwnd):
+        raise NotImplementedError
+
+    def is_window(self, hwnd):
+        raise NotImplementedError
+
+    def is_ready(self, hwnd):
+        # Visible and with a caption, i.e. a terminal window done starting
+        raise NotImplementedError
+
+    def process_windows(self, pid):
+        raise NotImplementedError
+
+    def embed(self, hwnd, parent):
+        # Turn a top level window into a child window of parent
+        raise NotImplementedError
+
+    def show_window(self, hwnd, show):
+        raise NotImplementedError
+
+    def close_window(self, hwnd):
+        raise NotImplementedError
+
+    def start_process(self, args):
+        # Returns the pid
+        raise NotImplementedError
+
+    def kill_process(self, pid):
+        raise NotImplementedError
+
+    def key_pressed(self, vkey):
+        raise NotImplementedError
+
+    def open_signal(self, name):
+        # Named auto reset event shared between processes, returns the
+        # event and whether it already existed
+        raise NotImplementedError
+
+    def set_signal(self, event):
+        raise NotImplementedError
+
+    def wait_signal(self, event):
+        raise NotImplementedError
+
+
+class FakeWindow(object):
+    __slots__ = ("pid", "title", "ready", "visible", "parent", "geometry")
+
+    def __init__(self, pid, title, ready):
+        self.pid = pid
+        self.title = title
+        self.ready = ready
+        self.visible = ready
+        self.parent = None
+        self.geometry = None
+
+
+class FakeDesktop(Desktop):
+    # Processes started get a window titled title after spawn_delay seconds,
+    # on_window_shown(hwnd) is called for it like the EVENT_OBJECT_SHOW hook
+    # would. With steal_focus that window also takes the foreground,
+    # on_foreground(hwnd) is called for every foreground change like the
+    # EVENT_SYSTEM_FOREGROUND hook would. calls counts the calls per method,
+    # they would be syscalls.
+    def __init__(
+        self,
+        windows=0,
+        spawn_delay=0.0,
+        title="bash",
+        on_window_shown=None,
+        steal_focus=False,
+        on_foreground=None,
+    ):
+        self.windows = {}
+        self.calls = collections.Counter()
+        self.spawn_delay = spawn_delay
+        self.title = title
+        self.on_window_shown = on_window_shown
+        self.steal_focus = steal_focus
+        self.on_foreground = on_foreground
+        self.foreground = None
+        self.focus = None
+        self.pressed = set()
+        self.signals = {}
+        self.next_hwnd = itertools.count(1000)
+        self.next_pid = itertools.count(100000)
+        self.lock = threading.Lock()
+        for _ in range(windows):
+            self.create_window(next(self.next_pid))
+
+    def create_window(self, pid, title="", ready=True):
+        with self.lock:
+            hwnd = next(self.next_hwnd)
+            self.windows[hwnd] = FakeWindow(pid, title, ready)
+        return hwnd
+
+    def set_title(self, hwnd, title):
+        # What a program running in the terminal would do
+        self.windows[hwnd].title = title
+
+    def foreground_window(self):
+        self.calls["foreground_window"] += 1
+        return self.foreground
+
+    def set_foreground_window(self, hwnd):
+        self.calls["set_foreground_window"] += 1
+        self.activate(hwnd)
+
+    def activate(self, hwnd):
+        if hwnd == self.foreground:
+            return
+
+        self.foreground = hwnd
+        if self.on_foreground:
+            self.on_foreground(hwnd)
+
+    def set_focus(self, hwnd):
+        self.calls["set_focus"] += 1
+        self.focus = hwnd
+
+    def window_text(self, hwnd):
+        self.calls["window_text"] += 1
+        return self.windows[hwnd].title
+
+    def window_pid(self, hwnd):
+        self.calls["window_pid"] += 1
+        return self.windows[hwnd].pid
+
+    def is_window(self, hwnd):
+        self.calls["is_window"] += 1
+        return hwnd in self.windows
+
+    def is_ready(self, hwnd):
+        self.calls["is_ready"] += 1
+        return self.windows[hwnd].ready
+
+    def process_windows(self, pid):
+        self.calls["process_windows"] += 1
+        return [hwnd for hwnd in list(self.windows) if self.window_pid(hwnd) == pid]
+
+    def embed(self, hwnd, parent):
+        self.calls["embed"] += 1
+        self.windows[hwnd].parent = parent
+
+    def show_window(self, hwnd, show):
+        self.calls["show_window"] += 1
+        self.windows[hwnd].visible = show
+
+    def close_window(self, hwnd):
+        self.calls["close_window"] += 1
+        self.windows.pop(hwnd, None)
+
+    def move_windows(self, batch):
+        self.calls["move_windows"] += 1
+        for hwnd, window_geometry in batch:
+            window = self.windows.get(hwnd)
+            if window:
+                window.geometry = window_geometry
+
+    def start_process(self, args):
+        self.calls["start_process"] += 1
+        pid = next(self.next_pid)
+
+        def show():
+            hwnd = self.create_window(pid, self.title)
+            if self.steal_focus:
+                self.activate(hwnd)
+            if self.on_window_shown:
+                self.on_window_shown(hwnd)
+
+        if self.spawn_delay:
+            timer = threading.Timer(self.spawn_delay, show)
+            timer.daemon = True
+            timer.start()
+        else:
+            show()
+        return pid
+
+    def kill_process(self, pid):
+        self.calls["kill_process"] += 1
+        for hwnd, window in list(self.windows.items()):
+            if window.pid == pid:
+                del self.windows[hwnd]
+
+    def key_pressed(self, vkey):
+        self.calls["key_pressed"] += 1
+        return vkey in self.pressed
+
+    def open_signal(self, name):
+        existed = name in self.signals
+        return self.signals.setdefault(name, threading.Event()), existed
+
+    def set_signal(self, event):
+        event.set()
+
+    def wait_signal(self, event):
+        event.wait()
+        event.clear()
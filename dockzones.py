@@ -0,0 +1,112 @@
+# Where a dragged terminal or tab would be dropped. The zones are computed
+# once from the hit test regions when the drag starts: every terminal is
+# cut along its diagonals into four zones (dock to the top, left, right or
+# bottom of it), a tab strip takes the terminal or tab as a new tab and
+# anywhere outside of SvanTerm's windows a new window is opened. A mouse
+# move is then a lookup of the zone under the mouse, the dock hint only
+# needs to move when that zone changed.
+
+from hittest import HEADER, TAB_STRIP, TERMINAL, contains
+
+DOCK_TOP = 1
+DOCK_LEFT = 2
+DOCK_RIGHT = 3
+DOCK_BOTTOM = 4
+DOCK_NEW_WINDOW = 5
+
+# A zone is (kind, target, dock_pos, hint), hint being the rect the dock
+# hint covers as (x, y, width, height). The new window zone has no hint of
+# its own, it is shown where the window will open, next to the mouse.
+NEW_WINDOW = (None, DOCK_NEW_WINDOW, None, None)
+
+
+def terminal_zones(rect, target):
+    x1, y1, x2, y2 = rect
+    width = x2 - x1
+    height = y2 - y1
+    half_width = width // 2
+    half_height = height // 2
+    return {
+        DOCK_TOP: (TERMINAL, target, DOCK_TOP, (x1, y1, width, half_height)),
+        DOCK_LEFT: (TERMINAL, target, DOCK_LEFT, (x1, y1, half_width, height)),
+        DOCK_RIGHT: (
+            TERMINAL,
+            target,
+            DOCK_RIGHT,
+            (x1 + half_width, y1, width - half_width, height),
+        ),
+        DOCK_BOTTOM: (
+            TERMINAL,
+            target,
+            DOCK_BOTTOM,
+            (x1, y1 + half_height, width, height - half_height),
+        ),
+    }
+
+
+class DockZones(object):
+    # windows is what the builder of a HitTestCache returns. The header of
+    # a terminal belongs to terminal_of(header) and its zones. With
+    # tabs_only (a whole tab is dragged) only tab strips are drop targets,
+    # anywhere else a new window is opened.
+    def __init__(self, windows, tabs_only=False, terminal_of=lambda header: header):
+        self.windows = windows
+        self.tabs_only = tabs_only
+        self.zones = []
+        self.lookups = 0
+
+        for window_rect, window, regions in windows:
+            tab_strips = []
+            bounds = {}
+            order = []
+            for rect, kind, target in regions:
+                if kind == TAB_STRIP:
+                    x1, y1, x2, y2 = rect
+                    tab_strips.append(
+                        (rect, (TAB_STRIP, target, None, (x1, y1, x2 - x1, y2 - y1)))
+                    )
+                elif kind in (HEADER, TERMINAL) and not tabs_only:
+                    if kind == HEADER:
+                        target = terminal_of(target)
+                    if target not in bounds:
+                        bounds[target] = rect
+                        order.append(target)
+                    else:
+                        bounds[target] = (
+                            min(bounds[target][0], rect[0]),
+                            min(bounds[target][1], rect[1]),
+                            max(bounds[target][2], rect[2]),
+                            max(bounds[target][3], rect[3]),
+                        )
+
+            terminals = []
+            for target in order:
+                rect = bounds[target]
+                center = ((rect[0] + rect[2]) / 2.0, (rect[1] + rect[3]) / 2.0)
+                terminals.append((rect, center, terminal_zones(rect, target)))
+            self.zones.append((window_rect, tab_strips, terminals))
+
+    def find(self, x, y):
+        # The zone under the point, None if it is on one of the windows but
+        # not on a drop target
+        self.lookups += 1
+        for window_rect, tab_strips, terminals in self.zones:
+            if not contains(window_rect, x, y):
+                continue
+
+            for rect, zone in tab_strips:
+                if contains(rect, x, y):
+                    return zone
+            if self.tabs_only:
+                return NEW_WINDOW
+
+            for rect, center, zones in terminals:
+                if contains(rect, x, y):
+                    from_center_x = x - center[0]
+                    from_center_y = y - center[1]
+                    if abs(from_center_x) > abs(from_center_y):
+                        return zones[DOCK_LEFT if from_center_x <= 0 else DOCK_RIGHT]
+                    return zones[DOCK_TOP if from_center_y <= 0 else DOCK_BOTTOM]
+            return None
+
+        return NEW_WINDOW
@@ -0,0 +1,70 @@
+# A freshly started alacritty may take the foreground when its window shows
+# up, before it is hidden or embedded. While a terminal process is being
+# spawned the guard watches the foreground changes (EVENT_SYSTEM_FOREGROUND)
+# and when a window of that process takes the foreground gives it back to
+# the window that had it. Foreground changes to any other window are left
+# alone and become the window to give it back to.
+
+import threading
+import time
+
+
+class FocusGuardStats(object):
+    def __init__(self):
+        self.guarded = 0
+        self.restored = 0
+        self.expired = 0
+
+    def summary(self):
+        return {
+            "guarded": self.guarded,
+            "restored": self.restored,
+            "expired": self.expired,
+        }
+
+
+class FocusGuard(object):
+    # guard(pid) starts protecting the foreground from the windows of pid,
+    # release(pid) ends it once the window is adopted, at the latest it ends
+    # timeout seconds later. on_foreground(hwnd) must be called on the UI
+    # thread for every foreground change, it returns whether the change was
+    # undone. desktop is a desktop.Desktop.
+    def __init__(self, desktop, timeout=1.0, clock=time.time):
+        self.desktop = desktop
+        self.timeout = timeout
+        self.clock = clock
+        self.stats = FocusGuardStats()
+        self.deadlines = {}
+        self.foreground = None
+        self.lock = threading.Lock()
+
+    def guard(self, pid, timeout=None):
+        with self.lock:
+            if not self.deadlines:
+                self.foreground = self.desktop.foreground_window()
+            self.deadlines[pid] = self.clock() + (timeout or self.timeout)
+            self.stats.guarded += 1
+
+    def release(self, pid):
+        with self.lock:
+            self.deadlines.pop(pid, None)
+
+    def on_foreground(self, hwnd):
+        now = self.clock()
+        with self.lock:
+            for pid, deadline in list(self.deadlines.items()):
+                if deadline < now:
+                    del self.deadlines[pid]
+                    self.stats.expired += 1
+            if not self.deadlines:
+                return False
+            pids = set(self.deadlines)
+
+        if self.desktop.window_pid(hwnd) not in pids:
+            self.foreground = hwnd
+            return False
+
+        self.stats.restored += 1
+        if self.foreground:
+            self.desktop.set_foreground_window(self.foreground)
+        return True
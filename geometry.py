@@ -0,0 +1,248 @@
+# Moving the embedded terminal windows. The UI thread hands in snapshots of
+# the wanted geometry, a worker thread coalesces them per window and applies
+# them in batches once the requests have settled.
+
+import collections
+import threading
+import time
+
+
+class WindowBackend(object):
+    # move_windows() gets a list of (hwnd, (x, y, width, height))
+    def move_windows(self, batch):
+        raise NotImplementedError
+
+
+class ResizeStats(object):
+    def __init__(self, samples=200):
+        self.requests = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.skipped = 0
+        self.batches = 0
+        self.live_pushed = 0
+        self.live_dropped = 0
+        self.deferred = 0
+        self.replayed = 0
+        self.latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "live_pushed": self.live_pushed,
+            "live_dropped": self.live_dropped,
+            "deferred": self.deferred,
+            "replayed": self.replayed,
+            "latency_p50_ms": latencies[count // 2] * 1000 if count else 0.0,
+            "latency_max_ms": latencies[-1] * 1000 if count else 0.0,
+        }
+
+
+class ResizeScheduler(threading.Thread):
+    # A burst of requests is applied when no new request came in for
+    # settle_delay, or at the latest max_delay after the first one. Windows
+    # that were never moved before wait new_window_delay, a freshly embedded
+    # alacritty sometimes ignores a size set right away.
+    #
+    # While something is live resized (a sash or frame drag) batches are
+    # applied at most live_rate times per second, the geometry in between is
+    # dropped and the final one is pushed as soon as the drag ends.
+    #
+    # Dormant windows (the terminals of background tabs) aren't moved at
+    # all, only their last requested geometry is kept and requested when
+    # they wake up.
+    #
+    # The last geometry applied to every window is kept, a window is only
+    # moved when its geometry differs, e.g. a tab shown again without any
+    # size change moves nothing.
+    #
+    # While held (during a layout transaction) nothing is applied, on the
+    # last release whatever is pending is applied right away.
+    def __init__(
+        self,
+        backend,
+        settle_delay=0.008,
+        max_delay=0.05,
+        new_window_delay=0.1,
+        live_rate=30,
+        clock=time.time,
+    ):
+        super(ResizeScheduler, self).__init__()
+        self.daemon = True
+        self.backend = backend
+        self.settle_delay = settle_delay
+        self.max_delay = max_delay
+        self.new_window_delay = new_window_delay
+        self.live_rate = live_rate
+        self.clock = clock
+        self.stats = ResizeStats()
+        self.pending = {}
+        self.known = set()
+        self.geometries = {}
+        self.last_request = None
+        self.last_apply = 0
+        self.live_sources = set()
+        self.holds = 0
+        self.dormant = set()
+        self.deferred = {}
+        self.flush_requested = False
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def request(self, hwnd, geometry):
+        now = self.clock()
+        with self.condition:
+            self.stats.requests += 1
+            if hwnd in self.dormant:
+                self.stats.deferred += 1
+                self.deferred[hwnd] = geometry
+                return
+
+            if hwnd in self.pending:
+                self.stats.coalesced += 1
+                if self.live_sources:
+                    self.stats.live_dropped += 1
+                self.pending[hwnd] = (geometry, self.pending[hwnd][1])
+            else:
+                self.pending[hwnd] = (geometry, now)
+            self.last_request = now
+            self.condition.notify()
+
+    def set_live(self, source, live):
+        with self.condition:
+            if live:
+                self.live_sources.add(source)
+            elif source in self.live_sources:
+                self.live_sources.discard(source)
+                if not self.live_sources:
+                    self.flush_requested = True
+                    self.condition.notify()
+
+    def hold(self):
+        with self.condition:
+            self.holds += 1
+
+    def release(self):
+        # Returns the number of windows waiting to be moved
+        with self.condition:
+            self.holds -= 1
+            if not self.holds:
+                self.flush_requested = True
+                self.condition.notify()
+            return len(self.pending)
+
+    def set_dormant(self, hwnds, dormant):
+        now = self.clock()
+        with self.condition:
+            for hwnd in hwnds:
+                if dormant:
+                    self.dormant.add(hwnd)
+                    if hwnd in self.pending:
+                        self.stats.deferred += 1
+                        self.deferred[hwnd] = self.pending.pop(hwnd)[0]
+                elif hwnd in self.dormant:
+                    self.dormant.discard(hwnd)
+                    if hwnd in self.deferred:
+                        self.stats.replayed += 1
+                        self.pending[hwnd] = (self.deferred.pop(hwnd), now)
+                        self.last_request = now
+            self.condition.notify()
+
+    def forget(self, hwnd):
+        with self.condition:
+            self.pending.pop(hwnd, None)
+            self.known.discard(hwnd)
+            self.dormant.discard(hwnd)
+            self.deferred.pop(hwnd, None)
+            self.geometries.pop(hwnd, None)
+
+    def delay(self):
+        # Must be called with the condition held, returns how long to wait
+        # before the pending batch is due
+        if self.holds:
+            # Woken up by release()
+            return self.max_delay
+
+        first = min(requested for _, requested in self.pending.values())
+        now = self.clock()
+        if any(hwnd not in self.known for hwnd in self.pending):
+            return first + self.new_window_delay - now
+
+        if self.flush_requested:
+            return 0
+
+        if self.live_sources:
+            return self.last_apply + 1.0 / self.live_rate - now
+
+        settle = self.last_request + self.settle_delay - now
+        return min(settle, first + self.max_delay - now)
+
+    def take_batch(self):
+        with self.condition:
+            while not self.stopped:
+                # Requests can be forgotten or go dormant while waiting
+                if not self.pending:
+                    self.condition.wait()
+                    continue
+
+                delay = self.delay()
+                if delay <= 0:
+                    break
+                self.condition.wait(delay)
+
+            batch = self.pending
+            self.pending = {}
+            self.known.update(batch)
+            self.flush_requested = False
+            return batch
+
+    def flush(self):
+        # Apply whatever is pending right away, used by run() and headless
+        # callers driving the scheduler without the thread
+        with self.condition:
+            batch = self.pending
+            self.pending = {}
+            self.known.update(batch)
+        self.apply(batch)
+
+    def apply(self, batch):
+        if not batch:
+            return
+
+        moves = [
+            (hwnd, geometry)
+            for hwnd, (geometry, _) in batch.items()
+            if self.geometries.get(hwnd) != geometry
+        ]
+        self.stats.skipped += len(batch) - len(moves)
+        if moves:
+            self.backend.move_windows(moves)
+            self.stats.batches += 1
+        with self.condition:
+            for hwnd, geometry in moves:
+                # Unless forgotten in the meantime
+                if hwnd in self.known:
+                    self.geometries[hwnd] = geometry
+
+        now = self.clock()
+        self.last_apply = now
+        self.stats.applied += len(moves)
+        if self.live_sources:
+            self.stats.live_pushed += len(moves)
+        for _, requested in batch.values():
+            self.stats.latencies.append(now - requested)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while not self.stopped:
+            self.apply(self.take_batch())
@@ -0,0 +1,67 @@
+# Screen rectangles of SvanTerm's own windows and of the parts of them the
+# mouse hook reacts to, so a click anywhere else on the desktop is rejected
+# without asking the window manager. The rectangles are rebuilt lazily after
+# the layout version changed or invalidate() was called.
+
+WINDOW = 0
+TAB_STRIP = 1
+HEADER = 2
+TERMINAL = 3
+
+
+def contains(rect, x, y):
+    return rect[0] <= x < rect[2] and rect[1] <= y < rect[3]
+
+
+class HitTestCache(object):
+    # builder() returns a list of (window_rect, window, regions) with the
+    # topmost window first, regions being (rect, kind, target) with the
+    # topmost region first. Rects are (x1, y1, x2, y2) in screen pixels.
+    def __init__(self, builder, version=lambda: None):
+        self.builder = builder
+        self.version = version
+        self.windows = None
+        self.built_version = None
+        self.builds = 0
+        self.lookups = 0
+        self.outside = 0
+
+    def invalidate(self):
+        self.windows = None
+
+    def rebuild_if_needed(self):
+        version = self.version()
+        if self.windows is None or version != self.built_version:
+            self.windows = self.builder()
+            self.built_version = version
+            self.builds += 1
+
+    def regions(self):
+        self.rebuild_if_needed()
+        return self.windows
+
+    def hit(self, x, y):
+        # (kind, target) of the region under the point, None if outside of
+        # all of SvanTerm's windows
+        self.lookups += 1
+        self.rebuild_if_needed()
+
+        for window_rect, window, regions in self.windows:
+            if contains(window_rect, x, y):
+                for rect, kind, target in regions:
+                    if contains(rect, x, y):
+                        return kind, target
+                return WINDOW, window
+
+        self.outside += 1
+        return None
+
+    def rect(self, target):
+        self.rebuild_if_needed()
+        for window_rect, window, regions in self.windows:
+            if window is target:
+                return window_rect
+            for rect, kind, region_target in regions:
+                if region_target is target:
+                    return rect
+        return None
@@ -0,0 +1,414 @@
+# Local command channel for scripts. SvanTerm listens on 127.0.0.1 and
+# writes the port and a token to the channel file, a client sends one JSON
+# request per line and gets one JSON response line back:
+#
+#   {"token": "...", "commands": [{"op": "window", "name": "db"}, ...]}
+#   {"ok": true, "results": [...]} or {"ok": false, "error": "..."}
+#
+# Commands:
+#   {"op": "window", "name": ""}                       new window with a tab
+#   {"op": "tab", "window": W, "name": ""}             new tab
+#   {"op": "split", "pane": P, "orientation": "v", "ratio": 0.5}
+#   {"op": "name", "tab": T, "name": "..."}            rename a tab
+#   {"op": "focus", "pane": P}
+#   {"op": "layout"}                                   the layout as JSON
+#
+# Windows, tabs and panes are referred to by position, [window], [window,
+# tab] and [window, tab, pane], panes numbered left/top first like the
+# layout query lists them. "$N" refers to what command N of the same batch
+# created, the window, tab or pane depending on what is asked for. Without
+# a window a tab goes to the last window the batch created (or the first
+# one), without a pane a split splits the last pane the batch created.
+# window, tab and split return the position of the new pane.
+#
+# A batch is checked as a whole before anything is done, a bad command
+# rejects the batch without changing anything. The commands then run as one
+# layout transaction, which only holds back redraws and terminal moves, it
+# doesn't undo anything: should a command still fail (e.g. SvanTerm fails
+# to create a window) the commands before it stay applied.
+#
+# From a shell: python ipc.py batch.json (or the batch on stdin)
+
+import argparse
+import binascii
+import contextlib
+import hmac
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+
+import layout
+from session import ORIENTATIONS, ORIENTATION_CODES
+
+CHANNEL_PATH = os.path.join(os.path.expanduser("~"), "svanterm-commands.json")
+OPS = ("window", "tab", "split", "name", "focus", "layout")
+CREATING_OPS = ("window", "tab", "split")
+DEPTHS = {"window": 1, "tab": 2, "pane": 3}
+
+
+class CommandError(ValueError):
+    pass
+
+
+class CommandTarget(object):
+    # What the commands act on, the windows of SvanTerm or a simulation.
+    # new_window, new_tab and split return the Leaf of the new pane.
+    layout = None
+
+    def transaction(self):
+        # Context manager the whole batch runs in
+        return contextlib.nullcontext()
+
+    def new_window(self, name):
+        raise NotImplementedError
+
+    def new_tab(self, window, name):
+        raise NotImplementedError
+
+    def split(self, leaf, orientation, ratio):
+        raise NotImplementedError
+
+    def rename_tab(self, tab, name):
+        raise NotImplementedError
+
+    def focus(self, leaf):
+        raise NotImplementedError
+
+    def title(self, leaf):
+        raise NotImplementedError
+
+    def selected_tab(self, window):
+        raise NotImplementedError
+
+
+class Created(object):
+    # Reference to what an earlier command of the batch created
+    def __init__(self, index):
+        self.index = index
+
+
+def resolve(model, reference, kind, created):
+    if isinstance(reference, str):
+        try:
+            index = int(reference[1:]) if reference.startswith("$") else -1
+        except ValueError:
+            index = -1
+        if index not in created:
+            raise CommandError(
+                "%r doesn't refer to an earlier window/tab/split" % reference
+            )
+        return Created(index)
+
+    depth = DEPTHS[kind]
+    if (
+        not isinstance(reference, list)
+        or len(reference) != depth
+        or not all(isinstance(index, int) for index in reference)
+    ):
+        raise CommandError(
+            "A %s is [%s]" % (kind, ", ".join(["window", "tab", "pane"][:depth]))
+        )
+
+    try:
+        node = model.windows[reference[0]]
+        if depth > 1:
+            node = node.tabs[reference[1]]
+        if depth > 2:
+            node = list(layout.leaves(node))[reference[2]]
+    except IndexError:
+        raise CommandError("No %s %r" % (kind, reference))
+    return node
+
+
+def text(command, key):
+    value = command.get(key, "")
+    if not isinstance(value, str):
+        raise CommandError("%s must be a string" % key)
+    return value
+
+
+def parse_batch(model, commands):
+    # Checks the batch and resolves the positions, before anything changes
+    if not isinstance(commands, list):
+        raise CommandError("Expected a list of commands")
+
+    steps = []
+    created = set()
+    last_window = None
+    last_pane = None
+    for index, command in enumerate(commands):
+        if not isinstance(command, dict) or command.get("op") not in OPS:
+            raise CommandError(
+                "Command %d: op must be one of %s" % (index, ", ".join(OPS))
+            )
+
+        op = command["op"]
+        args = {}
+        try:
+            if op == "window":
+                args["name"] = text(command, "name")
+            elif op == "tab":
+                args["name"] = text(command, "name")
+                if "window" in command:
+                    args["window"] = resolve(
+                        model, command["window"], "window", created
+                    )
+                elif last_window is not None:
+                    args["window"] = last_window
+                elif model.windows:
+                    args["window"] = model.windows[0]
+                else:
+                    raise CommandError("No window for the tab")
+            elif op == "split":
+                if "pane" in command:
+                    args["pane"] = resolve(model, command["pane"], "pane", created)
+                elif last_pane is not None:
+                    args["pane"] = last_pane
+                else:
+                    raise CommandError("No pane to split")
+                try:
+                    args["orientation"] = ORIENTATION_CODES[
+                        command.get("orientation", "v")
+                    ]
+                    args["ratio"] = min(
+                        max(float(command.get("ratio", 0.5)), 0.05), 0.95
+                    )
+                except (KeyError, TypeError, ValueError):
+                    raise CommandError('orientation is "h" or "v", ratio a number')
+            elif op == "name":
+                args["tab"] = resolve(model, command.get("tab"), "tab", created)
+                args["name"] = text(command, "name")
+            elif op == "focus":
+                args["pane"] = resolve(model, command.get("pane"), "pane", created)
+        except CommandError as error:
+            raise CommandError("Command %d: %s" % (index, error))
+
+        if op in CREATING_OPS:
+            created.add(index)
+            last_pane = Created(index)
+            if op == "window":
+                last_window = last_pane
+        steps.append((op, args))
+    return steps
+
+
+def address(model, leaf):
+    tab = leaf.tab()
+    window = tab.parent
+    return [
+        model.windows.index(window),
+        window.tabs.index(tab),
+        list(layout.leaves(tab)).index(leaf),
+    ]
+
+
+def dump_layout(target):
+    model = target.layout
+    windows = []
+    for window_index, window in enumerate(model.windows):
+        selected = target.selected_tab(window)
+        tabs = []
+        for tab_index, tab in enumerate(window.tabs):
+            panes = [0]
+
+            def dump_panes(node):
+                if isinstance(node, layout.Split):
+                    return {
+                        "split": ORIENTATIONS[node.orientation],
+                        "ratio": round(node.ratio, 3),
+                        "first": dump_panes(node.first),
+                        "second": dump_panes(node.second),
+                    }
+
+                pane = [window_index, tab_index, panes[0]]
+                panes[0] += 1
+                return {"pane": pane, "title": target.title(node)}
+
+            tabs.append(
+                {
+                    "name": tab.name,
+                    "selected": tab is selected,
+                    "panes": dump_panes(tab.child) if tab.child is not None else None,
+                }
+            )
+        windows.append({"tabs": tabs})
+    return {"windows": windows}
+
+
+def run_batch(target, commands):
+    steps = parse_batch(target.layout, commands)
+    created = {}
+    results = []
+
+    def get(reference, kind):
+        if not isinstance(reference, Created):
+            return reference
+        leaf = created[reference.index]
+        if kind == "window":
+            return leaf.window()
+        if kind == "tab":
+            return leaf.tab()
+        return leaf
+
+    with target.transaction():
+        for index, (op, args) in enumerate(steps):
+            result = None
+            if op == "window":
+                created[index] = target.new_window(args["name"])
+            elif op == "tab":
+                created[index] = target.new_tab(
+                    get(args["window"], "window"), args["name"]
+                )
+            elif op == "split":
+                created[index] = target.split(
+                    get(args["pane"], "pane"), args["orientation"], args["ratio"]
+                )
+            elif op == "name":
+                target.rename_tab(get(args["tab"], "tab"), args["name"])
+            elif op == "focus":
+                target.focus(get(args["pane"], "pane"))
+            else:
+                result = dump_layout(target)
+            results.append(result)
+
+    # Positions only once the whole batch is in place
+    for index, leaf in created.items():
+        results[index] = address(target.layout, leaf)
+    return results
+
+
+class CommandServer(threading.Thread):
+    # execute(commands) runs a batch and returns its results, it is called
+    # through deliver(callback), which must run callback on the thread that
+    # owns the layout
+    def __init__(self, execute, deliver, path=CHANNEL_PATH, timeout=30):
+        super(CommandServer, self).__init__()
+        self.daemon = True
+        self.execute = execute
+        self.deliver = deliver
+        self.path = path
+        self.timeout = timeout
+        self.token = binascii.hexlify(os.urandom(16)).decode("ascii")
+        self.requests = 0
+        self.failures = 0
+        self.stopped = False
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen(5)
+
+        # The token is all that keeps other users of the machine out. The
+        # mode makes the file only readable by the user on POSIX, Windows
+        # only takes the read-only flag from it, there the file is protected
+        # by the ACL of the user's profile directory it is in
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as channel_file:
+            json.dump(
+                {"port": self.socket.getsockname()[1], "token": self.token},
+                channel_file,
+            )
+
+    def run(self):
+        while not self.stopped:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return
+
+            thread = threading.Thread(target=self.serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, connection):
+        with connection, connection.makefile("rwb") as stream:
+            for line in stream:
+                response = self.handle(line)
+                stream.write(json.dumps(response).encode("utf-8") + b"\n")
+                stream.flush()
+
+    def handle(self, line):
+        try:
+            request = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return {"ok": False, "error": "Invalid JSON"}
+
+        # compare_digest only takes ASCII strings, any other token is bytes
+        if not isinstance(request, dict) or not hmac.compare_digest(
+            str(request.get("token", "")).encode("utf-8"), self.token.encode("ascii")
+        ):
+            return {"ok": False, "error": "Invalid token"}
+
+        responses = queue.Queue(1)
+
+        def execute():
+            try:
+                responses.put(
+                    {"ok": True, "results": self.execute(request.get("commands"))}
+                )
+            except CommandError as error:
+                responses.put({"ok": False, "error": str(error)})
+            except Exception as error:
+                responses.put({"ok": False, "error": "Failed: %s" % error})
+                raise
+
+        self.requests += 1
+        self.deliver(execute)
+        try:
+            response = responses.get(timeout=self.timeout)
+        except queue.Empty:
+            response = {"ok": False, "error": "Timed out"}
+        if not response["ok"]:
+            self.failures += 1
+        return response
+
+    def close(self):
+        self.stopped = True
+        self.socket.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def send_commands(commands, path=CHANNEL_PATH, timeout=30):
+    with open(path) as channel_file:
+        channel = json.load(channel_file)
+
+    request = {"token": channel["token"], "commands": commands}
+    connection = socket.create_connection(("127.0.0.1", channel["port"]), timeout)
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise CommandError("SvanTerm closed the connection")
+    return json.loads(line.decode("utf-8"))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Send commands to SvanTerm")
+    parser.add_argument(
+        "batch", nargs="?", help="JSON list of commands, stdin if omitted"
+    )
+    parser.add_argument("--channel", default=CHANNEL_PATH)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.batch:
+            with open(args.batch) as batch_file:
+                commands = json.load(batch_file)
+        else:
+            commands = json.load(sys.stdin)
+        response = send_commands(commands, args.channel)
+    except (OSError, ValueError) as error:
+        print("Failed: %s" % error, file=sys.stderr)
+        return 1
+
+    print(json.dumps(response, indent=1))
+    return 0 if response["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
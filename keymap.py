@@ -0,0 +1,159 @@
+# Keyboard shortcuts. Bindings like "Ctrl+Shift+T" are compiled into a
+# table keyed on (modifiers, virtual key). The modifier state is tracked
+# from the key events of the keyboard hook itself, so looking up a key
+# that isn't a hotkey is one dict lookup without any syscalls.
+
+import configparser
+
+CTRL = 1
+SHIFT = 2
+ALT = 4
+
+# Left modifier keys only, right alt is AltGr on many keyboard layouts
+MODIFIER_KEYS = {0xA2: CTRL, 0xA0: SHIFT, 0xA4: ALT}
+MODIFIER_NAMES = {"CTRL": CTRL, "SHIFT": SHIFT, "ALT": ALT}
+
+# https://docs.microsoft.com/en-us/windows/win32/inputdev/virtual-key-codes
+KEY_NAMES = {
+    "PLUS": 0xBB,
+    "MINUS": 0xBD,
+    "COMMA": 0xBC,
+    "PERIOD": 0xBE,
+    "SPACE": 0x20,
+    "TAB": 0x09,
+    "ENTER": 0x0D,
+    "LEFT": 0x25,
+    "UP": 0x26,
+    "RIGHT": 0x27,
+    "DOWN": 0x28,
+}
+KEY_NAMES.update(("F%d" % number, 0x6F + number) for number in range(1, 25))
+
+DEFAULT_KEYMAP = {
+    "new_tab": "Ctrl+Shift+T",
+    "close_tab": "Ctrl+Shift+W",
+    "previous_tab": "Ctrl+Shift+H",
+    "next_tab": "Ctrl+Shift+L",
+    "rename_tab": "Ctrl+Shift+R",
+    "split_vertical": "Alt+Shift+Plus",
+    "split_horizontal": "Alt+Shift+Minus",
+    "close_terminal": "Ctrl+Shift+D",
+    "maximize_terminal": "Alt+M",
+    "focus_left": "Alt+H",
+    "focus_down": "Alt+J",
+    "focus_up": "Alt+K",
+    "focus_right": "Alt+L",
+    "sash_left": "Alt+Shift+H",
+    "sash_down": "Alt+Shift+J",
+    "sash_up": "Alt+Shift+K",
+    "sash_right": "Alt+Shift+L",
+    "new_window": "Ctrl+Shift+N",
+    "previous_window": "Ctrl+Shift+K",
+    "next_window": "Ctrl+Shift+J",
+    "find": "Alt+F",
+    "toggle_tracing": "Ctrl+Alt+Shift+P",
+}
+
+
+class KeymapError(ValueError):
+    pass
+
+
+def parse_key(binding):
+    modifiers = 0
+    parts = [part.strip().upper() for part in binding.split("+")]
+    # "Alt+Shift++" binds the plus key
+    if binding.strip().endswith("++"):
+        parts = parts[:-2] + ["PLUS"]
+
+    for part in parts[:-1]:
+        if part not in MODIFIER_NAMES:
+            raise KeymapError("Unknown modifier %r in %r" % (part, binding))
+        modifiers |= MODIFIER_NAMES[part]
+
+    key = parts[-1]
+    if key in KEY_NAMES:
+        return modifiers, KEY_NAMES[key]
+    if len(key) == 1 and ("A" <= key <= "Z" or "0" <= key <= "9"):
+        return modifiers, ord(key)
+    if key.startswith("0X"):
+        try:
+            return modifiers, int(key, 16)
+        except ValueError:
+            pass
+
+    raise KeymapError("Unknown key %r in %r" % (key, binding))
+
+
+def format_key(modifiers, vkey):
+    names = [name.title() for name, bit in MODIFIER_NAMES.items() if modifiers & bit]
+    for name, code in KEY_NAMES.items():
+        if code == vkey:
+            return "+".join(names + [name.title()])
+    if 0x30 <= vkey <= 0x5A:
+        return "+".join(names + [chr(vkey)])
+    return "+".join(names + ["0x%02X" % vkey])
+
+
+def compile_keymap(keymap, actions=None):
+    # keymap maps action names to one or more comma separated bindings
+    table = {}
+    for action, bindings in keymap.items():
+        if actions is not None and action not in actions:
+            raise KeymapError("Unknown action %r" % action)
+
+        for binding in bindings.split(","):
+            if not binding.strip():
+                continue
+            key = parse_key(binding)
+            if key in table and table[key] != action:
+                raise KeymapError(
+                    "%s is bound to both %s and %s"
+                    % (format_key(*key), table[key], action)
+                )
+            table[key] = action
+
+    return table
+
+
+def load_keymap(path, actions=None):
+    # Defaults overridden by the [keys] section of the config file, an empty
+    # value unbinds the action
+    keymap = dict(DEFAULT_KEYMAP)
+    config = configparser.ConfigParser()
+    try:
+        config.read(path)
+    except configparser.Error as error:
+        raise KeymapError(str(error))
+
+    if config.has_section("keys"):
+        keymap.update(config.items("keys"))
+
+    return compile_keymap(keymap, actions)
+
+
+class KeyDispatcher(object):
+    def __init__(self, table):
+        self.table = table
+        self.modifiers = 0
+
+    def key_event(self, vkey, down):
+        # Returns the action bound to vkey with the current modifiers
+        bit = MODIFIER_KEYS.get(vkey)
+        if bit is not None:
+            if down:
+                self.modifiers |= bit
+            else:
+                self.modifiers &= ~bit
+            return None
+
+        if not down:
+            return None
+
+        return self.table.get((self.modifiers, vkey))
+
+    def resync(self, modifiers, vkey):
+        # The tracked state can be wrong if the hook missed events (e.g. it
+        # timed out), the caller checks the real state on hits
+        self.modifiers = modifiers
+        return self.table.get((modifiers, vkey))
@@ -0,0 +1,212 @@
+# Headless model of the window/tab/split layout. The wx widgets mirror this
+# tree, every structural change goes through Layout so lookups like "which
+# tab is this terminal in" or "which terminal gets the focus when this one
+# closes" are a walk up the tree instead of a walk over all widgets.
+
+# Same values as wx.SPLIT_HORIZONTAL/wx.SPLIT_VERTICAL
+HORIZONTAL = 1
+VERTICAL = 2
+
+
+class Node(object):
+    __slots__ = ("parent", "payload")
+
+    def __init__(self, payload=None):
+        self.parent = None
+        self.payload = payload
+
+    def root(self):
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def tab(self):
+        node = self
+        while node is not None and not isinstance(node, Tab):
+            node = node.parent
+        return node
+
+    def window(self):
+        tab = self.tab()
+        return tab.parent if tab else None
+
+    def sibling(self):
+        parent = self.parent
+        if not isinstance(parent, Split):
+            return None
+        return parent.second if parent.first is self else parent.first
+
+    def depth(self):
+        depth = 0
+        node = self.parent
+        while node is not None:
+            depth += 1
+            node = node.parent
+        return depth
+
+
+class Leaf(Node):
+    __slots__ = ()
+
+
+class Split(Node):
+    __slots__ = ("orientation", "ratio", "first", "second")
+
+    def __init__(self, orientation, ratio=0.5, payload=None):
+        super(Split, self).__init__(payload)
+        self.orientation = orientation
+        self.ratio = ratio
+        self.first = None
+        self.second = None
+
+
+class Tab(Node):
+    __slots__ = ("name", "child")
+
+    def __init__(self, payload=None, name=""):
+        super(Tab, self).__init__(payload)
+        self.name = name
+        self.child = None
+
+
+class Window(Node):
+    __slots__ = ("tabs",)
+
+    def __init__(self, payload=None):
+        super(Window, self).__init__(payload)
+        self.tabs = []
+
+
+def leaves(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Leaf):
+            yield node
+        elif isinstance(node, Split):
+            stack.append(node.second)
+            stack.append(node.first)
+        elif isinstance(node, Tab):
+            if node.child is not None:
+                stack.append(node.child)
+        elif node is not None:
+            stack.extend(reversed(node.tabs))
+
+
+def first_leaf(node):
+    while isinstance(node, Split):
+        node = node.first
+    return node
+
+
+def last_leaf(node):
+    while isinstance(node, Split):
+        node = node.second
+    return node
+
+
+class Layout(object):
+    def __init__(self):
+        self.windows = []
+        # Bumped on every change, for caches derived from the layout
+        self.version = 0
+
+    def touch(self):
+        self.version += 1
+
+    def add_window(self, payload=None):
+        self.touch()
+        window = Window(payload)
+        self.windows.append(window)
+        return window
+
+    def remove_window(self, window):
+        self.touch()
+        self.windows.remove(window)
+
+    def contains(self, node):
+        root = node.root()
+        return isinstance(root, Window) and root in self.windows
+
+    def add_tab(self, window, child, payload=None, name=""):
+        tab = Tab(payload, name)
+        tab.child = child
+        child.parent = tab
+        self.attach_tab(window, tab)
+        return tab
+
+    def attach_tab(self, window, tab):
+        self.touch()
+        tab.parent = window
+        window.tabs.append(tab)
+
+    def remove_tab(self, tab):
+        self.touch()
+        if tab.parent is not None:
+            tab.parent.tabs.remove(tab)
+            tab.parent = None
+
+    def move_tab(self, tab, window):
+        self.remove_tab(tab)
+        self.attach_tab(window, tab)
+
+    def replace(self, old, new):
+        self.touch()
+        parent = old.parent
+        new.parent = parent
+        old.parent = None
+        if isinstance(parent, Tab):
+            parent.child = new
+        elif parent.first is old:
+            parent.first = new
+        else:
+            parent.second = new
+
+    def split(self, leaf, new_leaf, orientation, before=False, payload=None):
+        # Put new_leaf next to leaf, new_leaf must not be in the tree
+        split = Split(orientation, payload=payload)
+        self.replace(leaf, split)
+        if before:
+            split.first, split.second = new_leaf, leaf
+        else:
+            split.first, split.second = leaf, new_leaf
+        leaf.parent = new_leaf.parent = split
+        return split
+
+    def remove(self, leaf):
+        # Detach leaf, a split left with one child is replaced by that child.
+        # Returns the node that took the place of the split, if any.
+        parent = leaf.parent
+        if parent is None:
+            return None
+
+        if isinstance(parent, Tab):
+            self.touch()
+            parent.child = None
+            leaf.parent = None
+            return None
+
+        sibling = leaf.sibling()
+        self.replace(parent, sibling)
+        parent.first = parent.second = None
+        leaf.parent = None
+        return sibling
+
+    def move(self, leaf, target, orientation, before=False, payload=None):
+        self.remove(leaf)
+        return self.split(target, leaf, orientation, before, payload)
+
+    def neighbour(self, leaf):
+        # The terminal that should take over the focus when leaf is closed
+        sibling = leaf.sibling()
+        if sibling is None:
+            return None
+        if leaf.parent.first is leaf:
+            return first_leaf(sibling)
+        return last_leaf(sibling)
+
+    def leaves(self, node=None):
+        if node is not None:
+            return leaves(node)
+        return (leaf for window in self.windows for leaf in leaves(window))
@@ -0,0 +1,116 @@
+# Directional (Alt+H/J/K/L) pane navigation. Pane rectangles are computed
+# from the layout model and indexed by their edges, so finding the
+# neighbour in a direction only looks at the panes closest to the edge the
+# current pane is leaving through.
+
+import bisect
+
+from layout import Split, VERTICAL
+
+LEFT = 1
+DOWN = 2
+UP = 3
+RIGHT = 4
+
+
+def pane_rects(node, width, height):
+    # Rectangles (x1, y1, x2, y2) of all leaves below node
+    rects = {}
+    stack = [(node, 0.0, 0.0, float(width), float(height))]
+    while stack:
+        node, x1, y1, x2, y2 = stack.pop()
+        if node is None:
+            continue
+        if isinstance(node, Split):
+            if node.orientation == VERTICAL:
+                middle = x1 + (x2 - x1) * node.ratio
+                stack.append((node.first, x1, y1, middle, y2))
+                stack.append((node.second, middle, y1, x2, y2))
+            else:
+                middle = y1 + (y2 - y1) * node.ratio
+                stack.append((node.first, x1, y1, x2, middle))
+                stack.append((node.second, x1, middle, x2, y2))
+        else:
+            rects[node] = (x1, y1, x2, y2)
+
+    return rects
+
+
+class NavigationIndex(object):
+    def __init__(self, rects):
+        self.rects = rects
+        # For every direction the panes sorted by the edge facing the pane
+        # we come from: moving left we enter a pane through its right edge
+        self.edges = {}
+        for direction, edge in ((LEFT, 2), (RIGHT, 0), (UP, 3), (DOWN, 1)):
+            entries = sorted(
+                (rect[edge], id(leaf), leaf) for leaf, rect in rects.items()
+            )
+            self.edges[direction] = (
+                [entry[0] for entry in entries],
+                [entry[2] for entry in entries],
+            )
+
+    def neighbour(self, leaf, direction):
+        x1, y1, x2, y2 = self.rects[leaf]
+        positions, leaves = self.edges[direction]
+
+        if direction in (LEFT, UP):
+            start = x1 if direction == LEFT else y1
+            candidates = range(bisect.bisect_right(positions, start) - 1, -1, -1)
+        else:
+            start = x2 if direction == RIGHT else y2
+            candidates = range(bisect.bisect_left(positions, start), len(positions))
+
+        best = None
+        best_score = None
+        for index in candidates:
+            gap = abs(positions[index] - start)
+            if best_score is not None and gap > best_score[0]:
+                break
+
+            candidate = leaves[index]
+            if candidate is leaf:
+                continue
+
+            cx1, cy1, cx2, cy2 = self.rects[candidate]
+            if direction in (LEFT, RIGHT):
+                overlap = min(y2, cy2) - max(y1, cy1)
+                offset = cy1
+            else:
+                overlap = min(x2, cx2) - max(x1, cx1)
+                offset = cx1
+
+            if overlap <= 0:
+                continue
+
+            # Closest edge first, then the pane sharing most of the edge and
+            # finally the top/left most one to be deterministic
+            score = (gap, -overlap, offset)
+            if best_score is None or score < best_score:
+                best = candidate
+                best_score = score
+
+        return best
+
+
+class Navigator(object):
+    # Keeps the index of the last navigated tab, rebuilt when the layout
+    # changed or the tab got another size
+    def __init__(self, layout):
+        self.layout = layout
+        self.key = None
+        self.cached_index = None
+        self.builds = 0
+
+    def index(self, tab, size):
+        key = (tab, self.layout.version, size[0], size[1])
+        if key != self.key:
+            self.key = key
+            self.cached_index = NavigationIndex(pane_rects(tab.child, size[0], size[1]))
+            self.builds += 1
+
+        return self.cached_index
+
+    def neighbour(self, leaf, direction, size):
+        return self.index(leaf.tab(), size).neighbour(leaf, direction)
@@ -0,0 +1,84 @@
+# What the layout operations do to the terminal windows in the panes: the
+# geometry a terminal is asked for, hiding the terminals of the tabs that
+# aren't selected and what is dropped when a terminal closes. svanterm.py
+# calls this from its widgets and the regression suite in benchmark.py from
+# a headless workspace on a FakeDesktop, so both run the same code.
+
+import layout
+
+# The header above every terminal
+HEADER_HEIGHT = 20
+# Really small sizes mess up the terminal
+MIN_SIZE = 150
+
+
+def terminal_geometry(width, height):
+    # Geometry of the terminal window in a pane of width x height, relative
+    # to the pane
+    return (
+        0,
+        HEADER_HEIGHT,
+        max(width, MIN_SIZE),
+        max(height - HEADER_HEIGHT, MIN_SIZE),
+    )
+
+
+class Panes(object):
+    # terminal_hwnd(payload) returns the terminal window of a leaf's payload,
+    # None while that terminal is still starting
+    def __init__(
+        self,
+        desktop,
+        resize_scheduler,
+        title_pipeline,
+        search_index,
+        terminal_hwnd=lambda payload: payload,
+    ):
+        self.desktop = desktop
+        self.resize_scheduler = resize_scheduler
+        self.title_pipeline = title_pipeline
+        self.search_index = search_index
+        self.terminal_hwnd = terminal_hwnd
+
+    def hwnds(self, node):
+        hwnds = []
+        for leaf in layout.leaves(node):
+            hwnd = self.terminal_hwnd(leaf.payload)
+            if hwnd:
+                hwnds.append(hwnd)
+        return hwnds
+
+    def resize(self, hwnd, width, height):
+        self.resize_scheduler.request(hwnd, terminal_geometry(width, height))
+
+    def attach(self, hwnd, size, dormant):
+        # Shows a terminal that came up in a pane of size, the terminal of a
+        # tab that isn't selected stays hidden with its geometry deferred
+        if dormant:
+            self.resize_scheduler.set_dormant([hwnd], True)
+        self.resize(hwnd, *size)
+        self.desktop.show_window(hwnd, not dormant)
+
+    def set_dormant(self, node, dormant):
+        hwnds = self.hwnds(node)
+        # Woken terminals have their deferred geometry requested again
+        self.resize_scheduler.set_dormant(hwnds, dormant)
+        for hwnd in hwnds:
+            self.desktop.show_window(hwnd, not dormant)
+
+    def dock(self, node, dormant):
+        # A terminal dragged somewhere else gets the dormancy of the tab it
+        # was dropped in. Its old tab can have gone dormant while the drag
+        # hovered over another tab, and a new tab doesn't wake anything.
+        self.set_dormant(node, dormant)
+
+    def close(self, key, hwnd):
+        # key is what the search index knows the terminal by, hwnd is None
+        # for a terminal that never came up
+        self.search_index.remove(key)
+        if not hwnd:
+            return
+
+        self.resize_scheduler.forget(hwnd)
+        self.title_pipeline.forget(hwnd)
+        self.desktop.close_window(hwnd)
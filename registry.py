@@ -0,0 +1,77 @@
+# Live widgets by kind, held weakly so the registry itself never keeps a
+# destroyed terminal alive. Objects are added when created and retired
+# when destroyed, an object can have a key (like the hwnd of a terminal)
+# to be looked up by. In debug mode retired objects are watched and
+# leaks() lists the ones still alive after a garbage collection.
+
+import collections
+import gc
+import weakref
+
+
+class ObjectRegistry(object):
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.live = collections.defaultdict(weakref.WeakSet)
+        self.indexes = collections.defaultdict(weakref.WeakValueDictionary)
+        self.retired = collections.defaultdict(weakref.WeakSet)
+        self.created = collections.Counter()
+        self.destroyed = collections.Counter()
+
+    def index(self, kind):
+        # Mapping of key -> object, stays up to date
+        return self.indexes[kind]
+
+    def add(self, kind, obj):
+        self.live[kind].add(obj)
+        self.created[kind] += 1
+
+    def set_key(self, kind, key, obj):
+        self.indexes[kind][key] = obj
+
+    def retire(self, kind, obj, key=None):
+        if obj not in self.live[kind]:
+            return
+
+        self.live[kind].discard(obj)
+        if key is not None and self.indexes[kind].get(key) is obj:
+            del self.indexes[kind][key]
+        self.destroyed[kind] += 1
+        if self.debug:
+            self.retired[kind].add(obj)
+
+    def counts(self):
+        return dict((kind, len(objects)) for kind, objects in self.live.items())
+
+    def summary(self):
+        return dict(
+            (
+                kind,
+                {
+                    "live": len(self.live[kind]),
+                    "created": self.created[kind],
+                    "destroyed": self.destroyed[kind],
+                },
+            )
+            for kind in self.created
+        )
+
+    def leaks(self):
+        # Retired objects something still refers to, by kind
+        gc.collect()
+        return dict(
+            (kind, list(objects)) for kind, objects in self.retired.items() if objects
+        )
+
+    def format_leaks(self):
+        lines = []
+        for kind, objects in sorted(self.leaks().items()):
+            lines.append("%d leaked %s objects" % (len(objects), kind))
+            for obj in objects:
+                referrers = [
+                    type(referrer).__name__
+                    for referrer in gc.get_referrers(obj)
+                    if referrer is not objects
+                ]
+                lines.append("  %r referenced by %s" % (obj, ", ".join(referrers)))
+        return "\n".join(lines) or "No leaks"
@@ -0,0 +1,61 @@
+# Least recently used cache of pre-rendered bitmaps. Terminal headers all
+# look alike apart from their size, state and label, and repaint on every
+# focus change, title change and resize, so a repaint is mostly a blit of
+# a bitmap rendered earlier.
+
+import collections
+import time
+
+
+class RenderStats(object):
+    def __init__(self, samples=100):
+        self.paints = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.render_latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        latencies = sorted(self.render_latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.0
+        return {
+            "paints": self.paints,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "render_avg_ms": average * 1000,
+            "render_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class RenderCache(object):
+    # render(*key) draws what key describes, e.g. (width, height, state,
+    # label) for a header
+    def __init__(self, render, capacity=128, clock=time.perf_counter):
+        self.render = render
+        self.capacity = capacity
+        self.clock = clock
+        self.stats = RenderStats()
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        self.stats.paints += 1
+        bitmap = self.entries.get(key)
+        if bitmap is not None:
+            self.stats.hits += 1
+            self.entries.move_to_end(key)
+            return bitmap
+
+        self.stats.misses += 1
+        start = self.clock()
+        bitmap = self.render(*key)
+        self.stats.render_latencies.append(self.clock() - start)
+
+        self.entries[key] = bitmap
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+        return bitmap
+
+    def clear(self):
+        self.entries.clear()
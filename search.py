@@ -0,0 +1,174 @@
+# Index over terminal titles and tab names for the find dialog. Entries are
+# updated when titles or tab names change, a search ranks fuzzy
+# (subsequence) matches and boosts recently used terminals. A new query only
+# looks at the entries containing all of its characters, when the query
+# grows by typing only the previous matches and the entries changed since
+# are searched again.
+
+import collections
+
+WORD_SEPARATORS = " -_/\\.:@[]()\0"
+SUBSTRING_SCORE = 1000
+RECENT_BOOST = 200
+
+
+class SearchEntry(object):
+    __slots__ = ("title", "tab", "text", "chars", "used")
+
+    def __init__(self, title, tab):
+        self.title = title
+        self.tab = tab
+        self.chars = frozenset()
+        self.used = 0
+
+
+def match_score(query, text):
+    # Higher is better, None if query isn't a subsequence of text. Both
+    # strings are expected to be uppercase.
+    position = text.find(query)
+    if position != -1:
+        score = SUBSTRING_SCORE - position
+        if position == 0 or text[position - 1] in WORD_SEPARATORS:
+            score += 100
+        return score
+
+    score = 0
+    position = -1
+    for char in query:
+        found = text.find(char, position + 1)
+        if found == -1:
+            return None
+        if found == position + 1:
+            score += 10
+        elif text[found - 1] in WORD_SEPARATORS:
+            score += 5
+        else:
+            score -= min(found - position, 10)
+        position = found
+
+    return score
+
+
+class SearchIndex(object):
+    def __init__(self):
+        self.entries = {}
+        self.tab_names = {}
+        # Character -> keys of the entries containing it
+        self.by_char = collections.defaultdict(set)
+        # Keys of the entries changed since the last search
+        self.changed = set()
+        self.used_counter = 0
+        self.last_query = None
+        self.last_matches = None
+        self.full_searches = 0
+        self.incremental_searches = 0
+
+    def refresh(self, key, entry):
+        # Title and tab name are searched as one string, so a query can
+        # match both of them at once
+        entry.text = (
+            entry.title.upper() + "\0" + self.tab_names.get(entry.tab, "").upper()
+        )
+        chars = frozenset(entry.text)
+        for char in entry.chars - chars:
+            self.by_char[char].discard(key)
+        for char in chars - entry.chars:
+            self.by_char[char].add(key)
+        entry.chars = chars
+        self.changed.add(key)
+
+    def add(self, key, title, tab=None):
+        entry = SearchEntry(title, tab)
+        self.entries[key] = entry
+        self.refresh(key, entry)
+
+    def update(self, key, title=None, tab=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+
+        if (title is None or title == entry.title) and (
+            tab is None or tab is entry.tab
+        ):
+            return
+
+        if title is not None:
+            entry.title = title
+        if tab is not None:
+            entry.tab = tab
+        self.refresh(key, entry)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        for char in entry.chars:
+            self.by_char[char].discard(key)
+        self.changed.discard(key)
+        if self.last_matches is not None:
+            self.last_matches.pop(key, None)
+
+    def rename_tab(self, tab, name):
+        self.tab_names[tab] = name
+        for key, entry in self.entries.items():
+            if entry.tab is tab:
+                self.refresh(key, entry)
+
+    def remove_tab(self, tab):
+        self.tab_names.pop(tab, None)
+
+    def touch(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.used_counter += 1
+            entry.used = self.used_counter
+
+    def title(self, key):
+        return self.entries[key].title
+
+    def tab_name(self, key):
+        return self.tab_names.get(self.entries[key].tab, "")
+
+    def search(self, query):
+        query = query.upper()
+        query_chars = frozenset(query)
+        if (
+            self.last_matches is not None
+            and self.last_query
+            and query.startswith(self.last_query)
+        ):
+            # A longer query can only match a subset of the previous matches,
+            # or one of the entries that changed since
+            candidates = set(self.last_matches)
+            candidates.update(self.changed)
+            self.incremental_searches += 1
+        elif query:
+            char_keys = sorted(
+                (self.by_char.get(char, ()) for char in query_chars), key=len
+            )
+            candidates = set(char_keys[0]).intersection(*char_keys[1:])
+            self.full_searches += 1
+        else:
+            candidates = self.entries.keys()
+            self.full_searches += 1
+        self.changed.clear()
+
+        # Lower ranks first
+        entries = self.entries
+        boost = float(RECENT_BOOST) / (self.used_counter or 1)
+        ranks = {}
+        if query:
+            for key in candidates:
+                entry = entries[key]
+                if query_chars <= entry.chars:
+                    score = match_score(query, entry.text)
+                    if score is not None:
+                        ranks[key] = -(score + boost * entry.used)
+        else:
+            for key in candidates:
+                ranks[key] = -boost * entries[key].used
+
+        self.last_query = query
+        self.last_matches = ranks
+        return sorted(ranks, key=ranks.__getitem__)
@@ -0,0 +1,233 @@
+# Saving and restoring the window/tab/split layout. A session is stored as
+# JSON like {"version": 1, "windows": [{"tabs": [{"name": "", "panes": ...}]}]}
+# where panes is null for a terminal or [orientation, ratio, first, second]
+# for a split, orientation being "h" or "v".
+#
+# On restore the layout is turned into a list of build steps. Every step but
+# "window" needs one terminal, the terminals are launched concurrently and
+# handed to the steps in the order they come up, any terminal will do for
+# any pane.
+
+import collections
+import json
+import os
+import shutil
+import threading
+
+import layout
+
+SESSION_VERSION = 1
+ORIENTATIONS = {layout.HORIZONTAL: "h", layout.VERTICAL: "v"}
+ORIENTATION_CODES = dict((code, value) for value, code in ORIENTATIONS.items())
+
+
+class SessionError(ValueError):
+    pass
+
+
+def dump_panes(node):
+    if isinstance(node, layout.Split):
+        return [
+            ORIENTATIONS[node.orientation],
+            round(node.ratio, 3),
+            dump_panes(node.first),
+            dump_panes(node.second),
+        ]
+    return None
+
+
+def dump_session(model):
+    return {
+        "version": SESSION_VERSION,
+        "windows": [
+            {
+                "tabs": [
+                    {"name": tab.name, "panes": dump_panes(tab.child)}
+                    for tab in window.tabs
+                    if tab.child is not None
+                ]
+            }
+            for window in model.windows
+            if window.tabs
+        ],
+    }
+
+
+def save_session(model, path):
+    # Written to a temporary file first, a crash while saving must not
+    # leave a truncated session behind
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as session_file:
+        json.dump(dump_session(model), session_file, separators=(",", ":"))
+    os.replace(temporary_path, path)
+
+
+def load_session(path):
+    try:
+        with open(path) as session_file:
+            data = json.load(session_file)
+    except ValueError as error:
+        raise SessionError("Invalid session file: %s" % error)
+
+    if not isinstance(data, dict) or data.get("version") != SESSION_VERSION:
+        raise SessionError("Unsupported session version")
+
+    return data
+
+
+def session_steps(data):
+    # ("window",) opens a window, ("tab", name) adds a tab to the last window
+    # and ("split", pane, orientation, ratio) splits a pane. Panes are
+    # numbered in the order the tab and split steps create them.
+    steps = []
+    panes = [0]
+
+    def add_panes(tree, pane):
+        if tree is None:
+            return
+        try:
+            orientation, ratio, first, second = tree
+            orientation = ORIENTATION_CODES[orientation]
+            ratio = min(max(float(ratio), 0.05), 0.95)
+        except (TypeError, ValueError, KeyError):
+            raise SessionError("Invalid split %r" % (tree,))
+
+        new_pane = panes[0]
+        panes[0] += 1
+        steps.append(("split", pane, orientation, ratio))
+        add_panes(first, pane)
+        add_panes(second, new_pane)
+
+    try:
+        for window in data["windows"]:
+            steps.append(("window",))
+            for tab in window["tabs"]:
+                pane = panes[0]
+                panes[0] += 1
+                steps.append(("tab", str(tab.get("name", ""))))
+                add_panes(tab.get("panes"), pane)
+    except (TypeError, KeyError, AttributeError):
+        raise SessionError("Invalid session layout")
+
+    return steps
+
+
+class SessionWriter(object):
+    # Saves the layout unless it didn't change since the last save
+    def __init__(self, path):
+        self.path = path
+        self.saved_version = None
+        self.saves = 0
+        self.backup = False
+
+    def keep(self, model):
+        # Leaves the saved session alone until model changes, for a session
+        # that was only partly restored. The first save after that keeps a
+        # copy of it as path + ".bak".
+        self.saved_version = model.version
+        self.backup = True
+
+    def save(self, model, force=False):
+        if not force and model.version == self.saved_version:
+            return False
+
+        if self.backup:
+            try:
+                shutil.copyfile(self.path, self.path + ".bak")
+            except FileNotFoundError:
+                pass
+            self.backup = False
+        save_session(model, self.path)
+        self.saved_version = model.version
+        self.saves += 1
+        return True
+
+
+class SessionRestore(object):
+    # build(step, handle) creates what the step describes, handle being None
+    # for "window" steps. launch() starts a terminal and blocks until it is
+    # up, it is called from worker threads. deliver(callback, *args) must
+    # run callback on the thread that builds, discard(handle) closes a
+    # terminal that isn't needed after all. done(completed) is called once.
+    def __init__(
+        self, steps, build, launch, deliver, discard, done, workers=8, retries=3
+    ):
+        self.steps = collections.deque(steps)
+        self.build = build
+        self.launch = launch
+        self.deliver = deliver
+        self.discard = discard
+        self.done = done
+        self.workers = workers
+        self.retries = retries
+        self.ready = collections.deque()
+        self.launches = sum(1 for step in steps if step[0] != "window")
+        self.failures = 0
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        for _ in range(min(self.workers, self.launches)):
+            thread = threading.Thread(target=self.launch_loop)
+            thread.daemon = True
+            thread.start()
+        self.run()
+
+    def launch_loop(self):
+        while True:
+            with self.lock:
+                if self.launches <= 0 or self.finished:
+                    return
+                self.launches -= 1
+
+            try:
+                handle = self.launch()
+            except Exception:
+                self.deliver(self.launch_failed)
+            else:
+                self.deliver(self.terminal_ready, handle)
+
+    def terminal_ready(self, handle):
+        if self.finished:
+            self.discard(handle)
+            return
+
+        self.ready.append(handle)
+        self.run()
+
+    def launch_failed(self):
+        self.failures += 1
+        if self.failures > self.retries:
+            self.finish(False)
+            return
+
+        with self.lock:
+            self.launches += 1
+        thread = threading.Thread(target=self.launch_loop)
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while self.steps and not self.finished:
+            step = self.steps[0]
+            if step[0] == "window":
+                self.build(step, None)
+            elif self.ready:
+                self.build(step, self.ready.popleft())
+            else:
+                return
+            self.steps.popleft()
+
+        if not self.steps:
+            self.finish(True)
+
+    def finish(self, completed):
+        if self.finished:
+            return
+
+        with self.lock:
+            self.finished = True
+            self.launches = 0
+        while self.ready:
+            self.discard(self.ready.popleft())
+        self.done(completed)
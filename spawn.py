@@ -0,0 +1,445 @@
+import collections
+import threading
+import time
+
+
+class SpawnTimeout(Exception):
+    pass
+
+
+class Launcher(object):
+    # Starts terminal windows for the pool. launch() must block until the
+    # window exists and return its handle with the window hidden, is_alive()
+    # tells if a previously launched window is still usable and dispose()
+    # closes one that will never be handed out.
+    def launch(self):
+        raise NotImplementedError
+
+    def is_alive(self, handle):
+        raise NotImplementedError
+
+    def dispose(self, handle):
+        raise NotImplementedError
+
+
+class DiscoveryStats(object):
+    def __init__(self, samples=100):
+        self.events = 0
+        self.inspected = 0
+        self.found = 0
+        self.timeouts = 0
+        self.wait_latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        latencies = sorted(self.wait_latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.0
+        return {
+            "events": self.events,
+            "inspected": self.inspected,
+            "found": self.found,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": average * 1000,
+            "wait_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class WindowWaiter(object):
+    def __init__(self):
+        self.hwnd = None
+        self.event = threading.Event()
+
+
+class WindowDiscovery(object):
+    # Finds the main window of a launched process from window events instead
+    # of polling all top level windows. The event source calls
+    # on_window_event() for every created/shown window, get_pid(hwnd) and
+    # is_ready(hwnd) inspect a window and scan(pid) is an optional one time
+    # lookup of already existing windows, covering windows that showed up
+    # before wait() was called.
+    def __init__(self, get_pid, is_ready, scan=None, clock=time.time):
+        self.get_pid = get_pid
+        self.is_ready = is_ready
+        self.scan = scan
+        self.clock = clock
+        self.stats = DiscoveryStats()
+        self.waiters = {}
+        self.lock = threading.Lock()
+
+    def wait(self, pid, timeout):
+        start = self.clock()
+        waiter = WindowWaiter()
+        with self.lock:
+            self.waiters[pid] = waiter
+
+        try:
+            if self.scan:
+                for hwnd in self.scan(pid):
+                    self.offer(waiter, hwnd)
+
+            if not waiter.event.wait(timeout):
+                with self.lock:
+                    self.stats.timeouts += 1
+                raise SpawnTimeout(
+                    "No window for process %d within %.1f s" % (pid, timeout)
+                )
+        finally:
+            with self.lock:
+                del self.waiters[pid]
+
+        with self.lock:
+            self.stats.found += 1
+            self.stats.wait_latencies.append(self.clock() - start)
+        return waiter.hwnd
+
+    def on_window_event(self, hwnd):
+        # Called on the hook thread while wait() runs on spawning threads,
+        # the stats are only changed with the lock held
+        with self.lock:
+            self.stats.events += 1
+
+            # Nothing is being spawned, this is the case for almost all events
+            if not self.waiters:
+                return
+
+            self.stats.inspected += 1
+
+        pid = self.get_pid(hwnd)
+        with self.lock:
+            waiter = self.waiters.get(pid)
+
+        if waiter:
+            self.offer(waiter, hwnd)
+
+    def offer(self, waiter, hwnd):
+        if not waiter.event.is_set() and self.is_ready(hwnd):
+            waiter.hwnd = hwnd
+            waiter.event.set()
+
+
+class ProcessLauncher(Launcher):
+    # Starts args as a new process for every terminal and waits for its
+    # window, desktop is a desktop.Desktop. The focus_guard (a
+    # focusguard.FocusGuard) keeps the window from taking the foreground
+    # until it is hidden.
+    def __init__(self, desktop, discovery, args, timeout, focus_guard=None):
+        self.desktop = desktop
+        self.discovery = discovery
+        self.args = args
+        self.timeout = timeout
+        self.focus_guard = focus_guard
+
+    def launch(self):
+        pid = self.desktop.start_process(self.args)
+        if self.focus_guard:
+            self.focus_guard.guard(pid, self.timeout)
+
+        try:
+            try:
+                hwnd = self.discovery.wait(pid, self.timeout)
+            except Exception:
+                self.desktop.kill_process(pid)
+                raise
+
+            self.desktop.show_window(hwnd, False)
+        finally:
+            if self.focus_guard:
+                self.focus_guard.release(pid)
+        return hwnd
+
+    def is_alive(self, hwnd):
+        return self.desktop.is_window(hwnd)
+
+    def dispose(self, hwnd):
+        self.desktop.close_window(hwnd)
+
+
+class PoolStats(object):
+    def __init__(self, samples=100):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failed_refills = 0
+        self.refill_latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        latencies = sorted(self.refill_latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "failed_refills": self.failed_refills,
+            "refills": len(latencies),
+            "refill_avg_ms": average * 1000,
+            "refill_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class TerminalPool(object):
+    def __init__(self, launcher, size=2, max_age=600, clock=time.time):
+        self.launcher = launcher
+        self.size = size
+        self.max_age = max_age
+        self.clock = clock
+        self.stats = PoolStats()
+        self.entries = collections.deque()
+        self.pending = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        handle = None
+        while handle is None:
+            with self.lock:
+                if not self.entries:
+                    break
+                candidate, created = self.entries.popleft()
+
+            if self.is_stale(candidate, created):
+                self.evict(candidate)
+            else:
+                handle = candidate
+
+        # acquire() runs on the spawning threads while refills and the
+        # eviction thread run, the stats are only changed with the lock held
+        with self.lock:
+            if handle is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        if handle is None:
+            handle = self.launcher.launch()
+
+        self.refill()
+        return handle
+
+    def refill(self):
+        with self.lock:
+            if self.closed:
+                return
+
+            missing = self.size - len(self.entries) - self.pending
+            self.pending += max(missing, 0)
+
+        for _ in range(missing):
+            thread = threading.Thread(target=self.refill_one)
+            thread.daemon = True
+            thread.start()
+
+    def refill_one(self):
+        start = self.clock()
+        try:
+            handle = self.launcher.launch()
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+                self.stats.failed_refills += 1
+            return
+
+        with self.lock:
+            self.pending -= 1
+            keep = not self.closed and len(self.entries) < self.size
+            if keep:
+                self.entries.append((handle, self.clock()))
+                self.stats.refill_latencies.append(self.clock() - start)
+
+        if not keep:
+            self.launcher.dispose(handle)
+
+    def is_stale(self, handle, created):
+        if self.max_age is not None and self.clock() - created > self.max_age:
+            return True
+
+        return not self.launcher.is_alive(handle)
+
+    def evict(self, handle):
+        with self.lock:
+            self.stats.evictions += 1
+        self.launcher.dispose(handle)
+
+    def evict_stale(self):
+        with self.lock:
+            entries = list(self.entries)
+            self.entries.clear()
+
+        fresh = []
+        for handle, created in entries:
+            if self.is_stale(handle, created):
+                self.evict(handle)
+            else:
+                fresh.append((handle, created))
+
+        with self.lock:
+            self.entries.extendleft(reversed(fresh))
+
+        self.refill()
+
+    def start_eviction(self, interval=60):
+        def evict_loop():
+            while not self.closed:
+                time.sleep(interval)
+                self.evict_stale()
+
+        thread = threading.Thread(target=evict_loop)
+        thread.daemon = True
+        thread.start()
+
+    def resize(self, size):
+        with self.lock:
+            self.size = size
+            surplus = []
+            while len(self.entries) > size:
+                surplus.append(self.entries.pop()[0])
+
+        for handle in surplus:
+            self.launcher.dispose(handle)
+
+        self.refill()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            entries = list(self.entries)
+            self.entries.clear()
+
+        for handle, _ in entries:
+            self.launcher.dispose(handle)
+
+
+class SpawnStats(object):
+    def __init__(self, samples=100):
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.0
+        return {
+            "started": self.started,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "spawn_avg_ms": average * 1000,
+            "spawn_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class Prefetch(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.handle = None
+        self.error = None
+        # Set by close() when no spawn took the handle
+        self.dispose = None
+
+
+class AsyncSpawner(object):
+    # Runs acquire() on a worker thread per spawn, so the UI thread never
+    # waits for a terminal. deliver(callback, *args) must run callback on
+    # the UI thread, it gets ready(handle) or failed(error).
+    def __init__(self, acquire, deliver, clock=time.time):
+        self.acquire = acquire
+        self.deliver = deliver
+        self.clock = clock
+        self.stats = SpawnStats()
+        self.prefetched = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def prefetch(self):
+        # Starts acquiring a handle before a spawn asks for it, the next
+        # spawn gets that one. At startup the first terminal launches while
+        # the windows are still being built.
+        prefetched = Prefetch()
+        with self.lock:
+            if self.prefetched or self.closed:
+                return
+            self.prefetched = prefetched
+
+        def run():
+            try:
+                handle = self.acquire()
+            except Exception as error:
+                prefetched.error = error
+                prefetched.done.set()
+                return
+
+            with self.lock:
+                prefetched.handle = handle
+                prefetched.done.set()
+                dispose = prefetched.dispose
+            if dispose:
+                dispose(handle)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def spawn(self, ready, failed):
+        with self.lock:
+            self.stats.started += 1
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(
+                self.stats.max_in_flight, self.stats.in_flight
+            )
+            prefetched = self.prefetched
+            self.prefetched = None
+
+        thread = threading.Thread(target=self.run, args=(ready, failed, prefetched))
+        thread.daemon = True
+        thread.start()
+
+    def claim(self):
+        # acquire() for callers with threads of their own, takes the
+        # prefetched handle like a spawn would
+        with self.lock:
+            prefetched = self.prefetched
+            self.prefetched = None
+        return self.take(prefetched)
+
+    def take(self, prefetched):
+        if prefetched is None:
+            return self.acquire()
+
+        prefetched.done.wait()
+        if prefetched.error is not None:
+            raise prefetched.error
+        return prefetched.handle
+
+    def run(self, ready, failed, prefetched=None):
+        start = self.clock()
+        try:
+            handle = self.take(prefetched)
+        except Exception as error:
+            with self.lock:
+                self.stats.in_flight -= 1
+                self.stats.failed += 1
+            self.deliver(failed, error)
+            return
+
+        with self.lock:
+            self.stats.in_flight -= 1
+            self.stats.succeeded += 1
+            self.stats.latencies.append(self.clock() - start)
+        self.deliver(ready, handle)
+
+    def close(self, dispose):
+        # Stops prefetching. A prefetched handle no spawn took is passed to
+        # dispose(handle), right away or once it is acquired.
+        with self.lock:
+            self.closed = True
+            prefetched = self.prefetched
+            self.prefetched = None
+            if prefetched is None:
+                return
+            prefetched.dispose = dispose
+            if not prefetched.done.is_set():
+                return
+
+        if prefetched.error is None:
+            dispose(prefetched.handle)
@@ -0,0 +1,106 @@
+# A new window (Ctrl-Shift-N, the command channel, dropping a tab or
+# terminal outside of the windows) takes a while to build: a frame, the tab
+# control and maximizing it. One window is kept built and hidden, take()
+# reveals it and has a replacement built a little later, when the UI is
+# idle again. The standby window isn't part of the layout until it is
+# taken, so it is neither saved nor visible to scripts.
+#
+# Per window taken the time until it was first painted is kept, for warm
+# (standby) and cold (built on demand) windows.
+
+import collections
+import time
+import weakref
+
+
+class StandbyStats(object):
+    def __init__(self, samples=100):
+        self.warm = 0
+        self.cold = 0
+        self.built = 0
+        self.warm_latencies = collections.deque(maxlen=samples)
+        self.cold_latencies = collections.deque(maxlen=samples)
+
+    def summary(self):
+        summary = {"warm": self.warm, "cold": self.cold, "built": self.built}
+        for name, latencies in (
+            ("warm", self.warm_latencies),
+            ("cold", self.cold_latencies),
+        ):
+            latencies = sorted(latencies)
+            summary[name + "_visible_avg_ms"] = (
+                sum(latencies) / len(latencies) * 1000 if latencies else 0.0
+            )
+            summary[name + "_visible_max_ms"] = (
+                latencies[-1] * 1000 if latencies else 0.0
+            )
+        return summary
+
+
+class StandbyWindows(object):
+    # build() returns a new hidden window, reveal(window) shows it and adds
+    # it to the layout. schedule(delay, callback) must run callback on the
+    # UI thread delay seconds later. painted(window) must be called when a
+    # window is painted, until then it counts as not visible yet.
+    def __init__(self, build, reveal, schedule, delay=1.0, clock=time.perf_counter):
+        self.build = build
+        self.reveal = reveal
+        self.schedule = schedule
+        self.delay = delay
+        self.clock = clock
+        self.stats = StandbyStats()
+        self.window = None
+        self.pending = False
+        self.closed = False
+        self.waiting = weakref.WeakKeyDictionary()
+
+    def take(self, started=None):
+        # started is when the window was asked for, now by default
+        if started is None:
+            started = self.clock()
+
+        window = self.window
+        self.window = None
+        warm = window is not None
+        if warm:
+            self.stats.warm += 1
+        else:
+            self.stats.cold += 1
+            window = self.build()
+
+        self.waiting[window] = (started, warm)
+        self.reveal(window)
+        self.replace()
+        return window
+
+    def replace(self):
+        if self.pending or self.closed or self.window is not None:
+            return
+
+        self.pending = True
+        self.schedule(self.delay, self.build_standby)
+
+    def build_standby(self):
+        self.pending = False
+        if self.closed or self.window is not None:
+            return
+
+        self.window = self.build()
+        self.stats.built += 1
+
+    def painted(self, window):
+        entry = self.waiting.pop(window, None)
+        if entry is None:
+            return
+
+        started, warm = entry
+        latencies = self.stats.warm_latencies if warm else self.stats.cold_latencies
+        latencies.append(self.clock() - started)
+
+    def close(self):
+        # Stops replacing, returns the standby window for the caller to
+        # destroy
+        self.closed = True
+        window = self.window
+        self.window = None
+        return window
@@ -0,0 +1,62 @@
+# Where the time to the first usable pane goes. The UI thread marks the end
+# of each startup phase, work on other threads (like launching the first
+# terminal) is recorded as a phase of its own, so it shows what overlapped.
+# Once finish() was called, or when not enabled, nothing is recorded.
+
+import contextlib
+import threading
+import time
+
+
+class StartupProfile(object):
+    def __init__(self, enabled=False, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.start = clock()
+        self.last = self.start
+        self.phases = []
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def record(self, name, start, end):
+        with self.lock:
+            if self.enabled and self.finished is None:
+                self.phases.append((name, start, end))
+
+    def mark(self, name):
+        # Ends the UI thread phase name, it started at the previous mark
+        now = self.clock()
+        self.record(name, self.last, now)
+        self.last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, start, self.clock())
+
+    def finish(self, name):
+        # Ends the last phase, the first pane is usable. Returns whether
+        # this was the first call, i.e. there is something to report.
+        if not self.enabled or self.finished is not None:
+            return False
+
+        self.mark(name)
+        self.finished = self.last
+        return True
+
+    def format_report(self):
+        lines = ["%-32s %10s %10s" % ("phase", "start ms", "ms")]
+        for name, start, end in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(
+                "%-32s %10.1f %10.1f"
+                % (name, (start - self.start) * 1000, (end - start) * 1000)
+            )
+        if self.finished is not None:
+            lines.append(
+                "%-32s %10s %10.1f"
+                % ("first usable pane", "", (self.finished - self.start) * 1000)
+            )
+        return "\n".join(lines)
@@ -1,5 +1,4 @@
 # Todos:
-# - Config file with keyboard shortcuts
 # - Add global shortcut to bring svanterm to foreground, and if it is already toggle back to the last foreground window
 # - Block input including ctrl while spawning terminal (might fix the shell ctrl+t shortcut sometimes being triggered after pressing ctrl+shift+t)
 # - Can we hide, move or put alacritty behind svanterm while spawning a new alacritty instance?
@@ -9,10 +8,22 @@ import ctypes
 
 errorCode = ctypes.windll.shcore.SetProcessDpiAwareness(2)
 
+import sys
 
+from startup import StartupProfile
+
+# python svanterm.py --profile-startup reports where the time to the first
+# usable pane went. Created before the other imports, they are the first
+# phase.
+startup_profile = StartupProfile("--profile-startup" in sys.argv)
+
+
+import functools
+import os
 import pywintypes
-import queue
+import signal
 import subprocess
+import tempfile
 import threading
 import time
 import win32api
@@ -23,16 +34,126 @@ import win32process
 import winerror
 import wx
 import wx.lib.agw.aui as aui
-import wx.lib.agw.ultimatelistctrl as ultimatelistctrl
 
 from ctypes import CFUNCTYPE, POINTER, cast, c_void_p, c_int, windll
+from desktop import Desktop
+from dockzones import (
+    DOCK_BOTTOM,
+    DOCK_LEFT,
+    DOCK_NEW_WINDOW,
+    DOCK_TOP,
+    NEW_WINDOW,
+    DockZones,
+)
+from focusguard import FocusGuard
+from geometry import ResizeScheduler
+from hittest import HitTestCache, HEADER, TAB_STRIP, TERMINAL
+from ipc import CommandServer, CommandTarget, run_batch
+from keymap import (
+    DEFAULT_KEYMAP,
+    MODIFIER_KEYS,
+    KeyDispatcher,
+    KeymapError,
+    compile_keymap,
+    load_keymap,
+)
+from layout import Layout, Leaf, Split
+from navigation import Navigator, LEFT, DOWN, UP, RIGHT
+from panes import HEADER_HEIGHT, Panes
+from registry import ObjectRegistry
+from rendercache import RenderCache
+from search import SearchIndex
+from session import (
+    SessionError,
+    SessionRestore,
+    SessionWriter,
+    load_session,
+    session_steps,
+)
+from titles import TitlePipeline
+from tracing import tracer
+from transactions import LayoutTransactions
+from spawn import AsyncSpawner, ProcessLauncher, TerminalPool, WindowDiscovery
+from standby import StandbyWindows
+from winevents import (
+    EVENT_OBJECT_DESTROY,
+    EVENT_OBJECT_NAMECHANGE,
+    EVENT_SYSTEM_FOREGROUND,
+    EventRouter,
+    HookBackend,
+    WinEventSubscriptions,
+)
 
 PROGRAM_TITLE = "SvanTerm 0.2"
-DOCK_TOP = 1
-DOCK_LEFT = 2
-DOCK_RIGHT = 3
-DOCK_BOTTOM = 4
-DOCK_NEW_WINDOW = 5
+# Keyboard shortcuts can be changed in the [keys] section of this file, see
+# DEFAULT_KEYMAP in keymap.py for the actions and default bindings
+CONFIG_PATH = os.path.join(os.path.expanduser("~"), "svanterm.ini")
+# The layout is saved here every SESSION_AUTOSAVE_INTERVAL seconds (if it
+# changed) and when the last window closes, and restored on startup
+SESSION_PATH = os.path.join(os.path.expanduser("~"), "svanterm-session.json")
+SESSION_AUTOSAVE_INTERVAL = 60
+# Number of hidden, already started alacritty windows kept ready for new
+# terminals and how long (in seconds) such a window may wait before replaced
+TERMINAL_POOL_SIZE = 2
+TERMINAL_POOL_MAX_AGE = 600
+# Seconds to wait for the window of a newly started alacritty
+SPAWN_TIMEOUT = 10
+# Max number of times per second terminals are resized while dragging a
+# sash or resizing a window
+LIVE_RESIZE_RATE = 30
+# A hidden window is kept ready for new windows, after one was used the
+# next is built this many seconds later
+STANDBY_WINDOW_DELAY = 1
+# Number of pre-rendered terminal header bitmaps to keep, every terminal
+# needs one while focused and one while not
+HEADER_CACHE_SIZE = 256
+# Set SVANTERM_DEBUG_LEAKS=1 to have destroyed terminals, containers and
+# splitters that are still referenced reported when the last window closes
+DEBUG_LEAKS = os.environ.get("SVANTERM_DEBUG_LEAKS") == "1"
+
+HEADER_MAXIMIZED = 0
+HEADER_FAILED = 1
+HEADER_ENABLED = 2
+HEADER_DISABLED = 3
+# Gradient top, bottom and text colour, None for the system text colour
+HEADER_COLOURS = {
+    HEADER_MAXIMIZED: ((0, 0, 255), (0, 0, 100), (255, 255, 255)),
+    HEADER_FAILED: ((90, 90, 90), (40, 40, 40), (255, 120, 120)),
+    HEADER_ENABLED: ((255, 0, 0), (100, 0, 0), (255, 255, 255)),
+    HEADER_DISABLED: ((220, 220, 220), (150, 150, 150), None),
+}
+
+
+def layout_operation(name):
+    # The method runs as one layout transaction, see transactions.py
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with app.transactions.transaction(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_header(width, height, state, label):
+    top, bottom, text = HEADER_COLOURS[state]
+    bitmap = wx.Bitmap(width, height)
+    dc = wx.MemoryDC(bitmap)
+    dc.GradientFillLinear(
+        wx.Rect(0, 0, width, height), wx.Colour(*top), wx.Colour(*bottom), wx.SOUTH
+    )
+    if text:
+        dc.SetTextForeground(wx.Colour(*text))
+    else:
+        dc.SetTextForeground(wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOWTEXT))
+
+    dc.SetFont(app.header_font)
+    tw, th = dc.GetTextExtent(label)
+    dc.DrawText(label, int((width - tw) / 2), int((height - th) / 2))
+    dc.SelectObject(wx.NullBitmap)
+    return bitmap
 
 
 class TerminalHeader(wx.StaticText):
@@ -42,188 +163,157 @@ class TerminalHeader(wx.StaticText):
         self.label = label
         self.enabled = True
         self.maximized = False
+        self.failed = False
         self.Bind(wx.EVT_PAINT, self.on_paint)
         self.Bind(wx.EVT_ERASE_BACKGROUND, lambda event: None)
         self.Bind(wx.EVT_SIZE, self.on_size)
 
-    def on_paint(self, event):
-        dc = wx.AutoBufferedPaintDCFactory(self)
-
+    def GetState(self):
         if self.maximized:
-            dc.GradientFillLinear(
-                self.GetClientRect(), wx.BLUE, wx.Colour(0, 0, 100), wx.SOUTH
-            )
-            dc.SetTextForeground(wx.WHITE)
-        elif self.enabled:
-            dc.GradientFillLinear(
-                self.GetClientRect(), wx.RED, wx.Colour(100, 0, 0), wx.SOUTH
-            )
-            dc.SetTextForeground(wx.WHITE)
-        else:
-            dc.GradientFillLinear(
-                self.GetClientRect(),
-                wx.Colour(220, 220, 220),
-                wx.Colour(150, 150, 150),
-                wx.SOUTH,
+            return HEADER_MAXIMIZED
+        if self.failed:
+            return HEADER_FAILED
+        if self.enabled:
+            return HEADER_ENABLED
+        return HEADER_DISABLED
+
+    def SetEnabled(self, enabled):
+        if enabled != self.enabled:
+            self.enabled = enabled
+            self.Refresh()
+
+    def on_paint(self, event):
+        app.transactions.redrawn()
+        tracer.call("paint_header", self.paint, category="paint")
+
+    def paint(self):
+        dc = wx.PaintDC(self)
+        width, height = self.GetClientSize()
+        if width > 0 and height > 0:
+            dc.DrawBitmap(
+                app.header_cache.get((width, height, self.GetState(), self.label)),
+                0,
+                0,
             )
-            dc.SetTextForeground(self.GetForegroundColour())
-
-        dc.SetFont(wx.Font(12, wx.MODERN, wx.NORMAL, wx.NORMAL))
-        tw, th = dc.GetTextExtent(self.label)
-        dc.DrawText(
-            self.label,
-            int((self.GetSize()[0] - tw) / 2),
-            int((self.GetSize()[1] - th) / 2),
-        )
 
     def on_size(self, event):
         self.Refresh()
         event.Skip()
 
     def SetLabel(self, label):
+        if label == self.label:
+            return
+
         self.label = label
         self.Refresh()
 
 
 class Terminal(wx.Window):
-    def __init__(self, parent):
+    def __init__(self, parent, terminal_hwnd=None, tab=None):
         super(Terminal, self).__init__(parent)
         self.SetBackgroundColour(wx.BLACK)
-
-        # For some reason we are losing the focus during terminal creation,
-        # maybe alacritty does steal is? However check if focus changes right
-        # after creation and in this case set it back to the TerminalWindow
-        foreground_window = win32gui.GetForegroundWindow()
-
-        # TODO: This works to hide the flickering of alacritty spawning a terminal
-        #       but it probably shouldn't block the main UI thread
-        # self.GetParentTab().GetGrandParent().ToggleWindowStyle(wx.STAY_ON_TOP)
-        # time.sleep(0.2)
-        self.terminal_hwnd = app.spawn_terminal()
-
-        app.hwnd_to_terminal[self.terminal_hwnd] = self
-
-        self.title = win32gui.GetWindowText(self.terminal_hwnd)
+        self.node = Leaf(self)
+        self.closed = False
+        app.registry.add("terminal", self)
+
+        # Until alacritty is up the pane is a placeholder with just a header
+        self.terminal_hwnd = None
+        self.terminal_pid = None
+        self.title = "Starting terminal..."
+        app.search_index.add(self, self.title)
         self.text = TerminalHeader(self, self.title)
 
         self.Bind(wx.EVT_SIZE, self.OnSize)
         self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
         self.text.Bind(wx.EVT_MIDDLE_DOWN, self.Destroy)
-
-        win32gui.SetWindowLong(
-            self.terminal_hwnd, win32con.GWL_STYLE, win32con.WS_CHILD
-        )
-        win32gui.SetParent(self.terminal_hwnd, self.GetHandle())
-
         self.GetParent().OnSize()
-        win32gui.ShowWindow(self.terminal_hwnd, win32con.SW_SHOW)
-
-        def ensure_foreground_window():
-            for _ in range(10):
-                if win32gui.GetForegroundWindow() != foreground_window:
-                    win32gui.SetForegroundWindow(foreground_window)
-
-                time.sleep(0.1)
 
-            # self.GetParentTab().GetGrandParent().ToggleWindowStyle(wx.STAY_ON_TOP)
-
-        threading.Thread(target=ensure_foreground_window).start()
-
-    def ShowDockHint(self, mouse_pos):
-        size = self.GetClientSize()
-        terminal_pos = self.GetScreenPosition()
-        center = (size[0] / 2, size[1] / 2)
-        from_center = (mouse_pos[0] - center[0], mouse_pos[1] - center[1])
-
-        if abs(from_center[0]) > abs(from_center[1]):
-            if from_center[0] <= 0:
-                app.dock_hint.SetRect(
-                    wx.Rect(
-                        int(terminal_pos[0]),
-                        int(terminal_pos[1]),
-                        int(center[0]),
-                        int(size[1]),
-                    )
-                )
-                app.dock_pos = DOCK_LEFT
-            else:
-                app.dock_pos = DOCK_RIGHT
-                app.dock_hint.SetRect(
-                    wx.Rect(
-                        int(terminal_pos[0] + center[0]),
-                        int(terminal_pos[1]),
-                        int(center[0]),
-                        int(size[1]),
-                    )
-                )
+        if terminal_hwnd:
+            self.Attach(terminal_hwnd, tab)
         else:
-            if from_center[1] <= 0:
-                app.dock_pos = DOCK_TOP
-                app.dock_hint.SetRect(
-                    wx.Rect(
-                        int(terminal_pos[0]),
-                        int(terminal_pos[1]),
-                        int(size[0]),
-                        int(center[1]),
-                    )
-                )
-            else:
-                app.dock_pos = DOCK_BOTTOM
-                app.dock_hint.SetRect(
-                    wx.Rect(
-                        int(terminal_pos[0]),
-                        int(terminal_pos[1] + center[1]),
-                        int(size[0]),
-                        int(center[1]),
-                    )
-                )
-
-        app.dock_to = self
+            app.spawn_terminal(self)
+
+    def Attach(self, terminal_hwnd, tab=None):
+        # tab is the Container the terminal goes into when it isn't linked
+        # into the layout yet, as when a restored split attaches right away
+        self.terminal_hwnd = terminal_hwnd
+        app.registry.set_key("terminal", self.terminal_hwnd, self)
+        self.terminal_pid = app.desktop.window_pid(self.terminal_hwnd)
+        app.win_events.add_process(self.terminal_pid)
+        # alacritty may take the foreground while it is embedded and shown,
+        # until the events of that are handled
+        app.focus_guard.guard(self.terminal_pid)
+
+        title = app.desktop.window_text(self.terminal_hwnd)
+        app.title_pipeline.set_title(self.terminal_hwnd, title)
+        app.update_title(self, title)
+
+        app.desktop.embed(self.terminal_hwnd, self.GetHandle())
+        if tab is None:
+            node = self.node.tab()
+            tab = node.payload if node is not None else None
+        app.panes.attach(
+            self.terminal_hwnd, self.GetSize(), tab is not None and tab.dormant
+        )
+        if app.last_active_terminal is self:
+            wx.CallAfter(app.set_focus, self)
+        wx.CallAfter(app.focus_guard.release, self.terminal_pid)
+
+    def SpawnFailed(self, error):
+        self.text.failed = True
+        app.update_title(
+            self, "Terminal failed to start: %s (middle click to close)" % error
+        )
 
     def OnSize(self, event=None):
-        app.move_window_thread.request_queue.put(self)
-        self.text.SetSize((self.GetSize()[0], 20))
+        size = self.GetSize()
+        if self.terminal_hwnd:
+            app.panes.resize(self.terminal_hwnd, *size)
+        self.text.SetSize((size[0], HEADER_HEIGHT))
 
+    @layout_operation("close")
     def Destroy(self, event=None):
-        try:
-            terminal_list = app.build_terminal_list(self.GetParentTab())
-        except RuntimeError:
-            # Parent is probably already destroyed
+        if not app.layout.contains(self.node):
+            # Tab or window is probably already destroyed
             return
 
-        if len(terminal_list) > 1:
-            if self.GetGrandParent().panel1 == self.GetParent():
-                app.focus_terminal(terminal_list[terminal_list.index(self) + 1])
-            else:
-                app.focus_terminal(terminal_list[terminal_list.index(self) - 1])
+        neighbour = app.layout.neighbour(self.node)
+        if neighbour:
+            app.focus_terminal(neighbour.payload)
 
-        self.GetParent().Hide()
-        wx.CallAfter(self.GetParent().Destroy)
+        app.layout.remove(self.node)
+        self.RemovePanel()
         super(Terminal, self).Destroy()
 
-    def GetParentTab(self):
-        child = self
-        while not isinstance(child.GetParent(), TabControl):
-            child = child.GetParent()
+    def RemovePanel(self):
+        # Hides the panel the terminal is in and has it destroyed. The
+        # splitter around it collapses right away, within the transaction
+        # of the operation, the panel can't be destroyed from here.
+        panel = self.GetParent()
+        if isinstance(panel.GetParent(), Splitter):
+            panel.GetParent().Collapse(panel)
+        panel.Hide()
+        wx.CallAfter(panel.Destroy)
 
-        return child
+    def GetParentTab(self):
+        return self.node.tab().payload
 
     def GetParentWindow(self):
-        current = self
-        while not isinstance(current, TerminalWindow):
-            current = current.GetParent()
-
-        return current
+        return self.node.window().payload
 
     def OnDestroy(self, event):
-        try:
-            win32api.PostMessage(self.terminal_hwnd, win32con.WM_QUIT)
-        except pywintypes.error:
-            pass
+        # Also sent for the header, handle it once
+        if self.closed:
+            return
 
-    def __del__(self):
-        del app.hwnd_to_terminal[self.terminal_hwnd]
-        super(Terminal, self).__del__()
+        # A terminal still being spawned is closed when it shows up
+        self.closed = True
+        app.registry.retire("terminal", self, self.terminal_hwnd)
+        app.forget_terminal(self)
+        app.panes.close(self, self.terminal_hwnd)
+        if self.terminal_hwnd:
+            # May be called from within the destroy hook of that process
+            wx.CallAfter(app.win_events.remove_process, self.terminal_pid)
 
 
 class Splitter(wx.SplitterWindow):
@@ -233,14 +323,59 @@ class Splitter(wx.SplitterWindow):
         self.SetBackgroundColour(wx.BLACK)
         self.SetSashGravity(0.5)
         self.SetSize(parent.GetClientSize())
+        self.node = None
+        self.collapsed = False
+        app.registry.add("splitter", self)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
         self.panel1 = Container(self)
         self.panel2 = Container(self)
         self.panel1.Bind(wx.EVT_WINDOW_DESTROY, self.OnChildDestoyed)
         self.panel2.Bind(wx.EVT_WINDOW_DESTROY, self.OnChildDestoyed)
+        self.Bind(wx.EVT_SPLITTER_SASH_POS_CHANGING, self.OnSashDragging)
+        self.Bind(wx.EVT_SPLITTER_SASH_POS_CHANGED, self.OnSashChanged)
         # To prevent the splitter from unsplit on doubleclick
         self.SetMinimumPaneSize(1)
 
+    def OnSashDragging(self, event):
+        app.resize_scheduler.set_live(self, True)
+        event.Skip()
+
+    def OnSashChanged(self, event):
+        app.resize_scheduler.set_live(self, False)
+        self.UpdateRatio(event)
+
+    def SetRatio(self, ratio):
+        if self.GetSplitMode() == wx.SPLIT_VERTICAL:
+            size = self.GetClientSize()[0]
+        else:
+            size = self.GetClientSize()[1]
+
+        self.SetSashPosition(int(size * ratio))
+        self.node.ratio = ratio
+        app.layout.touch()
+
+    def UpdateRatio(self, event=None):
+        if self.GetSplitMode() == wx.SPLIT_VERTICAL:
+            size = self.GetClientSize()[0]
+        else:
+            size = self.GetClientSize()[1]
+
+        if self.node and size:
+            self.node.ratio = float(self.GetSashPosition()) / size
+            app.layout.touch()
+
+        if event:
+            event.Skip()
+
+    def OnDestroy(self, event):
+        # Destroy events of the children propagate up to here
+        if event.GetEventObject() is self:
+            app.registry.retire("splitter", self)
+        event.Skip()
+
     def OnChildDestoyed(self, event):
+        # The panel itself needs to see the event too
+        event.Skip()
         try:
             if self.IsBeingDeleted():
                 return
@@ -248,29 +383,51 @@ class Splitter(wx.SplitterWindow):
         except RuntimeError:
             return
 
-        if event.GetWindow() == self.panel1:
-            remaining_panel = self.panel2
-        elif event.GetWindow() == self.panel2:
-            remaining_panel = self.panel1
-        else:
+        if event.GetWindow() not in (self.panel1, self.panel2):
             return
 
-        for child in remaining_panel.GetChildren():
-            child.Reparent(self.GetParent())
-            child.SetSize(self.GetParent().GetClientSize())
+        self.Collapse(event.GetWindow())
 
         # Schedule a destroy, can't run this directly from this event as this will crash python
         self.Hide()
         wx.CallAfter(self.Destroy)
 
+    def Collapse(self, removed_panel):
+        # Moves what is in the other panel up to the parent of the splitter
+        if self.collapsed:
+            return
+
+        self.collapsed = True
+        self.Hide()
+        if removed_panel is self.panel1:
+            remaining_panel = self.panel2
+        else:
+            remaining_panel = self.panel1
+        for child in remaining_panel.GetChildren():
+            child.Reparent(self.GetParent())
+            child.SetSize(self.GetParent().GetClientSize())
+
 
 class Container(wx.Window):
     def __init__(self, parent, size=(100, 100)):
         super(Container, self).__init__(parent, size=size, pos=(10000, 10000))
         self.active_terminal = None
-        self.custom_name = ""
+        # Only set for containers that are the page of a tab
+        self.node = None
+        # Set while the tab isn't the selected one of its window
+        self.dormant = False
         self.SetBackgroundColour(wx.BLACK)
+        app.registry.add("container", self)
         self.Bind(wx.EVT_SIZE, self.OnSize)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
+
+    @property
+    def custom_name(self):
+        return self.node.name if self.node else ""
+
+    @custom_name.setter
+    def custom_name(self, name):
+        self.node.name = name
 
     def OnSize(self, event=None, force=False):
         if force or self.IsShown():
@@ -279,23 +436,46 @@ class Container(wx.Window):
 
     def Destroy(self):
         if isinstance(self.GetParent(), TabControl):
-            self.GetParent().RemoveTab(self)
+            # Also when the last terminal of the tab closed, after that
+            # operation already committed
+            with app.transactions.transaction("close_tab"):
+                app.layout.remove_tab(self.node)
+                app.search_index.remove_tab(self.node)
+                self.GetParent().RemoveTab(self)
+                super(Container, self).Destroy()
+            return
+
         super(Container, self).Destroy()
 
+    def OnDestroy(self, event):
+        if event.GetEventObject() is self:
+            app.registry.retire("container", self)
+        event.Skip()
+
 
 class TabControl(aui.AuiNotebook):
     def __init__(self, parent):
         super(TabControl, self).__init__(
             parent, agwStyle=aui.AUI_NB_TAB_MOVE | aui.AUI_NB_MIDDLE_CLICK_CLOSE
         )
+        self.window = parent
         self.SetBackgroundColour(wx.BLACK)
         self.Bind(aui.EVT_AUINOTEBOOK_PAGE_CHANGED, self.OnPageChanged)
         self.Bind(aui.EVT_AUINOTEBOOK_END_LABEL_EDIT, self.OnLabelEdited)
 
     def AddTab(self, new_tab, title):
+        if new_tab.node is None:
+            new_tab.node = app.layout.add_tab(
+                self.window.node, new_tab.GetChildren()[0].node, new_tab
+            )
+            app.search_index.update(new_tab.GetChildren()[0], tab=new_tab.node)
+        else:
+            app.layout.move_tab(new_tab.node, self.window.node)
+
         new_tab.SetSize(self.GetClientSize())
         self.AddPage(new_tab, title, select=True)
         self.SetRenamable(self.GetSelection(), True)
+        self.UpdateDormant()
         return new_tab
 
     def RemoveTab(self, tab):
@@ -305,7 +485,9 @@ class TabControl(aui.AuiNotebook):
 
         page_index = self.GetPageIndex(tab)
         self.RemovePage(page_index)
+        self.UpdateDormant()
 
+    @layout_operation("close_tab")
     def DeletePage(self, page_idx):
         if self.GetPageCount() == 1:
             wx.CallAfter(self.GetParent().Close)
@@ -319,13 +501,26 @@ class TabControl(aui.AuiNotebook):
         if tab:
             self.SetSelectionToWindow(tab)
 
+    def UpdateDormant(self):
+        # Only the terminals of the selected tab are shown and resized
+        current = self.GetCurrentPage()
+        if current:
+            app.set_tab_dormant(current, False)
+        for index in range(self.GetPageCount()):
+            page = self.GetPage(index)
+            if page is not current:
+                app.set_tab_dormant(page, True)
+
+    @layout_operation("switch_tab")
     def OnPageChanged(self, event):
+        app.hit_test.invalidate()
+        self.UpdateDormant()
         self.GetCurrentPage().OnSize(force=True)
 
         if (
             not app.dock_from
             and self.GetCurrentPage().active_terminal
-            and not app.find_dialog.IsShown()
+            and not app.find_dialog_shown()
         ):
             app.focus_terminal(self.GetCurrentPage().active_terminal)
 
@@ -334,9 +529,10 @@ class TabControl(aui.AuiNotebook):
             return
 
         self.GetPage(event.GetSelection()).custom_name = event.GetLabel()
-        wx.CallAfter(
-            app.update_title, self.GetCurrentPage().active_terminal.terminal_hwnd
+        app.search_index.rename_tab(
+            self.GetPage(event.GetSelection()).node, event.GetLabel()
         )
+        wx.CallAfter(app.update_title, self.GetCurrentPage().active_terminal)
         wx.CallAfter(app.focus_terminal, self.GetCurrentPage().active_terminal)
 
     def OnTabBeginDrag(self, event):
@@ -344,37 +540,115 @@ class TabControl(aui.AuiNotebook):
 
     def OnTabEndDrag(self, event):
         app.dock_from = None
-        app.dock_hint.Hide()
+        app.dock_zones = None
+        if app.dock_hint:
+            app.dock_hint.Hide()
 
 
 class TerminalWindow(wx.Frame):
-    def __init__(self):
+    def __init__(self, standby=False):
         super(TerminalWindow, self).__init__(None, -1, PROGRAM_TITLE, size=(800, 600))
         self.maximized_terminal = None
         self.maximized_terminal_original_parent = None
         self.maximized_container = None
+        self.node = None
 
         self.SetBackgroundColour(wx.BLACK)
         self.tabs = TabControl(self)
         self.Maximize()
-        self.Show(True)
 
-        app.hwnd_to_terminal_window[self.GetHandle()] = self
+        self.tabs.Bind(wx.EVT_PAINT, self.OnFirstPaint)
         self.Bind(wx.EVT_CLOSE, self.OnClose)
+        # Sent when the user starts/stops moving or resizing the window
+        self.Bind(wx.EVT_MOVE_START, self.OnLiveResize)
+        self.Bind(wx.EVT_MOVE_END, self.OnLiveResize)
+        self.Bind(wx.EVT_MOVE, self.OnGeometryChanged)
+        self.Bind(wx.EVT_SIZE, self.OnGeometryChanged)
+        self.Bind(wx.EVT_ICONIZE, self.OnGeometryChanged)
+
+        if not standby:
+            self.Reveal()
+
+    def Reveal(self):
+        # A standby window is only part of the layout once it is used
+        self.node = app.layout.add_window(self)
+        self.Show(True)
+        app.hwnd_to_terminal_window[self.GetHandle()] = self
+
+    def OnFirstPaint(self, event):
+        self.tabs.Unbind(wx.EVT_PAINT, handler=self.OnFirstPaint)
+        app.standby_windows.painted(self)
+        event.Skip()
+
+    def OnGeometryChanged(self, event):
+        app.hit_test.invalidate()
+        event.Skip()
+
+    def OnLiveResize(self, event):
+        app.resize_scheduler.set_live(self, event.GetEventType() == wx.wxEVT_MOVE_START)
+        event.Skip()
 
     def OnClose(self, event):
+        app.resize_scheduler.set_live(self, False)
+        if len(app.hwnd_to_terminal_window) == 1:
+            app.session_timer.Stop()
+            app.save_session()
+
         del app.hwnd_to_terminal_window[self.GetHandle()]
+        app.layout.remove_window(self.node)
 
         if len(app.hwnd_to_terminal_window) == 0:
             windll.user32.UnhookWindowsHookEx(app.keyboard_hook)
             windll.user32.UnhookWindowsHookEx(app.mouse_hook)
-            windll.user32.UnhookWinEvent(app.terminal_event_hook)
-            app.dock_hint.Destroy()
-            app.find_dialog.Destroy()
+            app.win_events.close()
+            app.command_server.close()
+            app.terminal_pool.close()
+            app.spawner.close(app.terminal_pool.launcher.dispose)
+            standby_window = app.standby_windows.close()
+            if standby_window:
+                standby_window.Destroy()
+            if app.dock_hint:
+                app.dock_hint.Destroy()
+            if app.find_dialog:
+                app.find_dialog.Destroy()
+            if DEBUG_LEAKS:
+                wx.CallAfter(app.write_leak_report)
 
         event.Skip()
 
 
+@functools.lru_cache(maxsize=None)
+def find_list_class():
+    # ultimatelistctrl takes a while to import and is only needed once the
+    # find dialog is opened
+    import wx.lib.agw.ultimatelistctrl as ultimatelistctrl
+
+    class FindList(ultimatelistctrl.UltimateListCtrl):
+        # Virtual list, only the visible rows of the search result are fetched
+        def __init__(self, parent, **kwargs):
+            super(FindList, self).__init__(parent, wx.ID_ANY, **kwargs)
+            self.results = []
+
+        def SetResults(self, results):
+            self.results = results
+            self.SetItemCount(len(results))
+            self.Refresh()
+
+        def OnGetItemText(self, item, col):
+            if col == 0:
+                return app.search_index.title(self.results[item])
+
+            return app.search_index.tab_name(self.results[item])
+
+        def GetTerminal(self, item):
+            if 0 <= item < len(self.results) and not self.results[item].closed:
+                return self.results[item]
+
+            return None
+
+    return FindList
+
+
 class FindDialog(wx.Frame):
     def __init__(self):
         super(FindDialog, self).__init__(
@@ -388,10 +662,9 @@ class FindDialog(wx.Frame):
         self.text = wx.TextCtrl(self, size=(398, 20), style=wx.TE_PROCESS_ENTER)
         self.text.SetBackgroundColour(wx.Colour(50, 50, 50))
         self.text.SetForegroundColour(wx.WHITE)
-        self.list = ultimatelistctrl.UltimateListCtrl(
+        self.list = find_list_class()(
             self,
-            wx.ID_ANY,
-            agwStyle=wx.LC_REPORT | wx.LC_NO_HEADER | wx.LC_SINGLE_SEL,
+            agwStyle=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER | wx.LC_SINGLE_SEL,
             pos=(0, 20),
             size=(600, 180),
         )
@@ -410,27 +683,27 @@ class FindDialog(wx.Frame):
         self.text.Bind(wx.EVT_TEXT, self.Filter)
         self.text.Bind(wx.EVT_TEXT_ENTER, self.OnItemActivated)
         self.text.Bind(wx.EVT_KEY_DOWN, self.OnKeyDown)
+        self.Bind(wx.EVT_SHOW, self.OnShow)
 
-    def Filter(self, event=None):
-        text = self.text.GetValue().upper()
-        self.list.DeleteAllItems()
+    def OnShow(self, event):
+        app.hit_test.invalidate()
+        if not event.IsShown():
+            # Don't keep closed terminals alive in the results
+            self.list.SetResults([])
+        event.Skip()
 
-        for terminal in app.hwnd_to_terminal.values():
-            tab_title = terminal.GetParentTab().custom_name
-            if (
-                terminal.title.upper().find(text) != -1
-                or tab_title.upper().find(text) != -1
-            ):
-                item = self.list.InsertStringItem(2**30, terminal.title)
-                self.list.SetStringItem(item, 1, tab_title)
-                self.list.SetItemData(item, terminal)
+    def Filter(self, event=None):
+        self.list.SetResults(app.search_index.search(self.text.GetValue()))
 
     def OnLeftDown(self, event):
         wx.CallAfter(self.text.SetFocus)
         event.Skip()
 
     def OnSelect(self, event):
-        terminal = self.list.GetItemData(self.list.GetFirstSelected())
+        terminal = self.list.GetTerminal(self.list.GetFirstSelected())
+        if not terminal:
+            return
+
         tab = terminal.GetParentTab()
 
         tab.GetParent().SetSelection(tab.GetParent().GetPageIndex(tab))
@@ -465,91 +738,336 @@ class EventThread(threading.Thread):
 
     def run(self):
         while 1:
-            if (
-                win32event.WaitForSingleObject(
-                    app.new_window_event, win32event.INFINITE
+            app.desktop.wait_signal(app.new_window_event)
+            wx.CallAfter(app.spawn_window)
+
+
+class Win32Desktop(Desktop):
+    def foreground_window(self):
+        return win32gui.GetForegroundWindow()
+
+    def set_foreground_window(self, hwnd):
+        win32gui.SetForegroundWindow(hwnd)
+
+    def set_focus(self, hwnd):
+        win32gui.SetFocus(hwnd)
+
+    def window_text(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+    def window_pid(self, hwnd):
+        return win32process.GetWindowThreadProcessId(hwnd)[1]
+
+    def is_window(self, hwnd):
+        return win32gui.IsWindow(hwnd)
+
+    def is_ready(self, hwnd):
+        style = win32gui.GetWindowLong(hwnd, win32con.GWL_STYLE)
+        return (style & win32con.WS_VISIBLE) and (style & win32con.WS_CAPTION)
+
+    def process_windows(self, pid):
+        def callback(hwnd, hwnds):
+            if self.window_pid(hwnd) == pid:
+                hwnds.append(hwnd)
+
+            return True
+
+        hwnds = []
+        win32gui.EnumWindows(callback, hwnds)
+        return hwnds
+
+    def embed(self, hwnd, parent):
+        win32gui.SetWindowLong(hwnd, win32con.GWL_STYLE, win32con.WS_CHILD)
+        win32gui.SetParent(hwnd, parent)
+
+    def show_window(self, hwnd, show):
+        win32gui.ShowWindow(hwnd, win32con.SW_SHOW if show else win32con.SW_HIDE)
+
+    def close_window(self, hwnd):
+        try:
+            win32api.PostMessage(hwnd, win32con.WM_QUIT)
+        except pywintypes.error:
+            pass
+
+    def start_process(self, args):
+        return subprocess.Popen(args).pid
+
+    def kill_process(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    def key_pressed(self, vkey):
+        return bool(win32api.GetAsyncKeyState(vkey) & 0x8000)
+
+    def open_signal(self, name):
+        event = win32event.CreateEvent(None, 0, 0, name)
+        return event, win32api.GetLastError() == winerror.ERROR_ALREADY_EXISTS
+
+    def set_signal(self, event):
+        win32event.SetEvent(event)
+
+    def wait_signal(self, event):
+        win32event.WaitForSingleObject(event, win32event.INFINITE)
+
+    def move_windows(self, batch):
+        # DeferWindowPos only batches windows sharing a parent, every
+        # alacritty window has its own Terminal parent. Post the moves
+        # instead so a busy alacritty doesn't hold up the rest.
+        for hwnd, (x, y, width, height) in batch:
+            try:
+                win32gui.SetWindowPos(
+                    hwnd,
+                    0,
+                    x,
+                    y,
+                    width,
+                    height,
+                    win32con.SWP_NOZORDER
+                    | win32con.SWP_NOACTIVATE
+                    | win32con.SWP_ASYNCWINDOWPOS,
                 )
-                == win32event.WAIT_OBJECT_0
-            ):
-                wx.CallAfter(app.spawn_window)
+            except pywintypes.error:
+                # Terminal is probably removed
+                pass
 
 
-class MoveWindowThread(threading.Thread):
-    def __init__(self):
-        super(MoveWindowThread, self).__init__()
+class Win32HookBackend(HookBackend):
+    def __init__(self, callback):
+        # Referenced for as long as any of the hooks is installed
+        self.cfunc = CFUNCTYPE(
+            c_void_p, c_int, c_int, c_int, c_int, c_int, c_int, c_int
+        )(callback)
+
+    def set_hook(self, event, pid):
+        return windll.user32.SetWinEventHook(
+            event,
+            event,
+            0,
+            self.cfunc,
+            pid,
+            0,
+            win32con.WINEVENT_OUTOFCONTEXT,
+        )
+
+    def unhook(self, handle):
+        windll.user32.UnhookWinEvent(handle)
+
+
+class AppCommandTarget(CommandTarget):
+    # The command channel acting on the windows of the app
+    @property
+    def layout(self):
+        return app.layout
+
+    def transaction(self):
+        return app.transactions.transaction("command_batch")
+
+    def new_window(self, name):
+        return app.spawn_window(name).node
+
+    def new_tab(self, window, name):
+        return app.new_tab(window.payload, name=name, focus=False).node
+
+    def split(self, leaf, orientation, ratio):
+        terminal = leaf.payload
+        return app.split_terminal(
+            terminal.GetParentWindow(), terminal, orientation, ratio=ratio, focus=False
+        ).node
+
+    def rename_tab(self, tab, name):
+        tab.payload.custom_name = name
+        app.search_index.rename_tab(tab, name)
+        app.update_title(tab.payload.active_terminal)
+
+    def focus(self, leaf):
+        terminal = leaf.payload
+        window = terminal.GetParentWindow()
+        app.unmaximize_terminal(window)
+        tab = terminal.GetParentTab()
+        window.tabs.SetSelection(window.tabs.GetPageIndex(tab))
+        window.Raise()
+        app.focus_terminal(terminal)
+
+    def title(self, leaf):
+        return leaf.payload.title
+
+    def selected_tab(self, window):
+        page = window.payload.tabs.GetCurrentPage()
+        return page.node if page else None
+
+
+class WindowDiscoveryThread(threading.Thread):
+    # The hook gets its own thread and message loop, the UI thread may be
+    # the one blocking in WindowDiscovery.wait()
+    def __init__(self, discovery):
+        super(WindowDiscoveryThread, self).__init__()
         self.daemon = True
-        self.request_queue = queue.Queue()
+        self.discovery = discovery
+
+    def OnWindowEvent(
+        self,
+        hWinEventHook,
+        eventType,
+        hwnd,
+        idObject,
+        idChild,
+        dwEventThread,
+        dwmsEventTime,
+    ):
+        if idObject == win32con.OBJID_WINDOW:
+            self.discovery.on_window_event(hwnd)
 
     def run(self):
-        while True:
-            terminals = set([self.request_queue.get(True)])
-            while True:
-                try:
-                    terminals.add(self.request_queue.get(False))
-                except queue.Empty:
-                    break
-
-            # Processing the request directly seems to set the wrong initial size
-            # sometimes. I'm not sure if the terminal reports wrong size or if
-            # alacritty does something weird.
-            time.sleep(0.1)
+        self.window_event_cfunc = CFUNCTYPE(
+            c_void_p, c_int, c_int, c_int, c_int, c_int, c_int, c_int
+        )(self.OnWindowEvent)
+        self.window_event_hook = windll.user32.SetWinEventHook(
+            win32con.EVENT_OBJECT_SHOW,
+            win32con.EVENT_OBJECT_SHOW,
+            0,
+            self.window_event_cfunc,
+            0,
+            0,
+            win32con.WINEVENT_OUTOFCONTEXT | win32con.WINEVENT_SKIPOWNPROCESS,
+        )
+        win32gui.PumpMessages()
 
-            for terminal in terminals:
-                try:
-                    size = terminal.GetSize()
-                except RuntimeError:
-                    # Terminal is probably removed
-                    continue
-
-                # Minimum size of 150x150, really small sizes messes up the terminal
-                win32gui.MoveWindow(
-                    terminal.terminal_hwnd,
-                    0,
-                    20,
-                    max(size[0], 150),
-                    max(size[1] - 20, 150),
-                    True,
-                )
+
+def get_modifiers():
+    modifiers = 0
+    for vkey, modifier in MODIFIER_KEYS.items():
+        if app.desktop.key_pressed(vkey):
+            modifiers |= modifier
+
+    return modifiers
 
 
 class SvanTerm(wx.App):
     def Init(self):
-        self.new_window_event = win32event.CreateEvent(
-            None, 0, 0, "SvanTerm_new_window"
-        )
-        if win32api.GetLastError() == winerror.ERROR_ALREADY_EXISTS:
+        self.desktop = Win32Desktop()
+        self.new_window_event, exists = self.desktop.open_signal("SvanTerm_new_window")
+        if exists:
             # An instance already exists, send an open new window event instead
-            win32event.SetEvent(self.new_window_event)
+            self.desktop.set_signal(self.new_window_event)
             return False
 
         EventThread().start()
-        self.move_window_thread = MoveWindowThread()
-        self.move_window_thread.start()
-        self.find_dialog = FindDialog()
-
+        self.resize_scheduler = ResizeScheduler(
+            self.desktop, live_rate=LIVE_RESIZE_RATE
+        )
+        self.resize_scheduler.start()
+        self.transactions = LayoutTransactions(
+            self.resize_scheduler, self.freeze_windows, self.thaw_windows
+        )
+        # Created when first used
+        self.find_dialog = None
+        self.dock_hint = None
+        self.window_discovery = WindowDiscovery(
+            self.desktop.window_pid,
+            self.desktop.is_ready,
+            self.desktop.process_windows,
+        )
+        WindowDiscoveryThread(self.window_discovery).start()
+        self.focus_guard = FocusGuard(self.desktop)
+        self.terminal_pool = TerminalPool(
+            ProcessLauncher(
+                self.desktop,
+                self.window_discovery,
+                ["alacritty.exe"],
+                SPAWN_TIMEOUT,
+                self.focus_guard,
+            ),
+            TERMINAL_POOL_SIZE,
+            TERMINAL_POOL_MAX_AGE,
+        )
+        self.terminal_pool.start_eviction()
+        self.spawner = AsyncSpawner(self.acquire_terminal, wx.CallAfter)
+        # The first terminal launches while the rest starts up
+        self.spawner.prefetch()
+        startup_profile.mark("threads and terminal pool")
+
+        self.header_font = wx.Font(12, wx.MODERN, wx.NORMAL, wx.NORMAL)
+        self.header_cache = RenderCache(render_header, HEADER_CACHE_SIZE)
         self.hwnd_to_terminal_window = {}
-        self.hwnd_to_terminal = {}
+        self.registry = ObjectRegistry(DEBUG_LEAKS)
+        # Weak, entries go away with their terminal
+        self.hwnd_to_terminal = self.registry.index("terminal")
+        self.search_index = SearchIndex()
+        self.title_pipeline = TitlePipeline(
+            self.apply_titles,
+            lambda delay, callback: wx.CallLater(int(delay * 1000), callback),
+        )
+        self.layout = Layout()
+        self.panes = Panes(
+            self.desktop,
+            self.resize_scheduler,
+            self.title_pipeline,
+            self.search_index,
+            lambda terminal: terminal.terminal_hwnd,
+        )
+        self.navigator = Navigator(self.layout)
+        self.hit_test = HitTestCache(
+            self.build_hit_regions, lambda: self.layout.version
+        )
         self.dock_from = None
+        self.dock_to = None
+        self.dock_zones = None
+        self.dock_zone = None
         self.last_active_terminal = None
         self.clicked_terminal = None
-        self.spawn_window()
 
-        self.terminal_event_cfunc = CFUNCTYPE(
-            c_void_p, c_int, c_int, c_int, c_int, c_int, c_int, c_int
-        )(self.OnTerminalEvent)
-
-        self.terminal_event_hook = windll.user32.SetWinEventHook(
-            win32con.EVENT_SYSTEM_FOREGROUND,
-            win32con.EVENT_OBJECT_NAMECHANGE,
-            0,
-            self.terminal_event_cfunc,
-            0,
-            0,
-            0,
+        try:
+            keymap = load_keymap(CONFIG_PATH, self.hotkey_actions())
+        except KeymapError as error:
+            wx.MessageBox(
+                "%s: %s\nUsing the default keyboard shortcuts" % (CONFIG_PATH, error),
+                PROGRAM_TITLE,
+            )
+            keymap = compile_keymap(DEFAULT_KEYMAP)
+        self.key_dispatcher = KeyDispatcher(keymap)
+
+        # Only the foreground changes are needed desktop wide, destroy and
+        # title changes are hooked per alacritty process by the terminals
+        self.win_event_router = EventRouter(
+            {
+                EVENT_SYSTEM_FOREGROUND: self.OnForegroundEvent,
+                EVENT_OBJECT_DESTROY: self.OnTerminalDestroyed,
+                EVENT_OBJECT_NAMECHANGE: self.OnTerminalNameChanged,
+            },
+            {EVENT_OBJECT_DESTROY, EVENT_OBJECT_NAMECHANGE},
+            self.hwnd_to_terminal.__contains__,
+        )
+        self.win_events = WinEventSubscriptions(
+            Win32HookBackend(self.win_event_router),
+            [EVENT_SYSTEM_FOREGROUND],
+            [EVENT_OBJECT_DESTROY, EVENT_OBJECT_NAMECHANGE],
+        )
+        self.win_events.start()
+        startup_profile.mark("state, keymap and event hooks")
+
+        self.standby_windows = StandbyWindows(
+            lambda: TerminalWindow(standby=True),
+            lambda window: window.Reveal(),
+            lambda delay, callback: wx.CallLater(int(delay * 1000), callback),
+            STANDBY_WINDOW_DELAY,
         )
 
-        self.dock_hint = wx.Frame(None, style=wx.STAY_ON_TOP)
-        self.dock_hint.SetTransparent(127)
+        self.session_writer = SessionWriter(SESSION_PATH)
+        self.session_restore = None
+        self.restore_session()
+        self.session_timer = wx.Timer()
+        self.session_timer.Bind(wx.EVT_TIMER, lambda event: self.save_session())
+        self.session_timer.Start(SESSION_AUTOSAVE_INTERVAL * 1000)
+        startup_profile.mark("session and first window")
+
+        self.command_target = AppCommandTarget()
+        self.command_server = CommandServer(
+            lambda commands: run_batch(self.command_target, commands), wx.CallAfter
+        )
+        self.command_server.start()
+        startup_profile.mark("command server")
 
         # Use a keyboard hook instead of regular (hot)keys to filter out
         # Ctrl-Shift-<char> from triggering thrash characters in alacritty
@@ -566,43 +1084,58 @@ class SvanTerm(wx.App):
         self.mouse_hook = windll.user32.SetWindowsHookExA(
             win32con.WH_MOUSE_LL, self.mouse_hook_pointer, None, 0
         )
+        startup_profile.mark("input hooks")
+
+        # Unless the first window was one already
+        self.standby_windows.replace()
 
         return True
 
-    def spawn_terminal(self):
-        process = subprocess.Popen(["alacritty.exe"])
+    def spawn_terminal(self, terminal):
+        self.spawner.spawn(
+            lambda hwnd: self.terminal_spawned(terminal, hwnd),
+            lambda error: self.terminal_spawn_failed(terminal, error),
+        )
 
-        def callback(hwnd, hwnds):
-            _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
-            if found_pid == process.pid:
-                hwnds.append(hwnd)
+    def acquire_terminal(self):
+        with tracer.span("spawn_terminal", "spawn"), startup_profile.phase(
+            "launch terminal"
+        ):
+            return self.terminal_pool.acquire()
 
-            return True
+    def terminal_spawned(self, terminal, hwnd):
+        if terminal.closed:
+            self.terminal_pool.launcher.dispose(hwnd)
+            return
 
-        while True:
-            hwnds = []
-            win32gui.EnumWindows(callback, hwnds)
-            for hwnd in hwnds:
-                style = win32gui.GetWindowLong(hwnd, win32con.GWL_STYLE)
-                if (style & win32con.WS_VISIBLE) and (style & win32con.WS_CAPTION):
-                    return hwnd
+        with tracer.span("attach_terminal", "spawn"):
+            terminal.Attach(hwnd)
 
-            time.sleep(0.01)
+        if startup_profile.finish("event loop until attached"):
+            self.report_startup()
+
+    def terminal_spawn_failed(self, terminal, error):
+        if not terminal.closed:
+            terminal.SpawnFailed(error)
 
     def Keyboard_Event(self, nCode, wParam, lParam):
         keycode = cast(lParam, POINTER(c_int))[0]
+        action = self.key_dispatcher.key_event(
+            keycode, wParam in (win32con.WM_KEYDOWN, win32con.WM_SYSKEYDOWN)
+        )
 
-        if wParam in (win32con.WM_KEYDOWN, win32con.WM_SYSKEYDOWN):
-            window = self.hwnd_to_terminal_window.get(win32gui.GetForegroundWindow())
+        if action:
+            window = self.hwnd_to_terminal_window.get(self.desktop.foreground_window())
 
-            if window and self.process_hotkey(
-                keycode,
-                window,
-                ctrl=win32api.GetAsyncKeyState(win32con.VK_LCONTROL) & 0x8000,
-                shift=win32api.GetAsyncKeyState(win32con.VK_LSHIFT) & 0x8000,
-                alt=win32api.GetAsyncKeyState(win32con.VK_LMENU) & 0x8000,
-            ):
-                return True
+            # Only hotkeys get here, make sure the tracked modifiers are right
+            if window:
+                action = self.key_dispatcher.resync(get_modifiers(), keycode)
+
+            if window and action:
+                if tracer.call(
+                    "hotkey", self.run_action, action, window, detail=action
+                ):
+                    return True
 
         return windll.user32.CallNextHookEx(0, nCode, wParam, lParam)
 
@@ -617,9 +1150,17 @@ class SvanTerm(wx.App):
         x = lst[0]
         y = lst[1]
 
-        win = wx.FindWindowAtPoint((x, y))
+        if wParam == win32con.WM_MOUSEMOVE:
+            self.UpdateDockTarget(x, y)
+            return windll.user32.CallNextHookEx(0, nCode, wParam, lParam)
+
+        hit = self.hit_test.hit(x, y)
 
         if wParam == win32con.WM_LBUTTONDOWN:
+            # Only ask for the exact window when the click is on one of ours,
+            # another application may still be on top of it
+            win = wx.FindWindowAtPoint((x, y)) if hit else None
+
             if isinstance(win, aui.auibook.AuiTabCtrl):
                 self.focus_terminal(win.GetParent().GetCurrentPage().active_terminal)
 
@@ -630,8 +1171,8 @@ class SvanTerm(wx.App):
                 self.clicked_terminal = win
                 self.focus_terminal(win, False)
 
-            if not isinstance(
-                win, (ultimatelistctrl.UltimateListMainWindow, wx.TextCtrl)
+            if self.find_dialog_shown() and (
+                not win or wx.GetTopLevelParent(win) is not self.find_dialog
             ):
                 self.find_dialog.Hide()
 
@@ -639,27 +1180,7 @@ class SvanTerm(wx.App):
             if wParam == win32con.WM_LBUTTONUP:
                 self.FinishDragDrop()
             else:
-                if isinstance(win, aui.auibook.AuiTabCtrl):
-                    self.dock_hint.SetRect(win.GetScreenRect())
-                    self.dock_to = win
-                    if isinstance(self.dock_from, Terminal):
-                        win.GetParent().ActivateTabAtPoint(x, y)
-                elif win == self.dock_hint:
-                    if self.dock_to == DOCK_NEW_WINDOW:
-                        self.dock_hint.SetRect((x + 1, y + 1, 800, 600))
-                    elif isinstance(
-                        self.dock_to, aui.auibook.AuiTabCtrl
-                    ) and isinstance(self.dock_from, Terminal):
-                        self.dock_to.GetParent().ActivateTabAtPoint(x, y)
-                    elif isinstance(self.dock_to, Terminal):
-                        self.dock_to.ShowDockHint(self.dock_to.ScreenToClient((x, y)))
-                elif win is None or isinstance(self.dock_from, Container):
-                    self.dock_to = DOCK_NEW_WINDOW
-                    self.dock_hint.SetRect((x + 1, y + 1, 800, 600))
-                elif isinstance(win, Terminal):
-                    win.ShowDockHint(win.ScreenToClient((x, y)))
-                elif isinstance(win, TerminalHeader):
-                    win.GetParent().ShowDockHint(win.GetParent().ScreenToClient((x, y)))
+                self.UpdateDockTarget(x, y)
 
         if wParam == win32con.WM_LBUTTONUP and self.clicked_terminal:
             self.focus_terminal(self.clicked_terminal, True)
@@ -667,43 +1188,118 @@ class SvanTerm(wx.App):
 
         return windll.user32.CallNextHookEx(0, nCode, wParam, lParam)
 
+    def UpdateDockTarget(self, x, y):
+        # The zones are rebuilt only when the hit test regions were, like
+        # after a tab got activated by dragging over it
+        if (
+            self.dock_zones is None
+            or self.dock_zones.windows is not self.hit_test.regions()
+        ):
+            self.dock_zones = self.build_dock_zones()
+
+        zone = self.dock_zones.find(x, y)
+        if zone is None:
+            return
+
+        kind, target, dock_pos, hint = zone
+        if zone is NEW_WINDOW:
+            # Shows where the window will open, so it follows the mouse
+            self.dock_hint.SetRect((x + 1, y + 1, 800, 600))
+        elif zone is not self.dock_zone:
+            self.dock_hint.SetRect(wx.Rect(*hint))
+
+        self.dock_zone = zone
+        self.dock_to = target
+        if dock_pos:
+            self.dock_pos = dock_pos
+        if kind == TAB_STRIP and isinstance(self.dock_from, Terminal):
+            target.GetParent().ActivateTabAtPoint(x, y)
+
+    def build_dock_zones(self):
+        return DockZones(
+            self.hit_test.regions(),
+            tabs_only=isinstance(self.dock_from, Container),
+            terminal_of=lambda header: header.GetParent(),
+        )
+
+    def build_hit_regions(self):
+        def screen_rect(window):
+            rect = window.GetScreenRect()
+            return (rect.x, rect.y, rect.x + rect.width, rect.y + rect.height)
+
+        windows = []
+        if self.find_dialog_shown():
+            windows.append((screen_rect(self.find_dialog), self.find_dialog, []))
+
+        # The foreground window is the topmost one of ours if they overlap
+        foreground = self.desktop.foreground_window()
+        for hwnd, window in sorted(
+            self.hwnd_to_terminal_window.items(), key=lambda item: item[0] != foreground
+        ):
+            if not window.IsShown() or window.IsIconized():
+                continue
+
+            regions = []
+            if window.maximized_terminal:
+                terminals = [window.maximized_terminal]
+            else:
+                tab_ctrl = window.tabs.GetActiveTabCtrl()
+                regions.append((screen_rect(tab_ctrl), TAB_STRIP, tab_ctrl))
+                terminals = self.build_terminal_list(window.tabs.GetCurrentPage())
+
+            for terminal in terminals:
+                regions.append((screen_rect(terminal.text), HEADER, terminal.text))
+                regions.append((screen_rect(terminal), TERMINAL, terminal))
+
+            windows.append((screen_rect(window), window, regions))
+
+        return windows
+
     def unfocus_terminal(self, terminal):
         if terminal:
-            terminal.text.enabled = False
-            terminal.text.Refresh()
+            terminal.text.SetEnabled(False)
 
+    @tracer.traced("focus_terminal")
     def focus_terminal(self, terminal, set_focus=True, verify_foreground_window=None):
         if terminal != self.last_active_terminal:
             self.unfocus_terminal(self.last_active_terminal)
             self.last_active_terminal = terminal
 
         if not self.dock_from:
-            terminal.text.enabled = True
-            terminal.text.Refresh()
+            terminal.text.SetEnabled(True)
 
         if not terminal.GetParentWindow().maximized_terminal:
             terminal.GetParentTab().active_terminal = terminal
 
+        self.search_index.touch(terminal)
+
         if set_focus:
             wx.CallAfter(self.set_focus, terminal, verify_foreground_window)
 
-        self.update_title(terminal.terminal_hwnd)
+        self.update_title(terminal)
 
     def set_focus(self, terminal, verify_foreground_window=None):
         if (
             verify_foreground_window
-            and win32gui.GetForegroundWindow() != verify_foreground_window
+            and self.desktop.foreground_window() != verify_foreground_window
         ):
             return
 
-        win32gui.SetFocus(terminal.terminal_hwnd)
+        if terminal.terminal_hwnd:
+            self.desktop.set_focus(terminal.terminal_hwnd)
+        else:
+            # Keep the keys away from the previous terminal until it's up
+            terminal.SetFocus()
 
     def unmaximize_terminal(self, window):
-        if (
+        if not (
             window.maximized_terminal
             and window.maximized_terminal_original_parent
             and window.maximized_container
         ):
+            return
+
+        with self.transactions.transaction("unmaximize"):
             window.maximized_terminal.text.maximized = False
             window.maximized_terminal.text.Refresh()
             window.tabs.Reparent(window)
@@ -716,201 +1312,416 @@ class SvanTerm(wx.App):
             window.maximized_container = None
             window.maximized_terminal = None
             window.maximized_terminal_original_parent = None
+            self.hit_test.invalidate()
+
+    def freeze_windows(self):
+        windows = [window.payload for window in self.layout.windows]
+        for window in windows:
+            window.Freeze()
+        return windows
+
+    def thaw_windows(self, windows):
+        for window in windows:
+            # Unless closed in the meantime
+            if window:
+                window.Thaw()
+
+    def toggle_tracing(self):
+        if not tracer.enabled:
+            tracer.enable()
+            return
+
+        tracer.disable()
+        path = os.path.join(
+            tempfile.gettempdir(), time.strftime("svanterm-trace-%Y%m%d-%H%M%S")
+        )
+        tracer.dump(path + ".json")
+        summary = "%s\n\nheader cache: %s\nresizes: %s\nlive objects: %s" % (
+            tracer.format_summary(),
+            " ".join(
+                "%s=%.6g" % item for item in self.header_cache.stats.summary().items()
+            ),
+            " ".join(
+                "%s=%.6g" % item
+                for item in self.resize_scheduler.stats.summary().items()
+            ),
+            " ".join("%s=%d" % item for item in sorted(self.registry.counts().items())),
+        )
+        summary += "\nfocus guard: %s" % " ".join(
+            "%s=%d" % item for item in self.focus_guard.stats.summary().items()
+        )
+        summary += "\nnew windows: %s" % " ".join(
+            "%s=%.6g" % item for item in self.standby_windows.stats.summary().items()
+        )
+        summary += "\n\nlayout operations:"
+        for name, stats in sorted(self.transactions.summary().items()):
+            summary += "\n%s: %s" % (
+                name,
+                " ".join("%s=%.6g" % item for item in stats.items()),
+            )
+        if DEBUG_LEAKS:
+            summary += "\n\n" + self.registry.format_leaks()
+        with open(path + ".txt", "w") as summary_file:
+            summary_file.write(summary)
+
+        wx.CallAfter(
+            wx.MessageBox,
+            "Trace written to %s.json\n\n%s" % (path, summary),
+            PROGRAM_TITLE,
+        )
 
-    def process_hotkey(self, keycode, window, ctrl, shift, alt):
+    def set_tab_dormant(self, tab, dormant):
+        if tab.dormant == dormant:
+            return
+
+        tab.dormant = dormant
+        self.panes.set_dormant(tab.node, dormant)
+
+    def forget_terminal(self, terminal):
+        # Drop what still refers to a destroyed terminal
+        if self.last_active_terminal is terminal:
+            self.last_active_terminal = None
+        if self.clicked_terminal is terminal:
+            self.clicked_terminal = None
+        if terminal is self.dock_from or terminal is self.dock_to:
+            self.dock_from = None
+            self.dock_to = None
+            self.dock_zones = None
+            self.dock_zone = None
+            wx.CallAfter(self.dock_hint.Hide)
+
+    def find_dialog_shown(self):
+        return self.find_dialog is not None and self.find_dialog.IsShown()
+
+    def report_startup(self):
+        report = startup_profile.format_report()
+        path = os.path.join(
+            tempfile.gettempdir(), time.strftime("svanterm-startup-%Y%m%d-%H%M%S.txt")
+        )
+        with open(path, "w") as report_file:
+            report_file.write(report + "\n")
+        # No console when started with pythonw or as the windowed binary
+        if sys.stdout:
+            print(report)
+
+    def write_leak_report(self):
+        path = os.path.join(
+            tempfile.gettempdir(), time.strftime("svanterm-leaks-%Y%m%d-%H%M%S.txt")
+        )
+        with open(path, "w") as report_file:
+            report_file.write(
+                "%s\n\n%s\n"
+                % (
+                    "\n".join(
+                        "%s: %r" % item
+                        for item in sorted(self.registry.summary().items())
+                    ),
+                    self.registry.format_leaks(),
+                )
+            )
+
+    def hotkey_actions(self):
+        return set(name[7:] for name in dir(self) if name.startswith("hotkey_"))
+
+    def run_action(self, action, window):
         active_terminal = window.tabs.GetCurrentPage().active_terminal
+        return getattr(self, "hotkey_" + action)(window, active_terminal) is not False
+
+    def hotkey_toggle_tracing(self, window, active_terminal):
+        self.toggle_tracing()
+
+    def hotkey_new_tab(self, window, active_terminal):
+        self.new_tab(window)
+
+    @layout_operation("new_tab")
+    def new_tab(self, window, terminal_hwnd=None, name="", focus=True):
+        self.unmaximize_terminal(window)
+        new_tab = Container(window.tabs, window.tabs.GetClientSize())
+        new_terminal = Terminal(new_tab, terminal_hwnd, new_tab)
+        new_tab.active_terminal = new_terminal
+        window.tabs.AddTab(new_tab, name or new_terminal.title.ljust(8, " ")[:20])
+        if name:
+            new_tab.custom_name = name
+            self.search_index.rename_tab(new_tab.node, name)
+        if focus:
+            self.focus_terminal(new_terminal)
+        return new_terminal
 
-        if ctrl and shift and keycode == ord("T"):
-            self.unmaximize_terminal(window)
-            new_tab = Container(window.tabs, window.tabs.GetClientSize())
-            new_terminal = Terminal(new_tab)
-            window.tabs.AddTab(new_tab, new_terminal.title.ljust(8, " ")[:20])
+    def hotkey_split_vertical(self, window, active_terminal):
+        self.split_terminal(window, active_terminal, wx.SPLIT_VERTICAL)
+
+    def hotkey_split_horizontal(self, window, active_terminal):
+        self.split_terminal(window, active_terminal, wx.SPLIT_HORIZONTAL)
+
+    @layout_operation("split")
+    def split_terminal(
+        self,
+        window,
+        active_terminal,
+        split_mode,
+        terminal_hwnd=None,
+        ratio=None,
+        focus=True,
+    ):
+        self.unmaximize_terminal(window)
+        new_splitter = Splitter(active_terminal.GetParent())
+
+        if split_mode == wx.SPLIT_HORIZONTAL:
+            new_splitter.SplitHorizontally(new_splitter.panel1, new_splitter.panel2)
+        else:
+            new_splitter.SplitVertically(new_splitter.panel1, new_splitter.panel2)
+
+        new_terminal = Terminal(
+            new_splitter.panel2, terminal_hwnd, active_terminal.GetParentTab()
+        )
+        new_splitter.node = self.layout.split(
+            active_terminal.node,
+            new_terminal.node,
+            new_splitter.GetSplitMode(),
+            payload=new_splitter,
+        )
+        self.search_index.update(new_terminal, tab=new_splitter.node.tab())
+        if focus:
             self.focus_terminal(new_terminal)
+        new_splitter.Show()
+        active_terminal.Reparent(new_splitter.panel1)
+        new_splitter.panel1.OnSize()
+        if ratio is not None:
+            new_splitter.SetRatio(ratio)
+        return new_terminal
 
-            # https://docs.microsoft.com/en-us/windows/win32/inputdev/virtual-key-codes
-        elif alt and shift and (keycode == 0xBB or keycode == 0xBD):
-            self.unmaximize_terminal(window)
-            new_splitter = Splitter(active_terminal.GetParent())
+    def hotkey_close_terminal(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        active_terminal.Destroy()
+
+    def hotkey_sash_left(self, window, active_terminal):
+        self.move_sash(window, active_terminal, LEFT)
 
-            if keycode == 0xBD:
-                new_splitter.SplitHorizontally(new_splitter.panel1, new_splitter.panel2)
+    def hotkey_sash_down(self, window, active_terminal):
+        self.move_sash(window, active_terminal, DOWN)
+
+    def hotkey_sash_up(self, window, active_terminal):
+        self.move_sash(window, active_terminal, UP)
+
+    def hotkey_sash_right(self, window, active_terminal):
+        self.move_sash(window, active_terminal, RIGHT)
+
+    def move_sash(self, window, active_terminal, direction):
+        self.unmaximize_terminal(window)
+        node = active_terminal.node
+        while isinstance(node.parent, Split):
+            splitter = node.parent.payload
+
+            if (
+                splitter.GetSplitMode() == wx.SPLIT_HORIZONTAL
+                and direction in (LEFT, RIGHT)
+                or splitter.GetSplitMode() == wx.SPLIT_VERTICAL
+                and direction in (DOWN, UP)
+            ):
+                node = node.parent
+                continue
+
+            if direction in (LEFT, UP):
+                splitter.SetSashPosition(splitter.GetSashPosition() - 50)
             else:
-                new_splitter.SplitVertically(new_splitter.panel1, new_splitter.panel2)
+                splitter.SetSashPosition(splitter.GetSashPosition() + 50)
 
-            self.focus_terminal(Terminal(new_splitter.panel2))
-            new_splitter.Show()
-            active_terminal.Reparent(new_splitter.panel1)
-            new_splitter.panel1.OnSize()
+            splitter.UpdateRatio()
 
-        elif ctrl and shift and keycode == ord("D"):
-            self.unmaximize_terminal(window)
-            active_terminal.Destroy()
+            break
 
-        elif alt and shift and keycode in (ord("H"), ord("J"), ord("K"), ord("L")):
-            self.unmaximize_terminal(window)
-            child = active_terminal
-            while isinstance(child.GetGrandParent(), Splitter):
-                splitter = child.GetGrandParent()
+    def hotkey_focus_left(self, window, active_terminal):
+        self.focus_direction(window, active_terminal, LEFT)
 
-                if (
-                    splitter.GetSplitMode() == wx.SPLIT_HORIZONTAL
-                    and keycode in [ord("H"), ord("L")]
-                    or splitter.GetSplitMode() == wx.SPLIT_VERTICAL
-                    and keycode in [ord("J"), ord("K")]
-                ):
-                    child = splitter
-                    continue
+    def hotkey_focus_down(self, window, active_terminal):
+        self.focus_direction(window, active_terminal, DOWN)
 
-                if keycode in [ord("H"), ord("K")]:
-                    splitter.SetSashPosition(splitter.GetSashPosition() - 50)
-                else:
-                    splitter.SetSashPosition(splitter.GetSashPosition() + 50)
+    def hotkey_focus_up(self, window, active_terminal):
+        self.focus_direction(window, active_terminal, UP)
 
-                break
+    def hotkey_focus_right(self, window, active_terminal):
+        self.focus_direction(window, active_terminal, RIGHT)
 
-        elif alt and keycode in (ord("H"), ord("J"), ord("K"), ord("L")):
-            self.unmaximize_terminal(window)
-            current_pos = active_terminal.GetScreenPosition()
-            terminals = self.build_terminal_list(window.tabs.GetCurrentPage())
-            nearest_distance = None
-            nearest_terminal = None
-            for terminal in terminals:
-                if terminal == active_terminal:
-                    continue
-
-                pos = terminal.GetScreenPosition()
-                if keycode == ord("H") and pos.x - current_pos.x >= 0:
-                    continue
-                elif keycode == ord("J") and pos.y - current_pos.y <= 0:
-                    continue
-                elif keycode == ord("K") and pos.y - current_pos.y >= 0:
-                    continue
-                elif keycode == ord("L") and pos.x - current_pos.x <= 0:
-                    continue
-
-                distance = abs(pos.x - current_pos.x) + abs(pos.y - current_pos.y)
-                if nearest_distance is None or distance < nearest_distance:
-                    nearest_distance = distance
-                    nearest_terminal = terminal
-
-            if nearest_terminal:
-                self.focus_terminal(nearest_terminal)
-
-        elif ctrl and shift and keycode in (ord("K"), ord("J")):
-            hwnd_list = list(self.hwnd_to_terminal_window.keys())
-            if len(hwnd_list) == 1:
-                return
-            window_index = hwnd_list.index(window.GetHandle())
+    def focus_direction(self, window, active_terminal, direction):
+        self.unmaximize_terminal(window)
+        nearest = self.navigator.neighbour(
+            active_terminal.node,
+            direction,
+            tuple(window.tabs.GetCurrentPage().GetClientSize()),
+        )
 
-            if keycode == ord("K"):
-                win32gui.SetFocus(hwnd_list[(window_index - 1) % len(hwnd_list)])
-            else:
-                win32gui.SetFocus(hwnd_list[(window_index + 1) % len(hwnd_list)])
+        if nearest:
+            self.focus_terminal(nearest.payload)
 
-        elif ctrl and shift and keycode == ord("W"):
-            self.unmaximize_terminal(window)
-            window.tabs.GetCurrentPage().Hide()
-            window.tabs.GetCurrentPage().Destroy()
+    def hotkey_previous_window(self, window, active_terminal):
+        return self.cycle_window(window, -1)
 
-        elif ctrl and shift and keycode == ord("H"):
-            self.unmaximize_terminal(window)
-            window.tabs.AdvanceSelection(False)
+    def hotkey_next_window(self, window, active_terminal):
+        return self.cycle_window(window, 1)
 
-        elif ctrl and shift and keycode == ord("L"):
-            self.unmaximize_terminal(window)
-            window.tabs.AdvanceSelection(True)
+    def cycle_window(self, window, step):
+        hwnd_list = list(self.hwnd_to_terminal_window.keys())
+        if len(hwnd_list) == 1:
+            return False
+        window_index = hwnd_list.index(window.GetHandle())
+
+        self.desktop.set_focus(hwnd_list[(window_index + step) % len(hwnd_list)])
+
+    @layout_operation("close_tab")
+    def hotkey_close_tab(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        window.tabs.GetCurrentPage().Hide()
+        window.tabs.GetCurrentPage().Destroy()
 
-        elif ctrl and shift and keycode == ord("R"):
+    def hotkey_previous_tab(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        window.tabs.AdvanceSelection(False)
+
+    def hotkey_next_tab(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        window.tabs.AdvanceSelection(True)
+
+    def hotkey_rename_tab(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        window.tabs.EditTab(window.tabs.GetSelection())
+        window.tabs.FindFocus().SelectAll()
+
+    def hotkey_new_window(self, window, active_terminal):
+        self.spawn_window()
+
+    def hotkey_find(self, window, active_terminal):
+        self.unmaximize_terminal(window)
+        if not self.find_dialog:
+            self.find_dialog = FindDialog()
+        self.find_dialog.text.SetValue("")
+        self.find_dialog.Filter()
+        pos = window.GetPosition()
+        win_size = window.GetSize()
+        find_size = self.find_dialog.GetSize()
+
+        self.find_dialog.SetPosition(
+            (
+                pos[0] + ((win_size[0] - find_size[0]) / 2),
+                pos[1] + ((win_size[1] - find_size[1]) / 2),
+            )
+        )
+        self.find_dialog.Show()
+
+    @layout_operation("maximize")
+    def hotkey_maximize_terminal(self, window, active_terminal):
+        if window.maximized_terminal:
             self.unmaximize_terminal(window)
-            window.tabs.EditTab(window.tabs.GetSelection())
-            window.tabs.FindFocus().SelectAll()
+        else:
+            window.maximized_terminal = active_terminal
+            window.maximized_terminal.text.maximized = True
+            window.maximized_terminal.text.Refresh()
+            window.maximized_terminal_original_parent = active_terminal.GetParent()
+            window.maximized_container = Container(window)
+            window.tabs.Hide()
+            window.tabs.Reparent(None)
+            active_terminal.Reparent(window.maximized_container)
+            window.Layout()
+            window.maximized_container.OnSize()
+            self.hit_test.invalidate()
+
+    @layout_operation("new_window")
+    def spawn_window(self, name=""):
+        return self.new_tab(self.standby_windows.take(), name=name, focus=False)
+
+    def restore_session(self):
+        try:
+            steps = session_steps(load_session(SESSION_PATH))
+        except (OSError, SessionError):
+            steps = []
 
-        elif ctrl and shift and keycode == ord("N"):
+        if not steps:
             self.spawn_window()
+            return
 
-        elif alt and keycode == ord("F"):
-            self.unmaximize_terminal(window)
-            self.find_dialog.text.SetValue("")
-            self.find_dialog.Filter()
-            pos = window.GetPosition()
-            win_size = window.GetSize()
-            find_size = self.find_dialog.GetSize()
-
-            self.find_dialog.SetPosition(
-                (
-                    pos[0] + ((win_size[0] - find_size[0]) / 2),
-                    pos[1] + ((win_size[1] - find_size[1]) / 2),
+        windows = []
+        panes = []
+
+        def build(step, terminal_hwnd):
+            if step[0] == "window":
+                windows.append(TerminalWindow())
+            elif step[0] == "tab":
+                panes.append(
+                    self.new_tab(windows[-1], terminal_hwnd, step[1], focus=False)
+                )
+            else:
+                _, pane, orientation, ratio = step
+                terminal = panes[pane]
+                panes.append(
+                    self.split_terminal(
+                        terminal.GetParentWindow(),
+                        terminal,
+                        orientation,
+                        terminal_hwnd,
+                        ratio,
+                        focus=False,
+                    )
                 )
-            )
-            self.find_dialog.Show()
 
-        elif alt and keycode == ord("M"):
-            if window.maximized_terminal:
-                self.unmaximize_terminal(window)
+        def done(completed):
+            if not panes:
+                self.spawn_window()
             else:
-                window.maximized_terminal = active_terminal
-                window.maximized_terminal.text.maximized = True
-                window.maximized_terminal.text.Refresh()
-                window.maximized_terminal_original_parent = active_terminal.GetParent()
-                window.maximized_container = Container(window)
-                window.tabs.Hide()
-                window.tabs.Reparent(None)
-                active_terminal.Reparent(window.maximized_container)
-                window.Layout()
-                window.maximized_container.OnSize()
-        else:
-            return False
+                self.focus_terminal(panes[-1].GetParentTab().active_terminal)
+
+            # Windows left without tabs when launching terminals failed
+            for window in windows:
+                if window.tabs.GetPageCount() == 0:
+                    window.Close()
+
+            # Saving what was restored would lose the panes that failed
+            if not completed:
+                self.session_writer.keep(self.layout)
+
+        # The terminal prefetched at startup goes to the first pane
+        self.session_restore = SessionRestore(
+            steps,
+            build,
+            self.spawner.claim,
+            wx.CallAfter,
+            self.terminal_pool.launcher.dispose,
+            done,
+        )
+        self.session_restore.start()
 
-        return True
+    def save_session(self):
+        # Saving a half restored session would lose the rest of it
+        if self.session_restore and not self.session_restore.finished:
+            return
 
-    def spawn_window(self):
-        new_window = TerminalWindow()
-        new_tab = Container(new_window.tabs)
-        new_tab.active_terminal = Terminal(new_tab)
-        new_window.tabs.AddTab(
-            new_tab, new_tab.active_terminal.title.ljust(8, " ")[:20]
-        )
+        try:
+            self.session_writer.save(self.layout)
+        except OSError:
+            pass
 
     def build_terminal_list(self, root):
-        terminal_list = []
-        if not len(root.GetChildren()):
-            return terminal_list
+        return [leaf.payload for leaf in self.layout.leaves(root.node)]
 
-        child = root.GetChildren()[0]
+    def OnTerminalDestroyed(self, hwnd):
+        terminal = self.hwnd_to_terminal[hwnd]
+        if not self.layout.contains(terminal.node):
+            # The tab or window of the terminal is already closed
+            return
 
-        if isinstance(child, Terminal):
-            return [child]
-        elif isinstance(child, Splitter):
-            terminal_list = self.build_terminal_list(child.panel1)
-            terminal_list.extend(self.build_terminal_list(child.panel2))
+        window = terminal.GetParentWindow()
+        if window.maximized_terminal == terminal:
+            self.unmaximize_terminal(window)
 
-        return terminal_list
+        terminal.Destroy()
 
-    def OnTerminalEvent(
-        self,
-        hWinEventHook,
-        eventType,
-        hwnd,
-        idObject,
-        idChild,
-        dwEventThread,
-        dwmsEventTime,
-    ):
-        if hwnd in self.hwnd_to_terminal:
-            if eventType == win32con.EVENT_OBJECT_DESTROY and idObject == 0:
-                terminal = self.hwnd_to_terminal[hwnd]
-                window = terminal.GetParentWindow()
-                if window.maximized_terminal == terminal:
-                    self.unmaximize_terminal(window)
+    def OnTerminalNameChanged(self, hwnd):
+        self.title_pipeline.title_changed(hwnd, self.desktop.window_text(hwnd))
 
-                self.hwnd_to_terminal[hwnd].Destroy()
-            if eventType == win32con.EVENT_OBJECT_NAMECHANGE:
-                self.update_title(hwnd)
+    def OnForegroundEvent(self, hwnd):
+        if self.focus_guard.on_foreground(hwnd):
+            # Taken by a terminal being spawned, given back already
+            return
 
-        if (
-            eventType == win32con.EVENT_SYSTEM_FOREGROUND
-            and not self.find_dialog.IsShown()
-        ):
+        if not self.find_dialog_shown():
             if (
                 not hwnd in self.hwnd_to_terminal
                 and not hwnd in self.hwnd_to_terminal_window
@@ -919,6 +1730,8 @@ class SvanTerm(wx.App):
                 self.unfocus_terminal(self.last_active_terminal)
 
             if hwnd in self.hwnd_to_terminal_window:
+                # Another of our windows may be on top now
+                self.hit_test.invalidate()
                 terminal = (
                     self.hwnd_to_terminal_window[hwnd]
                     .tabs.GetCurrentPage()
@@ -930,27 +1743,44 @@ class SvanTerm(wx.App):
                 if terminal and not self.clicked_terminal:
                     self.focus_terminal(terminal, verify_foreground_window=hwnd)
 
-    def update_title(self, hwnd):
-        title = win32gui.GetWindowText(hwnd)
-        terminal = self.hwnd_to_terminal[hwnd]
-        terminal.text.SetLabel(title)
-        terminal.title = title
+    @tracer.traced("apply_titles")
+    def apply_titles(self, changes):
+        for hwnd, title in changes.items():
+            if hwnd in self.hwnd_to_terminal:
+                self.update_title(self.hwnd_to_terminal[hwnd], title)
+
+    @tracer.traced("update_title")
+    def update_title(self, terminal, title=None):
+        # Without a title the known title of the terminal is shown again
+        # in the tab and frame, e.g. after the focus changed
+        if title is None:
+            title = terminal.title
+        else:
+            terminal.text.SetLabel(title)
+            terminal.title = title
+            self.search_index.update(terminal, title=title)
+
+        if not self.layout.contains(terminal.node):
+            # Not placed in a tab yet
+            return
 
         if not terminal.GetParentWindow().maximized_terminal:
             tab = terminal.GetParentTab()
             if tab.active_terminal == terminal:
-                if tab.custom_name == "":
-                    tab.GetParent().SetPageText(
-                        tab.GetParent().GetPageIndex(tab),
-                        win32gui.GetWindowText(hwnd).ljust(8, " ")[:20],
-                    )
-                else:
-                    tab.GetParent().SetPageText(
-                        tab.GetParent().GetPageIndex(tab), tab.custom_name
-                    )
+                tabs = tab.GetParent()
+                page_index = tabs.GetPageIndex(tab)
+                page_text = tab.custom_name or title.ljust(8, " ")[:20]
 
-                if tab.GetParent().GetCurrentPage() == tab:
-                    tab.GetGrandParent().SetTitle(title + " - " + PROGRAM_TITLE)
+                # Setting the same text still relayouts the whole tab strip
+                if tabs.GetPageText(page_index) != page_text:
+                    tabs.SetPageText(page_index, page_text)
+
+                frame_title = title + " - " + PROGRAM_TITLE
+                if (
+                    tabs.GetCurrentPage() == tab
+                    and tab.GetGrandParent().GetTitle() != frame_title
+                ):
+                    tab.GetGrandParent().SetTitle(frame_title)
 
     def InitiateDragDrop(self, dock_from):
         if self.dock_from:
@@ -962,12 +1792,22 @@ class SvanTerm(wx.App):
 
         self.dock_from = dock_from
         self.dock_to = dock_from
+        self.dock_pos = None
+        self.dock_zone = None
+        self.dock_zones = self.build_dock_zones()
+        if not self.dock_hint:
+            self.dock_hint = wx.Frame(None, style=wx.STAY_ON_TOP)
+            self.dock_hint.SetTransparent(127)
         self.dock_hint.SetRect((0, 0, 0, 0))
         self.dock_hint.Show()
 
+    @tracer.traced("FinishDragDrop")
+    @layout_operation("drag_drop")
     def FinishDragDrop(self):
         wx.CallAfter(self.dock_hint.Hide)
 
+        self.dock_zones = None
+        self.dock_zone = None
         if self.dock_from == self.dock_to or not self.dock_from:
             self.dock_from = None
             return
@@ -980,7 +1820,7 @@ class SvanTerm(wx.App):
                 tabs = self.dock_from.GetParent()
                 tabs.RemoveTab(self.dock_from)
                 if self.dock_to == DOCK_NEW_WINDOW:
-                    window = TerminalWindow()
+                    window = self.standby_windows.take()
                     window.SetPosition(wx.GetMousePosition())
                     window.tabs.AddTab(
                         self.dock_from, self.dock_from.active_terminal.title
@@ -992,26 +1832,18 @@ class SvanTerm(wx.App):
 
                 wx.CallAfter(self.focus_terminal, self.dock_from.active_terminal)
         else:
-            terminal_list = self.build_terminal_list(self.dock_from_tab)
-
-            if len(terminal_list) > 1:
-                if self.dock_from.GetGrandParent().panel1 == self.dock_from.GetParent():
-                    self.dock_from_tab.active_terminal = terminal_list[
-                        terminal_list.index(self.dock_from) + 1
-                    ]
-                else:
-                    self.dock_from_tab.active_terminal = terminal_list[
-                        terminal_list.index(self.dock_from) - 1
-                    ]
+            neighbour = self.layout.neighbour(self.dock_from.node)
+            if neighbour:
+                self.dock_from_tab.active_terminal = neighbour.payload
 
-            self.dock_from.GetParent().Hide()
-            wx.CallAfter(self.dock_from.GetParent().Destroy)
+            self.layout.remove(self.dock_from.node)
+            self.dock_from.RemovePanel()
 
             if self.dock_to == DOCK_NEW_WINDOW or isinstance(
                 self.dock_to, aui.auibook.AuiTabCtrl
             ):
                 if self.dock_to == DOCK_NEW_WINDOW:
-                    window = TerminalWindow()
+                    window = self.standby_windows.take()
                     window.SetPosition(wx.GetMousePosition())
                 else:
                     window = self.dock_to.GetGrandParent()
@@ -1039,15 +1871,28 @@ class SvanTerm(wx.App):
                     self.dock_to.Reparent(new_splitter.panel1)
                     self.dock_from.Reparent(new_splitter.panel2)
 
+                new_splitter.node = self.layout.split(
+                    self.dock_to.node,
+                    self.dock_from.node,
+                    new_splitter.GetSplitMode(),
+                    before=self.dock_pos in (DOCK_TOP, DOCK_LEFT),
+                    payload=new_splitter,
+                )
+                self.search_index.update(self.dock_from, tab=new_splitter.node.tab())
+
                 new_splitter.panel1.OnSize()
                 new_splitter.panel2.OnSize()
                 new_splitter.Show()
 
+            self.panes.dock(self.dock_from.node, self.dock_from.GetParentTab().dormant)
             wx.CallAfter(self.focus_terminal, self.dock_from)
 
         self.dock_from = None
+        self.dock_to = None
+        self.dock_from_tab = None
 
 
 app = SvanTerm(0)
+startup_profile.mark("imports and wx")
 app.Init()
 app.MainLoop()
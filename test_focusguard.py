@@ -0,0 +1,64 @@
+import unittest
+
+from desktop import FakeDesktop
+from focusguard import FocusGuard
+from testhelpers import FakeClock
+
+
+class FocusGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.desktop = FakeDesktop()
+        self.guard = FocusGuard(self.desktop, timeout=1.0, clock=self.clock)
+        self.desktop.on_foreground = self.guard.on_foreground
+        self.editor = self.desktop.create_window(1)
+        self.browser = self.desktop.create_window(2)
+        self.terminal = self.desktop.create_window(3)
+        self.desktop.activate(self.editor)
+
+    def test_unguarded_change_is_left_alone(self):
+        self.desktop.activate(self.terminal)
+        self.assertEqual(self.desktop.foreground, self.terminal)
+        self.assertEqual(self.guard.stats.restored, 0)
+
+    def test_guarded_process_gives_foreground_back(self):
+        self.guard.guard(3)
+        self.desktop.activate(self.terminal)
+
+        self.assertEqual(self.desktop.foreground, self.editor)
+        self.assertEqual(self.guard.stats.restored, 1)
+
+    def test_other_window_becomes_the_one_to_restore(self):
+        self.guard.guard(3)
+        self.desktop.activate(self.browser)
+        self.desktop.activate(self.terminal)
+
+        self.assertEqual(self.desktop.foreground, self.browser)
+
+    def test_release(self):
+        self.guard.guard(3)
+        self.guard.release(3)
+        self.desktop.activate(self.terminal)
+
+        self.assertEqual(self.desktop.foreground, self.terminal)
+        self.assertFalse(self.guard.deadlines)
+
+    def test_expires(self):
+        self.guard.guard(3)
+        self.clock.now = 0.5
+        self.guard.guard(4, timeout=2.0)
+        self.clock.now = 1.5
+        self.desktop.activate(self.terminal)
+
+        self.assertEqual(self.desktop.foreground, self.terminal)
+        self.assertEqual(self.guard.stats.expired, 1)
+        self.assertEqual(list(self.guard.deadlines), [4])
+
+        self.clock.now = 3.0
+        self.desktop.activate(self.editor)
+        self.assertEqual(self.guard.stats.expired, 2)
+        self.assertFalse(self.guard.deadlines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from desktop import FakeDesktop
+from geometry import ResizeScheduler
+from testhelpers import wait_until
+
+
+class ResizeSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.desktop = FakeDesktop(windows=4)
+        self.hwnds = sorted(self.desktop.windows)
+        self.scheduler = ResizeScheduler(self.desktop)
+
+    def geometry(self, hwnd):
+        return self.desktop.windows[hwnd].geometry
+
+    def split(self, width):
+        # What a layout change asks for: every terminal gets a new size,
+        # some of them more than once on the way
+        for hwnd in self.hwnds:
+            self.scheduler.request(hwnd, (0, 20, width - 1, 600))
+        for hwnd in self.hwnds:
+            self.scheduler.request(hwnd, (0, 20, width, 600))
+
+    def test_layout_change_is_one_batch(self):
+        self.split(400)
+        self.scheduler.flush()
+
+        self.assertEqual(self.desktop.calls["move_windows"], 1)
+        for hwnd in self.hwnds:
+            self.assertEqual(self.geometry(hwnd), (0, 20, 400, 600))
+        self.assertEqual(self.scheduler.stats.coalesced, len(self.hwnds))
+
+    def test_transaction_is_one_batch(self):
+        self.scheduler.known.update(self.hwnds)
+        self.scheduler.start()
+        self.addCleanup(self.scheduler.stop)
+
+        self.scheduler.hold()
+        self.split(400)
+        time.sleep(self.scheduler.max_delay * 2)
+        self.assertEqual(self.desktop.calls["move_windows"], 0)
+
+        self.assertEqual(self.scheduler.release(), len(self.hwnds))
+        wait_until(lambda: self.desktop.calls["move_windows"])
+        time.sleep(self.scheduler.max_delay * 2)
+        self.assertEqual(self.desktop.calls["move_windows"], 1)
+        self.assertEqual(self.geometry(self.hwnds[0]), (0, 20, 400, 600))
+
+    def test_unchanged_geometry_is_not_moved(self):
+        self.split(400)
+        self.scheduler.flush()
+        self.split(400)
+        self.scheduler.request(self.hwnds[0], (0, 20, 500, 600))
+        self.scheduler.flush()
+
+        self.assertEqual(self.desktop.calls["move_windows"], 2)
+        self.assertEqual(self.scheduler.stats.applied, len(self.hwnds) + 1)
+
+    def test_dormant_windows_move_when_woken(self):
+        self.scheduler.set_dormant(self.hwnds[:2], True)
+        self.split(400)
+        self.scheduler.flush()
+        self.assertIsNone(self.geometry(self.hwnds[0]))
+        self.assertEqual(self.geometry(self.hwnds[2]), (0, 20, 400, 600))
+
+        self.scheduler.set_dormant(self.hwnds[:2], False)
+        self.scheduler.flush()
+        self.assertEqual(self.geometry(self.hwnds[0]), (0, 20, 400, 600))
+        self.assertEqual(self.desktop.calls["move_windows"], 2)
+        self.assertEqual(self.scheduler.stats.deferred, 4)
+        self.assertEqual(self.scheduler.stats.replayed, 2)
+
+    def test_pending_geometry_deferred_when_going_dormant(self):
+        self.split(400)
+        self.scheduler.set_dormant(self.hwnds[:1], True)
+        self.scheduler.flush()
+        self.assertIsNone(self.geometry(self.hwnds[0]))
+        self.assertEqual(self.scheduler.stats.deferred, 1)
+
+        self.scheduler.set_dormant(self.hwnds[:1], False)
+        self.scheduler.flush()
+        self.assertEqual(self.geometry(self.hwnds[0]), (0, 20, 400, 600))
+        self.assertEqual(self.scheduler.stats.replayed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
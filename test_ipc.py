@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+
+import ipc
+import layout
+
+
+class Target(ipc.CommandTarget):
+    # Fails to create the window named "broken"
+    def __init__(self):
+        self.layout = layout.Layout()
+
+    def new_window(self, name):
+        if name == "broken":
+            raise RuntimeError("no window")
+        leaf = layout.Leaf()
+        self.layout.add_tab(self.layout.add_window(), leaf, name=name)
+        return leaf
+
+    def split(self, leaf, orientation, ratio):
+        new_leaf = layout.Leaf()
+        self.layout.split(leaf, new_leaf, orientation).ratio = ratio
+        return new_leaf
+
+
+class CommandServerTest(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "channel.json")
+        self.target = Target()
+        self.errors = []
+        self.server = ipc.CommandServer(
+            lambda commands: ipc.run_batch(self.target, commands), self.deliver, path
+        )
+        self.addCleanup(self.server.close)
+
+    def deliver(self, callback):
+        # Like the UI thread, which reports what the callback raises
+        try:
+            callback()
+        except Exception as error:
+            self.errors.append(error)
+
+    def request(self, commands, token=None):
+        if token is None:
+            token = self.server.token
+        line = json.dumps({"token": token, "commands": commands}).encode("utf-8")
+        return self.server.handle(line)
+
+    def test_batch(self):
+        response = self.request([{"op": "window"}, {"op": "split"}])
+        self.assertEqual(response, {"ok": True, "results": [[0, 0, 0], [0, 0, 1]]})
+
+    def test_invalid_token(self):
+        for token in ("", "wrong", "é" * 32, 42):
+            response = self.request([{"op": "window"}], token)
+            self.assertEqual(response, {"ok": False, "error": "Invalid token"})
+        self.assertFalse(self.target.layout.windows)
+
+    def test_bad_command_applies_nothing(self):
+        response = self.request([{"op": "window"}, {"op": "split", "pane": [5]}])
+        self.assertFalse(response["ok"])
+        self.assertFalse(self.target.layout.windows)
+
+    def test_failing_command_keeps_earlier_ones(self):
+        response = self.request([{"op": "window"}, {"op": "window", "name": "broken"}])
+        self.assertEqual(response, {"ok": False, "error": "Failed: no window"})
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(len(self.target.layout.windows), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+import layout
+from hittest import HitTestCache
+
+
+class LayoutTest(unittest.TestCase):
+    def setUp(self):
+        self.model = layout.Layout()
+        self.window = self.model.add_window("window")
+        self.a = layout.Leaf("a")
+        self.tab = self.model.add_tab(self.window, self.a, "tab", "name")
+
+    def payloads(self, node=None):
+        return [leaf.payload for leaf in self.model.leaves(node)]
+
+    def test_split(self):
+        b, c = layout.Leaf("b"), layout.Leaf("c")
+        split = self.model.split(self.a, b, layout.VERTICAL, payload="splitter")
+        self.model.split(self.a, c, layout.HORIZONTAL, before=True)
+
+        self.assertIs(self.tab.child, split)
+        self.assertEqual(self.payloads(), ["c", "a", "b"])
+        self.assertIs(c.sibling(), self.a)
+        self.assertIs(b.tab(), self.tab)
+        self.assertIs(b.window(), self.window)
+        self.assertEqual(self.a.depth(), 4)
+        self.assertTrue(self.model.contains(c))
+
+    def test_remove(self):
+        b, c = layout.Leaf("b"), layout.Leaf("c")
+        self.model.split(self.a, b, layout.VERTICAL)
+        self.model.split(b, c, layout.HORIZONTAL)
+
+        self.assertIs(self.model.remove(b), c)
+        self.assertEqual(self.payloads(), ["a", "c"])
+        self.assertIs(c.parent, self.tab.child)
+        self.assertFalse(self.model.contains(b))
+
+        self.assertIs(self.model.remove(self.a), c)
+        self.assertIs(self.tab.child, c)
+        self.assertIs(c.parent, self.tab)
+        self.assertIsNone(self.model.remove(c))
+        self.assertIsNone(self.tab.child)
+        self.assertIsNone(self.model.remove(c))
+
+    def test_neighbour(self):
+        b, c = layout.Leaf("b"), layout.Leaf("c")
+        self.model.split(self.a, b, layout.VERTICAL)
+        self.model.split(b, c, layout.HORIZONTAL)
+
+        # The pane next to the closed one, nearest to it
+        self.assertIs(self.model.neighbour(self.a), b)
+        self.assertIs(self.model.neighbour(c), b)
+        self.assertIs(self.model.neighbour(b), c)
+        self.model.remove(b)
+        self.model.remove(c)
+        self.assertIsNone(self.model.neighbour(self.a))
+
+    def test_move(self):
+        b, c = layout.Leaf("b"), layout.Leaf("c")
+        self.model.split(self.a, b, layout.VERTICAL)
+        other = self.model.add_tab(self.window, c)
+
+        self.model.move(self.a, c, layout.HORIZONTAL, before=True)
+        self.assertIs(self.tab.child, b)
+        self.assertEqual(self.payloads(other), ["a", "c"])
+        self.assertIs(self.a.tab(), other)
+
+    def test_tabs(self):
+        window = self.model.add_window()
+        self.model.move_tab(self.tab, window)
+        self.assertEqual(self.window.tabs, [])
+        self.assertIs(self.a.window(), window)
+
+        self.model.remove_tab(self.tab)
+        self.assertIsNone(self.a.window())
+        self.assertFalse(self.model.contains(self.a))
+
+    def test_every_change_bumps_version(self):
+        b = layout.Leaf("b")
+        changes = [
+            lambda: self.model.split(self.a, b, layout.VERTICAL),
+            lambda: self.model.move(b, self.a, layout.HORIZONTAL),
+            lambda: self.model.remove(b),
+            lambda: self.model.move_tab(self.tab, self.model.add_window()),
+            lambda: self.model.remove_tab(self.tab),
+            lambda: self.model.remove_window(self.window),
+        ]
+        for change in changes:
+            version = self.model.version
+            change()
+            self.assertGreater(self.model.version, version)
+
+    def test_hit_test_cache_rebuilds_on_change(self):
+        builds = []
+
+        def build():
+            builds.append(None)
+            return [((0, 0, 100, 100), self.window, [])]
+
+        cache = HitTestCache(build, lambda: self.model.version)
+        cache.hit(10, 10)
+        cache.hit(20, 20)
+        self.assertEqual(len(builds), 1)
+
+        self.model.split(self.a, layout.Leaf("b"), layout.VERTICAL)
+        cache.hit(10, 10)
+        self.assertEqual(len(builds), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
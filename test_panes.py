@@ -0,0 +1,85 @@
+import unittest
+
+import layout
+from desktop import FakeDesktop
+from geometry import ResizeScheduler
+from panes import Panes, terminal_geometry
+from search import SearchIndex
+from titles import TitlePipeline
+
+
+class PanesTest(unittest.TestCase):
+    def setUp(self):
+        self.desktop = FakeDesktop(windows=3)
+        self.hwnds = sorted(self.desktop.windows)
+        self.scheduler = ResizeScheduler(self.desktop)
+        self.titles = TitlePipeline(lambda changes: None, lambda delay, callback: None)
+        self.search_index = SearchIndex()
+        self.panes = Panes(self.desktop, self.scheduler, self.titles, self.search_index)
+
+    def window(self, hwnd):
+        return self.desktop.windows[hwnd]
+
+    def test_terminal_geometry(self):
+        self.assertEqual(terminal_geometry(400, 300), (0, 20, 400, 280))
+        self.assertEqual(terminal_geometry(100, 100), (0, 20, 150, 150))
+
+    def test_attach(self):
+        self.panes.attach(self.hwnds[0], (400, 300), False)
+        self.panes.attach(self.hwnds[1], (400, 300), True)
+        self.scheduler.flush()
+
+        self.assertTrue(self.window(self.hwnds[0]).visible)
+        self.assertEqual(self.window(self.hwnds[0]).geometry, (0, 20, 400, 280))
+        self.assertFalse(self.window(self.hwnds[1]).visible)
+        self.assertIsNone(self.window(self.hwnds[1]).geometry)
+
+    def test_woken_tab_gets_deferred_geometry(self):
+        model = layout.Layout()
+        first, second = layout.Leaf(self.hwnds[0]), layout.Leaf(self.hwnds[1])
+        tab = model.add_tab(model.add_window(), first)
+        model.split(first, second, layout.VERTICAL)
+        self.panes.set_dormant(tab, True)
+        self.panes.resize(self.hwnds[0], 200, 300)
+        self.scheduler.flush()
+        self.assertFalse(self.window(self.hwnds[0]).visible)
+        self.assertIsNone(self.window(self.hwnds[0]).geometry)
+
+        self.panes.set_dormant(tab, False)
+        self.scheduler.flush()
+        self.assertTrue(self.window(self.hwnds[1]).visible)
+        self.assertEqual(self.window(self.hwnds[0]).geometry, (0, 20, 200, 280))
+
+    def test_docked_terminal_wakes(self):
+        # The terminal is dragged out of a tab that went dormant during the
+        # drag into a tab of its own
+        model = layout.Layout()
+        window = model.add_window()
+        first, second = layout.Leaf(self.hwnds[0]), layout.Leaf(self.hwnds[1])
+        tab = model.add_tab(window, first)
+        model.split(first, second, layout.VERTICAL)
+        self.panes.attach(self.hwnds[1], (200, 300), False)
+        self.scheduler.flush()
+        self.panes.set_dormant(tab, True)
+
+        model.remove(second)
+        model.add_tab(window, second)
+        self.panes.resize(self.hwnds[1], 400, 300)
+        self.panes.dock(second, False)
+        self.scheduler.flush()
+        self.assertTrue(self.window(self.hwnds[1]).visible)
+        self.assertEqual(self.window(self.hwnds[1]).geometry, (0, 20, 400, 280))
+        self.assertFalse(self.window(self.hwnds[0]).visible)
+
+    def test_close(self):
+        self.search_index.add("terminal", "bash")
+        self.panes.attach(self.hwnds[0], (400, 300), False)
+        self.panes.close("terminal", self.hwnds[0])
+
+        self.assertNotIn(self.hwnds[0], self.desktop.windows)
+        self.assertEqual(self.search_index.search("bash"), [])
+        self.panes.close("starting", None)
+
+
+if __name__ == "__main__":
+    unittest.main()
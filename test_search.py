@@ -0,0 +1,54 @@
+import unittest
+
+from search import SearchIndex
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.tab = object()
+        self.index.add(1, "user@db01: vim", self.tab)
+        self.index.add(2, "user@web01: bash", self.tab)
+        self.index.add(3, "user@db02: less")
+
+    def type(self, query):
+        for length in range(len(query) + 1):
+            results = self.index.search(query[:length])
+        return results
+
+    def test_substring_and_subsequence_matches(self):
+        self.assertEqual(self.type("db0"), [1, 3])
+        self.assertEqual(self.index.search("wbb"), [2])
+
+    def test_narrows_while_typing(self):
+        self.type("db01")
+        self.assertEqual(self.index.incremental_searches, 3)
+        self.assertEqual(self.index.full_searches, 2)
+
+    def test_title_changed_while_typing(self):
+        self.assertEqual(self.type("web"), [2])
+        self.index.update(3, "user@web02: top")
+        self.assertEqual(self.index.search("web0"), [2, 3])
+        self.index.update(2, "user@mail01: bash")
+        self.assertEqual(self.index.search("web02"), [3])
+
+    def test_removed_while_typing(self):
+        self.type("db")
+        self.index.remove(1)
+        self.assertEqual(self.index.search("db0"), [3])
+        self.assertEqual(self.index.search("d"), [3])
+
+    def test_tab_name(self):
+        self.index.rename_tab(self.tab, "prod")
+        self.assertEqual(self.index.search("prod"), [1, 2])
+        self.index.rename_tab(self.tab, "staging")
+        self.assertEqual(self.index.search("prod"), [])
+
+    def test_recently_used_first(self):
+        self.index.touch(3)
+        self.assertEqual(self.index.search("db"), [3, 1])
+        self.assertEqual(self.index.search("")[0], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
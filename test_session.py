@@ -0,0 +1,170 @@
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+import layout
+import session
+
+
+def build_model():
+    # Two windows, the first with a plain tab and a named tab split three ways
+    model = layout.Layout()
+    window = model.add_window()
+    model.add_tab(window, layout.Leaf())
+    first = layout.Leaf()
+    model.add_tab(window, first, name="logs")
+    second = layout.Leaf()
+    split = model.split(first, second, layout.VERTICAL)
+    split.ratio = 0.3
+    split = model.split(second, layout.Leaf(), layout.HORIZONTAL)
+    split.ratio = 0.75
+    model.add_tab(model.add_window(), layout.Leaf())
+    return model
+
+
+class SessionRestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.deliveries = queue.Queue()
+        self.restored = layout.Layout()
+        self.windows = []
+        self.panes = []
+        self.built = []
+        self.discarded = []
+        self.completed = []
+
+    def build(self, step, handle):
+        self.built.append((step[0], handle))
+        if step[0] == "window":
+            self.windows.append(self.restored.add_window())
+        elif step[0] == "tab":
+            leaf = layout.Leaf(handle)
+            self.restored.add_tab(self.windows[-1], leaf, name=step[1])
+            self.panes.append(leaf)
+        else:
+            _, pane, orientation, ratio = step
+            leaf = layout.Leaf(handle)
+            split = self.restored.split(self.panes[pane], leaf, orientation)
+            split.ratio = ratio
+            self.panes.append(leaf)
+
+    def deliver(self, callback, *args):
+        self.deliveries.put((callback, args))
+
+    def restore(self, steps, launch, deliver=None, **options):
+        restore = session.SessionRestore(
+            steps,
+            self.build,
+            launch,
+            deliver or self.deliver,
+            self.discarded.append,
+            self.completed.append,
+            **options
+        )
+        restore.start()
+        while not restore.finished:
+            callback, args = self.deliveries.get(timeout=5)
+            callback(*args)
+        return restore
+
+    def test_steps(self):
+        steps = session.session_steps(session.dump_session(build_model()))
+        self.assertEqual(
+            steps,
+            [
+                ("window",),
+                ("tab", ""),
+                ("tab", "logs"),
+                ("split", 1, layout.VERTICAL, 0.3),
+                ("split", 2, layout.HORIZONTAL, 0.75),
+                ("window",),
+                ("tab", ""),
+            ],
+        )
+
+    def test_roundtrip_with_terminals_coming_up_out_of_order(self):
+        model = build_model()
+        path = os.path.join(tempfile.mkdtemp(), "session.json")
+        session.save_session(model, path)
+        steps = session.session_steps(session.load_session(path))
+
+        # The terminals come up last launched first, each one is let go once
+        # the one launched after it was delivered
+        lock = threading.Lock()
+        launched = []
+        gates = [threading.Event() for _ in range(5)]
+        gates[-1].set()
+
+        def launch():
+            with lock:
+                index = len(launched)
+                launched.append(index)
+            gates[index].wait(5)
+            return index
+
+        def deliver(callback, *args):
+            self.deliver(callback, *args)
+            if args and args[0] > 0:
+                gates[args[0] - 1].set()
+
+        self.restore(steps, launch, deliver)
+
+        self.assertEqual(self.completed, [True])
+        self.assertEqual(
+            session.dump_session(self.restored), session.dump_session(model)
+        )
+        self.assertEqual([kind for kind, _ in self.built], [step[0] for step in steps])
+        handles = [handle for kind, handle in self.built if kind != "window"]
+        self.assertEqual(handles, [4, 3, 2, 1, 0])
+        self.assertFalse(self.discarded)
+
+    def test_gives_up_after_retries(self):
+        steps = [("window",), ("tab", ""), ("tab", "")]
+        calls = []
+
+        def launch():
+            calls.append(None)
+            if len(calls) > 1:
+                raise OSError("alacritty not found")
+            return "first"
+
+        self.restore(steps, launch, workers=1, retries=2)
+
+        self.assertEqual(self.completed, [False])
+        self.assertEqual(len(self.panes), 1)
+        self.assertFalse(self.discarded)
+
+    def test_partly_restored_session_is_kept(self):
+        path = os.path.join(tempfile.mkdtemp(), "session.json")
+        session.save_session(build_model(), path)
+        with open(path) as session_file:
+            saved = session_file.read()
+
+        partial = layout.Layout()
+        leaf = layout.Leaf()
+        partial.add_tab(partial.add_window(), leaf)
+        writer = session.SessionWriter(path)
+        writer.keep(partial)
+        self.assertFalse(writer.save(partial))
+        with open(path) as session_file:
+            self.assertEqual(session_file.read(), saved)
+
+        partial.split(leaf, layout.Leaf(), layout.VERTICAL)
+        self.assertTrue(writer.save(partial))
+        self.assertEqual(session.load_session(path), session.dump_session(partial))
+        with open(path + ".bak") as session_file:
+            self.assertEqual(session_file.read(), saved)
+
+    def test_invalid_session(self):
+        path = os.path.join(tempfile.mkdtemp(), "session.json")
+        with open(path, "w") as session_file:
+            session_file.write('{"version": 1, "windows": [{"tabs": [{"panes":')
+        with self.assertRaises(session.SessionError):
+            session.load_session(path)
+        with self.assertRaises(session.SessionError):
+            session.session_steps({"windows": [{"tabs": [{"panes": ["x", 1]}]}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
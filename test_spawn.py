@@ -0,0 +1,286 @@
+import threading
+import unittest
+
+from spawn import AsyncSpawner, Launcher, SpawnTimeout, TerminalPool, WindowDiscovery
+from testhelpers import FakeClock, wait_until
+
+
+class FakeLauncher(Launcher):
+    # Hands out 1, 2, 3... launches block while gate is cleared
+    def __init__(self):
+        self.launched = 0
+        self.dead = set()
+        self.disposed = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+
+    def launch(self):
+        self.gate.wait()
+        with self.lock:
+            self.launched += 1
+            return self.launched
+
+    def is_alive(self, handle):
+        return handle not in self.dead
+
+    def dispose(self, handle):
+        self.disposed.append(handle)
+
+
+class TerminalPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.launcher = FakeLauncher()
+        self.clock = FakeClock()
+
+    def pool(self, size=2, max_age=600):
+        pool = TerminalPool(self.launcher, size, max_age, self.clock)
+        self.addCleanup(pool.close)
+        return pool
+
+    def filled(self, pool):
+        wait_until(lambda: not pool.pending)
+        return pool
+
+    def test_miss_launches_and_refills(self):
+        pool = self.pool()
+        self.assertEqual(pool.acquire(), 1)
+        self.assertEqual((pool.stats.hits, pool.stats.misses), (0, 1))
+
+        self.filled(pool)
+        self.assertEqual(sorted(handle for handle, _ in pool.entries), [2, 3])
+
+    def test_hit_takes_oldest_and_refills(self):
+        pool = self.pool(size=1)
+        pool.refill()
+        self.filled(pool)
+
+        self.assertEqual(pool.acquire(), 1)
+        self.assertEqual((pool.stats.hits, pool.stats.misses), (1, 0))
+        self.filled(pool)
+        self.assertEqual([handle for handle, _ in pool.entries], [2])
+
+    def test_acquire_evicts_too_old(self):
+        pool = self.pool(size=1, max_age=10)
+        pool.refill()
+        self.filled(pool)
+
+        self.clock.now = 11
+        self.assertEqual(pool.acquire(), 2)
+        self.assertEqual(self.launcher.disposed, [1])
+        self.assertEqual(pool.stats.evictions, 1)
+
+    def test_acquire_evicts_dead(self):
+        pool = self.pool(size=1)
+        pool.refill()
+        self.filled(pool)
+
+        self.launcher.dead.add(1)
+        self.assertEqual(pool.acquire(), 2)
+        self.assertEqual(self.launcher.disposed, [1])
+
+    def test_evict_stale_replaces(self):
+        pool = self.pool(size=2, max_age=10)
+        pool.refill()
+        self.filled(pool)
+
+        self.launcher.dead.add(1)
+        pool.evict_stale()
+        self.filled(pool)
+        self.assertEqual(self.launcher.disposed, [1])
+        self.assertEqual(sorted(handle for handle, _ in pool.entries), [2, 3])
+
+    def test_resize_disposes_surplus(self):
+        pool = self.pool(size=3)
+        pool.refill()
+        self.filled(pool)
+
+        pool.resize(1)
+        self.assertEqual(len(pool.entries), 1)
+        self.assertEqual(len(self.launcher.disposed), 2)
+        self.assertEqual(self.launcher.launched, 3)
+
+    def test_close_disposes_entries(self):
+        pool = self.pool(size=2)
+        pool.refill()
+        self.filled(pool)
+
+        pool.close()
+        self.assertEqual(sorted(self.launcher.disposed), [1, 2])
+        self.assertFalse(pool.entries)
+
+    def test_stats_from_concurrent_acquires(self):
+        pool = self.pool(size=4)
+        pool.refill()
+        self.filled(pool)
+
+        threads = [
+            threading.Thread(target=lambda: [pool.acquire() for _ in range(50)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(pool.stats.hits + pool.stats.misses, 400)
+
+    def test_refill_finishing_after_close_is_disposed(self):
+        pool = self.pool(size=1)
+        self.launcher.gate.clear()
+        pool.refill()
+        pool.close()
+
+        self.launcher.gate.set()
+        wait_until(lambda: self.launcher.disposed)
+        self.assertEqual(self.launcher.disposed, [1])
+        self.assertFalse(pool.entries)
+
+
+class WindowDiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        # hwnd -> (pid, ready)
+        self.windows = {}
+        self.clock = FakeClock()
+        self.discovery = WindowDiscovery(
+            lambda hwnd: self.windows[hwnd][0],
+            lambda hwnd: self.windows[hwnd][1],
+            lambda pid: [
+                hwnd for hwnd, window in self.windows.items() if window[0] == pid
+            ],
+            self.clock,
+        )
+
+    def wait_in_thread(self, pid, timeout=5.0):
+        results = []
+
+        def wait():
+            try:
+                results.append(self.discovery.wait(pid, timeout))
+            except SpawnTimeout as error:
+                results.append(error)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        wait_until(lambda: pid in self.discovery.waiters)
+        return thread, results
+
+    def show(self, hwnd, pid, ready=True):
+        self.windows[hwnd] = (pid, ready)
+        self.discovery.on_window_event(hwnd)
+
+    def test_events_without_waiters_are_not_inspected(self):
+        self.show(1, 10)
+        self.assertEqual(self.discovery.stats.events, 1)
+        self.assertEqual(self.discovery.stats.inspected, 0)
+
+    def test_window_event_ends_wait(self):
+        thread, results = self.wait_in_thread(10)
+        self.show(1, 20)
+        self.show(2, 10, ready=False)
+        self.clock.now = 0.25
+        self.show(3, 10)
+        thread.join()
+
+        self.assertEqual(results, [3])
+        self.assertFalse(self.discovery.waiters)
+        stats = self.discovery.stats.summary()
+        self.assertEqual((stats["events"], stats["inspected"]), (3, 3))
+        self.assertEqual(stats["found"], 1)
+        self.assertAlmostEqual(stats["wait_avg_ms"], 250)
+
+    def test_window_shown_before_wait_is_found_by_scan(self):
+        self.windows[1] = (10, True)
+        self.assertEqual(self.discovery.wait(10, 0), 1)
+        self.assertEqual(self.discovery.stats.events, 0)
+
+    def test_timeout(self):
+        self.windows[1] = (10, False)
+        with self.assertRaises(SpawnTimeout):
+            self.discovery.wait(10, 0.01)
+        self.assertEqual(self.discovery.stats.timeouts, 1)
+        self.assertFalse(self.discovery.waiters)
+
+
+class AsyncSpawnerTest(unittest.TestCase):
+    def spawner(self, acquire):
+        results = []
+        spawner = AsyncSpawner(
+            acquire, lambda callback, *args: results.append((callback, args))
+        )
+        return spawner, results
+
+    def test_spawn_delivers_handle(self):
+        spawner, results = self.spawner(lambda: 7)
+        ready = []
+        spawner.spawn(ready.append, self.fail)
+        wait_until(lambda: results)
+
+        callback, args = results[0]
+        callback(*args)
+        self.assertEqual(ready, [7])
+        self.assertEqual(spawner.stats.succeeded, 1)
+
+    def test_spawn_delivers_error(self):
+        def acquire():
+            raise RuntimeError("no terminal")
+
+        spawner, results = self.spawner(acquire)
+        failed = []
+        spawner.spawn(self.fail, failed.append)
+        wait_until(lambda: results)
+
+        callback, args = results[0]
+        callback(*args)
+        self.assertEqual(str(failed[0]), "no terminal")
+        self.assertEqual(spawner.stats.failed, 1)
+
+    def test_next_spawn_takes_prefetch(self):
+        launcher = FakeLauncher()
+        launcher.gate.clear()
+        spawner, results = self.spawner(launcher.launch)
+        spawner.prefetch()
+        spawner.prefetch()
+        spawner.spawn(lambda handle: None, self.fail)
+        spawner.spawn(lambda handle: None, self.fail)
+
+        launcher.gate.set()
+        wait_until(lambda: len(results) == 2)
+        # One prefetch, the first spawn didn't launch one of its own
+        self.assertEqual(launcher.launched, 2)
+        self.assertEqual(sorted(args for _, args in results), [(1,), (2,)])
+        self.assertIsNone(spawner.prefetched)
+
+    def test_claim_takes_prefetch(self):
+        launcher = FakeLauncher()
+        spawner, _ = self.spawner(launcher.launch)
+        spawner.prefetch()
+        self.assertEqual(spawner.claim(), 1)
+        self.assertEqual(spawner.claim(), 2)
+        self.assertEqual(launcher.launched, 2)
+
+    def test_close_disposes_unclaimed_prefetch(self):
+        launcher = FakeLauncher()
+        spawner, _ = self.spawner(launcher.launch)
+        spawner.prefetch()
+        wait_until(lambda: spawner.prefetched.done.is_set())
+
+        spawner.close(launcher.dispose)
+        self.assertEqual(launcher.disposed, [1])
+        spawner.prefetch()
+        self.assertIsNone(spawner.prefetched)
+
+    def test_prefetch_finishing_after_close_is_disposed(self):
+        launcher = FakeLauncher()
+        launcher.gate.clear()
+        spawner, _ = self.spawner(launcher.launch)
+        spawner.prefetch()
+        spawner.close(launcher.dispose)
+        self.assertFalse(launcher.disposed)
+
+        launcher.gate.set()
+        wait_until(lambda: launcher.disposed)
+        self.assertEqual(launcher.disposed, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
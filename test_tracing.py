@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from tracing import NULL_SPAN, Tracer
+from testhelpers import FakeClock
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(10.0)
+        self.tracer = Tracer(clock=self.clock)
+
+    def test_disabled_span_is_shared_no_op(self):
+        self.assertIs(self.tracer.span("hotkey", detail="split"), NULL_SPAN)
+        with self.tracer.span("action"):
+            pass
+        self.assertFalse(self.tracer.spans)
+
+    def test_call(self):
+        calls = []
+        self.assertEqual(self.tracer.call("hotkey", calls.append, 1, detail="x"), None)
+        self.assertFalse(self.tracer.spans)
+
+        self.tracer.enable()
+        self.tracer.call("hotkey", calls.append, 2, category="key", detail="x")
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(
+            [span[:2] for span in self.tracer.spans], [("hotkey x", "key")]
+        )
+
+    def test_traced_method_is_plain_while_disabled(self):
+        tracer = self.tracer
+
+        class Actions(object):
+            def plain(self):
+                return 1
+
+            @tracer.traced("traced")
+            def traced(self):
+                """Docstring"""
+                return 2
+
+        plain = Actions.__dict__["traced"]
+        self.assertEqual(Actions.traced.__doc__, "Docstring")
+        self.assertEqual(Actions().traced(), 2)
+        self.assertFalse(tracer.spans)
+
+        tracer.enable()
+        self.assertIsNot(Actions.__dict__["traced"], plain)
+        self.assertEqual(Actions().traced(), 2)
+        self.assertEqual([span[0] for span in tracer.spans], ["traced"])
+
+        tracer.disable()
+        self.assertIs(Actions.__dict__["traced"], plain)
+
+    def test_chrome_trace(self):
+        self.tracer.enable()
+        self.clock.now = 10.5
+        with self.tracer.span("hotkey", detail="split"):
+            self.clock.now = 10.75
+            with self.tracer.span("attach", "spawn"):
+                self.clock.now = 10.875
+            self.clock.now = 11.0
+
+        events = self.tracer.chrome_trace()["traceEvents"]
+        thread = threading.current_thread().ident
+        self.assertEqual(
+            events,
+            [
+                {
+                    "name": "hotkey split",
+                    "cat": "action",
+                    "ph": "X",
+                    "ts": 500000.0,
+                    "dur": 500000.0,
+                    "pid": 1,
+                    "tid": thread,
+                    "args": {"depth": 0},
+                },
+                {
+                    "name": "attach",
+                    "cat": "spawn",
+                    "ph": "X",
+                    "ts": 750000.0,
+                    "dur": 125000.0,
+                    "pid": 1,
+                    "tid": thread,
+                    "args": {"depth": 1},
+                },
+            ],
+        )
+
+        path = os.path.join(tempfile.mkdtemp(), "trace.json")
+        self.tracer.dump(path)
+        with open(path) as trace_file:
+            self.assertEqual(json.load(trace_file)["traceEvents"], events)
+        summary = self.tracer.summary()
+        self.assertEqual(summary["hotkey split"]["count"], 1)
+        self.assertAlmostEqual(summary["attach"]["max_ms"], 125)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+# Helpers shared by the test_*.py files
+
+import time
+
+
+class FakeClock(object):
+    # Stands in for time.time/time.perf_counter, tests set now
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def wait_until(condition, timeout=5.0):
+    # For what worker threads do, fails the test after timeout seconds
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.001)
@@ -0,0 +1,100 @@
+# Terminal title changes. Programs like progress bars or watch can change
+# the title many times per second, every change means repainting the
+# header, relayouting the tab strip and setting the frame title. Changes
+# are collected per window, unchanged titles dropped, and the rest applied
+# in one pass per frame with at most one update per window and interval.
+
+import time
+
+
+class TitleStats(object):
+    def __init__(self):
+        self.events = 0
+        self.unchanged = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.passes = 0
+
+    def summary(self):
+        return {
+            "events": self.events,
+            "unchanged": self.unchanged,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "passes": self.passes,
+        }
+
+
+class TitlePipeline(object):
+    # apply(changes) gets a dict of hwnd -> title, schedule(delay, callback)
+    # must call callback after delay seconds on the thread owning the UI.
+    # Everything is expected to run on that same thread.
+    def __init__(
+        self, apply, schedule, frame_interval=0.016, min_interval=0.1, clock=time.time
+    ):
+        self.apply = apply
+        self.schedule = schedule
+        self.frame_interval = frame_interval
+        self.min_interval = min_interval
+        self.clock = clock
+        self.stats = TitleStats()
+        self.pending = {}
+        self.titles = {}
+        self.applied_at = {}
+        self.scheduled = False
+
+    def set_title(self, hwnd, title):
+        # The title a window already shows, without scheduling anything
+        self.titles[hwnd] = title
+
+    def forget(self, hwnd):
+        self.pending.pop(hwnd, None)
+        self.titles.pop(hwnd, None)
+        self.applied_at.pop(hwnd, None)
+
+    def title_changed(self, hwnd, title):
+        self.stats.events += 1
+        if hwnd in self.pending:
+            if self.pending[hwnd] == title:
+                self.stats.unchanged += 1
+                return
+            self.stats.coalesced += 1
+        elif self.titles.get(hwnd) == title:
+            self.stats.unchanged += 1
+            return
+
+        self.pending[hwnd] = title
+        self.schedule_pass()
+
+    def schedule_pass(self):
+        if self.scheduled or not self.pending:
+            return
+
+        now = self.clock()
+        due = min(self.due(hwnd, now) for hwnd in self.pending)
+        self.scheduled = True
+        self.schedule(max(due - now, self.frame_interval), self.run_pass)
+
+    def due(self, hwnd, now):
+        if hwnd not in self.applied_at:
+            return now
+        return self.applied_at[hwnd] + self.min_interval
+
+    def run_pass(self):
+        self.scheduled = False
+        now = self.clock()
+        changes = {}
+        for hwnd, title in list(self.pending.items()):
+            if self.due(hwnd, now) <= now:
+                changes[hwnd] = title
+                del self.pending[hwnd]
+
+        if changes:
+            self.stats.passes += 1
+            self.stats.applied += len(changes)
+            for hwnd, title in changes.items():
+                self.titles[hwnd] = title
+                self.applied_at[hwnd] = now
+            self.apply(changes)
+
+        self.schedule_pass()
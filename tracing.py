@@ -0,0 +1,227 @@
+# Timing of user actions. Spans are kept in a ring buffer while tracing is
+# enabled and can be dumped as Chrome trace events (chrome://tracing or
+# https://ui.perfetto.dev) together with a latency summary per action.
+#
+# When disabled a traced method is the plain method, the traced version is
+# only put in place while tracing is enabled. A disabled span is a shared
+# no-op, but the with statement around it still costs several times a plain
+# call, hot paths use call() instead, which then costs one extra call.
+
+import collections
+import functools
+import json
+import math
+import threading
+import time
+
+
+class Span(object):
+    __slots__ = ("tracer", "name", "category", "start", "depth", "discarded")
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.discarded = False
+
+    def set_name(self, name):
+        self.name = name
+
+    def discard(self):
+        self.discarded = True
+
+    def __enter__(self):
+        stack = self.tracer.stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = self.tracer.clock()
+        self.tracer.stack().pop()
+        if not self.discarded:
+            self.tracer.record(
+                (
+                    self.name,
+                    self.category,
+                    self.start,
+                    end - self.start,
+                    threading.current_thread().ident,
+                    self.depth,
+                )
+            )
+        return False
+
+
+class NullSpan(object):
+    __slots__ = ()
+
+    def set_name(self, name):
+        pass
+
+    def discard(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class TracedFunction(object):
+    # What Tracer.traced() returns. As a class attribute it replaces itself
+    # with the plain function, or the traced one while tracing is enabled.
+    # Called directly (not as a method) it always checks.
+    def __init__(self, tracer, function, traced):
+        self.tracer = tracer
+        self.function = function
+        self.traced = traced
+        self.owner = None
+        self.name = None
+        functools.update_wrapper(self, function)
+
+    def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.tracer.traced_functions.append(self)
+        self.install(self.tracer.enabled)
+
+    def install(self, enabled):
+        setattr(self.owner, self.name, self.traced if enabled else self.function)
+
+    def __call__(self, *args, **kwargs):
+        return self.traced(*args, **kwargs)
+
+
+def percentile(values, fraction):
+    # Nearest rank percentile of sorted values
+    return values[max(int(math.ceil(fraction * len(values))) - 1, 0)]
+
+
+class Tracer(object):
+    def __init__(self, capacity=20000, clock=time.perf_counter):
+        self.enabled = False
+        self.clock = clock
+        self.spans = collections.deque(maxlen=capacity)
+        self.local = threading.local()
+        self.origin = clock()
+        self.traced_functions = []
+
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def enable(self):
+        self.spans.clear()
+        self.origin = self.clock()
+        self.enabled = True
+        for traced in self.traced_functions:
+            traced.install(True)
+
+    def disable(self):
+        self.enabled = False
+        for traced in self.traced_functions:
+            traced.install(False)
+
+    def span(self, name, category="action", detail=None):
+        # The name of the span is "name detail", only put together when
+        # tracing is enabled
+        if not self.enabled:
+            return NULL_SPAN
+        if detail is not None:
+            name = "%s %s" % (name, detail)
+        return Span(self, name, category)
+
+    def call(self, name, function, *args, category="action", detail=None):
+        # function(*args) in a span, without a with statement when disabled
+        if not self.enabled:
+            return function(*args)
+        with self.span(name, category, detail):
+            return function(*args)
+
+    def traced(self, name, category="action"):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Span(self, name, category):
+                    return function(*args, **kwargs)
+
+            return TracedFunction(self, function, wrapper)
+
+        return decorator
+
+    def record(self, span):
+        self.spans.append(span)
+
+    def chrome_trace(self):
+        events = []
+        for name, category, start, duration, thread, depth in list(self.spans):
+            events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start - self.origin) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": 1,
+                    "tid": thread,
+                    "args": {"depth": depth},
+                }
+            )
+
+        events.sort(key=lambda event: (event["ts"], event["args"]["depth"]))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        with open(path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def summary(self):
+        durations = collections.defaultdict(list)
+        for name, _, _, duration, _, _ in list(self.spans):
+            durations[name].append(duration * 1000)
+
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.5),
+                "p90_ms": percentile(values, 0.9),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": values[-1],
+            }
+
+        return summary
+
+    def format_summary(self):
+        lines = [
+            "%-32s %6s %9s %9s %9s %9s" % ("span", "count", "p50", "p90", "p99", "max")
+        ]
+        for name, row in sorted(self.summary().items()):
+            lines.append(
+                "%-32s %6d %7.2fms %7.2fms %7.2fms %7.2fms"
+                % (
+                    name,
+                    row["count"],
+                    row["p50_ms"],
+                    row["p90_ms"],
+                    row["p99_ms"],
+                    row["max_ms"],
+                )
+            )
+
+        return "\n".join(lines)
+
+
+tracer = Tracer()
@@ -0,0 +1,115 @@
+# Structural changes (split, close, drag and drop, maximize...) take several
+# reparent, split, size and show steps, each of which would relayout,
+# repaint and move terminals on its own. Within a transaction redraws are
+# frozen and the terminal moves are held back, on commit the windows redraw
+# once and the final geometry is applied as one batch.
+#
+# Transactions nest, only the outermost one freezes and commits. Per
+# operation it is counted how long it took, how many geometry requests it
+# made, how many windows were moved in the end and how many paints
+# followed it.
+
+import collections
+import contextlib
+import time
+
+
+class OperationStats(object):
+    __slots__ = ("count", "total", "longest", "requests", "moves", "redraws")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.requests = 0
+        self.moves = 0
+        self.redraws = 0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.longest * 1000,
+            "requests": self.requests,
+            "moves": self.moves,
+            "redraws": self.redraws,
+        }
+
+
+class LayoutTransactions(object):
+    # scheduler is the ResizeScheduler of the terminals, freeze() stops the
+    # redraws and returns what thaw(frozen) needs to resume them. Paints
+    # within redraw_window seconds after a commit count for that operation.
+    def __init__(
+        self,
+        scheduler,
+        freeze=lambda: None,
+        thaw=lambda frozen: None,
+        redraw_window=0.5,
+        clock=time.perf_counter,
+    ):
+        self.scheduler = scheduler
+        self.freeze = freeze
+        self.thaw = thaw
+        self.redraw_window = redraw_window
+        self.clock = clock
+        self.stats = collections.defaultdict(OperationStats)
+        self.depth = 0
+        self.name = None
+        self.frozen = None
+        self.started = 0.0
+        self.requests = 0
+        self.last = None
+        self.committed = 0.0
+
+    def begin(self, name):
+        self.depth += 1
+        if self.depth > 1:
+            return
+
+        self.name = name
+        self.started = self.clock()
+        self.requests = self.scheduler.stats.requests
+        self.scheduler.hold()
+        self.frozen = self.freeze()
+
+    def commit(self):
+        self.depth -= 1
+        if self.depth:
+            return
+
+        try:
+            self.thaw(self.frozen)
+        finally:
+            self.frozen = None
+            moves = self.scheduler.release()
+
+        now = self.clock()
+        stats = self.stats[self.name]
+        stats.count += 1
+        stats.total += now - self.started
+        stats.longest = max(stats.longest, now - self.started)
+        stats.requests += self.scheduler.stats.requests - self.requests
+        stats.moves += moves
+        self.last = self.name
+        self.committed = now
+
+    @contextlib.contextmanager
+    def transaction(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.commit()
+
+    def redrawn(self):
+        if self.depth:
+            name = self.name
+        elif self.last and self.clock() - self.committed < self.redraw_window:
+            name = self.last
+        else:
+            return
+        self.stats[name].redraws += 1
+
+    def summary(self):
+        return dict((name, stats.summary()) for name, stats in self.stats.items())
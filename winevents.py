@@ -0,0 +1,98 @@
+# WinEvent subscriptions. Instead of one hook over a whole range of event
+# types for every process on the desktop, each handled event type gets its
+# own hook, and events that only matter for our terminals are hooked per
+# alacritty process. EventRouter sits in front of the handlers and drops
+# what can't be for us before any real work is done.
+
+import collections
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_CREATE = 0x8000
+EVENT_OBJECT_DESTROY = 0x8001
+EVENT_OBJECT_SHOW = 0x8002
+EVENT_OBJECT_HIDE = 0x8003
+EVENT_OBJECT_FOCUS = 0x8005
+EVENT_OBJECT_LOCATIONCHANGE = 0x800B
+EVENT_OBJECT_NAMECHANGE = 0x800C
+OBJID_WINDOW = 0
+
+
+class HookBackend(object):
+    # set_hook() installs a hook for one event type, limited to one process
+    # unless pid is 0, and returns a handle for unhook()
+    def set_hook(self, event, pid):
+        raise NotImplementedError
+
+    def unhook(self, handle):
+        raise NotImplementedError
+
+
+class WinEventSubscriptions(object):
+    def __init__(self, backend, global_events, process_events):
+        self.backend = backend
+        self.global_events = global_events
+        self.process_events = process_events
+        self.handles = {}
+        self.processes = collections.Counter()
+
+    def start(self):
+        for event in self.global_events:
+            self.handles[(event, 0)] = self.backend.set_hook(event, 0)
+
+    def add_process(self, pid):
+        self.processes[pid] += 1
+        if self.processes[pid] == 1:
+            for event in self.process_events:
+                self.handles[(event, pid)] = self.backend.set_hook(event, pid)
+
+    def remove_process(self, pid):
+        if pid not in self.processes:
+            return
+
+        self.processes[pid] -= 1
+        if self.processes[pid] == 0:
+            del self.processes[pid]
+            for event in self.process_events:
+                self.backend.unhook(self.handles.pop((event, pid)))
+
+    def close(self):
+        for handle in self.handles.values():
+            self.backend.unhook(handle)
+        self.handles.clear()
+        self.processes.clear()
+
+
+class EventRouter(object):
+    # Callable with the WINEVENTPROC arguments. handlers maps event types to
+    # handler(hwnd), window_events are only passed on for the window object
+    # itself (not its children) of windows is_owned(hwnd) accepts.
+    def __init__(self, handlers, window_events, is_owned):
+        self.handlers = handlers
+        self.window_events = window_events
+        self.is_owned = is_owned
+        self.callbacks = 0
+        self.dropped = 0
+
+    def __call__(
+        self,
+        hWinEventHook,
+        eventType,
+        hwnd,
+        idObject,
+        idChild,
+        dwEventThread,
+        dwmsEventTime,
+    ):
+        self.callbacks += 1
+        if eventType in self.window_events and (
+            idObject != OBJID_WINDOW or not self.is_owned(hwnd)
+        ):
+            self.dropped += 1
+            return
+
+        handler = self.handlers.get(eventType)
+        if handler is None:
+            self.dropped += 1
+            return
+
+        handler(hwnd)